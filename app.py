@@ -16,8 +16,19 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from config import config
 
 # Database models and utilities
-from models import db, User, ActiveSession, Transaction, Item
+from models import db, User, ActiveSession, Transaction, Item, TransactionDailyRollup
 from utils.security import get_client_ip
+from utils.inventory import take_stock
+from utils.sessions import session_validator
+from utils.cache import analytics_cache
+from utils.columnar import columnar_engine
+from utils.ratelimit import rate_limiter
+from utils.api_keys import api_key_auth
+from utils.passwords import password_pool, in_pool_process
+from utils.audit import login_audit
+from utils.anomaly import anomaly_detector
+from utils.snapshots import refresh_snapshots, process_refresh_requests
+from utils.student_import import process_imports
 from utils.analytics import get_analytics_data
 from routes import register_blueprints
 
@@ -37,6 +48,18 @@ app.config.from_object(config.get(config_name, config['development']))
 
 # Initialize extensions
 db.init_app(app)
+# Los procesos del pool de contraseñas (spawn) reimportan este módulo o
+# worker.py: ahí solo se hashea, sin hilos de fondo, spools ni snapshots
+if not in_pool_process():
+    session_validator.init_app(app)
+    analytics_cache.init_app(app)
+    columnar_engine.init_app(app)
+    rate_limiter.init_app(app)
+    api_key_auth.init_app(app)
+    password_pool.init_app(app)
+    login_audit.init_app(app)
+    anomaly_detector.init_app(app)
+
 mail = Mail(app)
 limiter = Limiter(
     app=app,
@@ -55,6 +78,11 @@ app.config.update(
 def init_db():
     """Initialize database"""
     with app.app_context():
+        # Bases SQLite existentes: añadir columnas e índices nuevos antes de
+        # create_all() (idempotente; una base nueva la crea create_all())
+        if db.engine.url.get_backend_name() == 'sqlite' and db.engine.url.database:
+            from migrate_db import migrate_database
+            migrate_database(db.engine.url.database)
         db.create_all()
         logger.info("Database initialized")
         
@@ -84,44 +112,34 @@ def before_request():
     g.user = None
     
     if 'user_id' in session:
-        g.user = User.query.get(session['user_id'])
+        # Validate session security if session_token exists
+        session_token = session.get('session_token')
         
-        if g.user:
-            # Validate session security if session_token exists
-            session_token = session.get('session_token')
-            
-            # If no session token, clear session silently
-            if not session_token:
-                session.clear()
-                g.user = None
-                return
-            
-            client_ip = get_client_ip()
-            user_agent = request.headers.get('User-Agent', '')
-            
-            # Check for session expiration or IP change
-            active_session = ActiveSession.query.filter_by(
-                user_id=g.user.id,
-                session_token=session_token,
-                is_active=True
-            ).first()
-            
-            if not active_session:
-                # Session not found in DB or was invalidated (app restart)
-                # Clear session silently and continue - user will see home page
-                logger.info(f"Session invalidated for user {g.user.id} (app restart)")
-                session.clear()
-                g.user = None
-                return
-            
-            if not active_session.validate_session(g.user.id, session_token, client_ip):
-                # Session compromised or expired - redirect to login for security
-                logger.warning(f"Session validation failed for user {g.user.id}")
-                session.clear()
-                g.user = None
-                return redirect(url_for('auth.login'))
-        else:
+        # If no session token, clear session silently
+        if not session_token:
             session.clear()
+            return
+        
+        # Cached for SESSION_CACHE_TTL seconds: no DB round trip on a hit
+        active_session = session_validator.load(session['user_id'], session_token)
+        
+        if not active_session:
+            # Session/user not found in DB or was invalidated (logout, app restart)
+            # Clear session silently and continue - user will see home page
+            logger.info(f"Session invalidated for user {session['user_id']}")
+            session.clear()
+            return
+        
+        if active_session.is_expired() or active_session.ip_address != get_client_ip():
+            # Session compromised or expired - redirect to login for security
+            logger.warning(f"Session validation failed for user {active_session.user_id}")
+            session_validator.invalidate(session_token)
+            session.clear()
+            return redirect(url_for('auth.login'))
+        
+        # last_activity is written in bulk by the write-behind flusher
+        session_validator.touch(active_session)
+        g.user = session_validator.get_user(active_session)
 
 @app.context_processor
 def inject_globals():
@@ -155,7 +173,6 @@ def index():
         else:
             return redirect(url_for('student.student'))
     
-    items = db.session.query(db.func.count(db.func.distinct(db.func.date(Transaction.timestamp)))).scalar() or 0
     return render_template('index.html')
 
 @app.route('/item/<int:item_id>', methods=['GET', 'POST'])
@@ -169,10 +186,13 @@ def view_item(item_id):
         
         action = request.form.get('action')
         qty = int(request.form.get('qty', 1))
+        if qty < 1:
+            return render_template('item.html', item=item, error='Cantidad inválida'), 400
         
         if action == 'buy':
-            # Procesar compra
-            if item.stock < qty:
+            # Procesar compra: el UPDATE condicional decide si hay stock (sin sobreventa entre workers)
+            if not take_stock(item.id, qty):
+                db.session.rollback()
                 return render_template('item.html', item=item, error='Stock insuficiente'), 400
             
             tx = Transaction(
@@ -182,7 +202,6 @@ def view_item(item_id):
                 qty=qty,
                 timestamp=datetime.utcnow()
             )
-            item.stock -= qty
             db.session.add(tx)
             db.session.commit()
             
@@ -193,9 +212,6 @@ def view_item(item_id):
             if not item.rentable:
                 return render_template('item.html', item=item, error='Este item no es rentable'), 400
             
-            if item.stock < qty:
-                return render_template('item.html', item=item, error='Stock insuficiente'), 400
-            
             days = int(request.form.get('days', 1))
             start_date = request.form.get('start_date')
             
@@ -203,6 +219,10 @@ def view_item(item_id):
             start_date = dt.strptime(start_date, '%Y-%m-%d').date() if start_date else datetime.utcnow().date()
             due_date = start_date + timedelta(days=days)
             
+            if not take_stock(item.id, qty):
+                db.session.rollback()
+                return render_template('item.html', item=item, error='Stock insuficiente'), 400
+            
             tx = Transaction(
                 item_id=item.id,
                 user_id=g.user.id,
@@ -214,7 +234,6 @@ def view_item(item_id):
                 rent_days=days,
                 returned=False
             )
-            item.stock -= qty
             db.session.add(tx)
             db.session.commit()
             
@@ -244,6 +263,13 @@ def nfc_control_alias():
 # Register all blueprints
 register_blueprints(app)
 
+@app.cli.command('rebuild-rollup')
+def rebuild_rollup_command():
+    """Reconstruye transaction_daily_rollup desde el historial (flask --app app rebuild-rollup)"""
+    rows = TransactionDailyRollup.rebuild()
+    db.session.commit()
+    print(f"✅ transaction_daily_rollup reconstruido: {rows} filas")
+
 # Background scheduler for periodic tasks
 def check_overdue_rentals():
     """Check for overdue rentals every hour"""
@@ -276,14 +302,58 @@ def cleanup_expired_sessions():
     except Exception as e:
         logger.error(f"Error cleaning up sessions: {e}")
 
+def refresh_analytics_snapshots():
+    """Recalcula los snapshots de analytics que sirven los paneles de admin"""
+    try:
+        with app.app_context():
+            refresh_snapshots()
+    except Exception as e:
+        logger.error(f"Error refreshing analytics snapshots: {e}")
+
+def process_analytics_refresh_requests():
+    """Atiende los pedidos de "Actualizar ahora" de los paneles de admin"""
+    try:
+        with app.app_context():
+            process_refresh_requests()
+    except Exception as e:
+        logger.error(f"Error processing analytics refresh requests: {e}")
+
+def process_student_imports():
+    """Atiende las importaciones masivas de estudiantes subidas por los admins"""
+    try:
+        with app.app_context():
+            process_imports()
+    except Exception as e:
+        logger.error(f"Error processing student imports: {e}")
+
+def register_jobs(scheduler):
+    """Tareas periódicas, compartidas por el servidor de desarrollo y worker.py"""
+    scheduler.add_job(check_overdue_rentals, 'interval', minutes=60, id='check_overdue')
+    scheduler.add_job(cleanup_expired_sessions, 'interval', minutes=30, id='cleanup_sessions')
+    scheduler.add_job(
+        refresh_analytics_snapshots, 'interval',
+        minutes=app.config.get('ANALYTICS_SNAPSHOT_MINUTES', 10),
+        id='analytics_snapshots', next_run_time=datetime.now(),
+        max_instances=1, coalesce=True
+    )
+    scheduler.add_job(
+        process_analytics_refresh_requests, 'interval',
+        seconds=app.config.get('ANALYTICS_REFRESH_POLL_SECONDS', 15),
+        id='analytics_refresh_requests', max_instances=1, coalesce=True
+    )
+    scheduler.add_job(
+        process_student_imports, 'interval',
+        seconds=app.config.get('STUDENT_IMPORT_POLL_SECONDS', 5),
+        id='student_imports', max_instances=1, coalesce=True
+    )
+
 if __name__ == '__main__':
     # Initialize database
     init_db()
     
     # Start background scheduler
     scheduler = BackgroundScheduler()
-    scheduler.add_job(check_overdue_rentals, 'interval', minutes=60, id='check_overdue')
-    scheduler.add_job(cleanup_expired_sessions, 'interval', minutes=30, id='cleanup_sessions')
+    register_jobs(scheduler)
     
     try:
         scheduler.start()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Benchmark: IPs sospechosas del panel de seguridad. GROUP BY sobre 24 h de
+LoginAttempt en cada vista (lo que hacía security_dashboard) frente al detector
+en memoria de utils/anomaly.py (ventanas deslizantes + sketch de infractores)
+
+Genera un tráfico de intentos fallidos de 24 h: unos pocos atacantes con mucho
+volumen, un barrido de IPs de una sola vez (más IPs que ANOMALY_MAX_KEYS, para
+forzar el desalojo LRU) y usuarios legítimos que se equivocan. El mismo flujo va
+a la BD y al detector. Informa el costo por vista, el costo por intento del
+detector, su memoria acotada y si el top 10 coincide con el exacto.
+
+Uso: python benchmarks/bench_anomaly.py [--attempts 100000 500000] [--max-keys 10000]
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import desc, func
+
+from common import header, temp_db_path, make_app, timed
+from models import db, LoginAttempt
+from utils.anomaly import AnomalyDetector
+
+VIEWS = 20
+TOP = 10
+
+
+def traffic(attempts, seed=7):
+    """(segundos atrás, usuario, ip, éxito) en las últimas 24 h"""
+    rng = random.Random(seed)
+    attackers = [f'203.0.113.{i}' for i in range(1, 31)]
+    weights = [1 / rank for rank in range(1, len(attackers) + 1)]  # Zipf: pocos concentran el volumen
+    rows = []
+    for i in range(attempts):
+        roll = rng.random()
+        if roll < 0.4:
+            ip = rng.choices(attackers, weights)[0]
+            rows.append((rng.uniform(0, 86000), f'user{rng.randrange(5000)}', ip, False))
+        elif roll < 0.9:
+            rows.append((rng.uniform(0, 86000), f'user{rng.randrange(5000)}', f'10.{i % 256}.{i // 256 % 256}.{i // 65536}', False))
+        else:
+            user = rng.randrange(2000)
+            rows.append((rng.uniform(0, 86000), f'student{user}', f'192.168.{user % 256}.{user // 256}', rng.random() < 0.8))
+    rows.sort(key=lambda row: -row[0])  # del más viejo al más nuevo
+    return rows
+
+
+def group_by_top():
+    """La consulta del panel anterior (con la columna correcta)"""
+    return db.session.query(
+        LoginAttempt.ip_address, func.count(LoginAttempt.id).label('count')
+    ).filter(
+        LoginAttempt.success == False,
+        LoginAttempt.timestamp >= datetime.utcnow() - timedelta(hours=24)
+    ).group_by(LoginAttempt.ip_address).having(
+        func.count(LoginAttempt.id) >= 5
+    ).order_by(desc('count')).all()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--attempts', type=int, nargs='+', default=[100_000, 500_000])
+    parser.add_argument('--max-keys', type=int, default=10_000)
+    args = parser.parse_args()
+
+    header(f"⏱️  BENCHMARK IPs sospechosas: GROUP BY por vista vs detector en streaming (LRU {args.max_keys:,})")
+    print(f"{'Intentos 24h':>13} {'GROUP BY / vista':>17} {'Detector / vista':>17} {'µs / intento':>13} "
+          f"{'Claves IP':>10} {'Memoria':>9} {'Top 10':>7}")
+    print("-" * 94)
+    for attempts in args.attempts:
+        rows = traffic(attempts)
+        now = time.time()
+        utcnow = datetime.utcnow()
+        app = make_app(temp_db_path())
+        with app.app_context():
+            db.session.execute(LoginAttempt.__table__.insert(), [
+                {'username': user, 'ip_address': ip, 'success': success, 'timestamp': utcnow - timedelta(seconds=ago)}
+                for ago, user, ip, success in rows
+            ])
+            db.session.commit()
+            group_ms, exact = timed(group_by_top, repeat=VIEWS // 4)
+
+        detector = AnomalyDetector()
+        detector.max_keys = args.max_keys
+        tracemalloc.start()
+        started = time.perf_counter()
+        for ago, user, ip, success in rows:
+            detector.observe(user, ip, success, now=now - ago)
+        observe_us = (time.perf_counter() - started) * 1e6 / attempts
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        detector_ms, summary = timed(lambda: detector.summary(limit=TOP, now=now), repeat=VIEWS)
+
+        expected = [ip for ip, _ in exact[:TOP]]
+        found = [entry['key'] for entry in summary['ips']]
+        exact_counts = dict(exact)
+        counts_match = all(entry['failures'] == exact_counts.get(entry['key']) for entry in summary['ips'])
+        print(f"{attempts:>13,} {group_ms:>14.1f} ms {detector_ms:>14.2f} ms {observe_us:>13.1f} "
+              f"{len(detector._keys['ip']):>10,} {memory / 1e6:>6.1f} MB "
+              f"{'✅' if found == expected and counts_match else '❌':>6}")
+
+    print(f"\nTop 10 del detector con {args.attempts[-1]:,} intentos:")
+    for entry in summary['ips']:
+        print(f"  {entry['key']:<16} fallidos {entry['failures']:>6,} (exacto {exact_counts.get(entry['key'], 0):>6,}) "
+              f"usuarios {entry['targets']}{'+' if entry['targets'] >= summary['max_targets'] else ''}"
+              f"{' ≈' if entry['estimated'] else ''}")
+
+
+if __name__ == '__main__':
+    main()
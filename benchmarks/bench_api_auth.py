@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Benchmark: autenticación de API keys. El patrón anterior (consultar ApiKey por la
+key y hacer commit de last_used_at en cada request) frente a utils/api_keys.py
+(caché por huella + last_used_at en lote) y a los tokens de acceso de POST /api/token
+
+Mide el coste del decorador sobre una ruta barata (GET /api/rental-info/1) y cuenta
+consultas y commits por request. Comprueba además que revocar corta el acceso
+en el request siguiente, con la key y con un token ya emitido.
+
+Uso: python benchmarks/bench_api_auth.py [--requests 2000]
+"""
+import argparse
+import os
+from datetime import datetime
+
+from common import header, temp_db_path, timed, StatementCounter
+
+# La app real, ligada a una base temporal (antes de importar app.py)
+DB_PATH = temp_db_path('api_auth.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+os.environ['ANALYTICS_CACHE_PATH'] = os.path.join(os.path.dirname(DB_PATH), 'analytics_cache.db')
+os.environ['ANALYTICS_COLUMNS_PATH'] = os.path.join(os.path.dirname(DB_PATH), 'columns')
+os.environ['RATELIMIT_PATH'] = os.path.join(os.path.dirname(DB_PATH), 'ratelimit.db')
+
+from app import app, limiter  # noqa: E402
+from models import db, User, Item, ApiKey  # noqa: E402
+from utils.api_keys import api_key_auth  # noqa: E402
+
+KEY = 'k' * 64
+
+
+def legacy_auth(api_key):
+    """Patrón anterior de api_key_required"""
+    key_obj = ApiKey.query.filter_by(key=api_key, is_active=True).first()
+    key_obj.last_used_at = datetime.utcnow()
+    db.session.commit()
+    return key_obj.user
+
+
+def cached_auth(api_key):
+    return api_key_auth.get_user(api_key_auth.authenticate(api_key))
+
+
+def token_auth(token):
+    return api_key_auth.verify_token(token)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2_000)
+    args = parser.parse_args()
+
+    app.config['TESTING'] = True
+    app.config['API_LIMIT'] = app.config['ADMIN_API_LIMIT'] = '1000000 per hour'
+    limiter.enabled = False
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username='kiosk', email='kiosk@example.com', password_hash='x', role='admin'))
+        db.session.add(Item(id=1, name='Cuaderno', category='Cuadernos', price=1.0, stock=10, rentable=True))
+        db.session.add(ApiKey(id=1, key=KEY, name='kiosko', user_id=1))
+        db.session.commit()
+        counter = StatementCounter(db.engine)
+
+    header(f"⏱️  BENCHMARK autenticación de API keys ({args.requests:,} requests)")
+    print(f"{'Modo':<36} {'µs / request':>13} {'Consultas':>10} {'Commits':>8}")
+    print("-" * 72)
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {KEY}'}
+    token = client.post('/api/token', headers=headers).get_json()['access_token']
+    token_headers = {'Authorization': f'Bearer {token}'}
+
+    for label, auth, credential in [('Consulta + commit (anterior)', legacy_auth, KEY),
+                                    ('Caché + last_used_at en lote', cached_auth, KEY),
+                                    ('Token firmado (JWT)', token_auth, token)]:
+        with app.app_context():
+            auth(credential)  # calentamiento
+            counter.reset()
+            elapsed_ms, _ = timed(lambda: [auth(credential) for _ in range(args.requests)], repeat=1)
+            db.session.remove()
+        print(f"{label:<36} {elapsed_ms * 1000 / args.requests:>13.1f} "
+              f"{counter.statements / args.requests:>10.2f} {counter.commits / args.requests:>8.2f}")
+
+    for label, request_headers in [('Ruta completa con API key', headers), ('Ruta completa con token', token_headers)]:
+        with app.app_context():
+            counter.reset()
+        elapsed_ms, _ = timed(
+            lambda: [client.get('/api/rental-info/1', headers=request_headers) for _ in range(args.requests)], repeat=1
+        )
+        print(f"{label:<36} {elapsed_ms * 1000 / args.requests:>13.1f} "
+              f"{counter.statements / args.requests:>10.2f} {counter.commits / args.requests:>8.2f}")
+
+    flushed = api_key_auth.flush()
+    with app.app_context():
+        counter.reset()
+        last_used = db.session.get(ApiKey, 1).last_used_at
+        print(f"\nlast_used_at en lote: {flushed} UPDATE(s) para {args.requests:,} requests ({last_used})")
+        api_key_auth.revoke(db.session.get(ApiKey, 1))
+    status = client.get('/api/rental-info/1', headers=headers).status_code
+    token_status = client.get('/api/rental-info/1', headers=token_headers).status_code
+    print(f"Request tras revocar: HTTP {status} con la key, HTTP {token_status} con el token "
+          f"{'✅' if status == token_status == 401 else '❌'}")
+
+
+if __name__ == '__main__':
+    main()
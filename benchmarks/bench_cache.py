@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Benchmark: caché de analytics compartida (instance/analytics_cache.db)
+
+Mide el cálculo en frío, el acierto, la invalidación tras un commit y el caso
+de "varios admins a la vez" con procesos independientes, como workers de gunicorn.
+
+Uso: python benchmarks/bench_cache.py [--transactions 1000000] [--workers 4]
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+from common import header, temp_db_path, make_app, seed, timed
+from models import db, Transaction
+from utils.analytics import get_analytics_data, get_predictive_analytics, get_supplier_intelligence
+from utils.cache import analytics_cache
+
+FUNCTIONS = {
+    'analytics_data': get_analytics_data,
+    'predictive_analytics': get_predictive_analytics,
+    'supplier_intelligence': get_supplier_intelligence,
+}
+
+
+def cached_app(db_path):
+    app = make_app(db_path)
+    app.config['ANALYTICS_CACHE_PATH'] = os.path.join(os.path.dirname(db_path), 'analytics_cache.db')
+    analytics_cache.init_app(app)
+    return app
+
+
+def worker(db_path, start_at, queue):
+    """Un "worker de gunicorn": carga los tres paneles una vez"""
+    app = cached_app(db_path)
+    time.sleep(max(0, start_at - time.time()))
+    with app.app_context():
+        started = time.perf_counter()
+        for name, fn in FUNCTIONS.items():
+            analytics_cache.get_or_compute(name, fn)
+        queue.put((time.perf_counter() - started) * 1000)
+        db.session.remove()
+
+
+def load_all():
+    return [analytics_cache.get_or_compute(name, fn) for name, fn in FUNCTIONS.items()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--transactions', type=int, default=1_000_000)
+    parser.add_argument('--items', type=int, default=2_000)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    make_app(db_path)
+    seed(db_path, transactions=args.transactions, items=args.items, users=1_000)
+    app = cached_app(db_path)
+
+    header(f"⏱️  BENCHMARK caché de analytics ({args.transactions:,} transacciones)")
+    with app.app_context():
+        uncached_ms, fresh = timed(lambda: [fn() for fn in FUNCTIONS.values()], repeat=1)
+        cold_ms, _ = timed(load_all, repeat=1)
+        hit_ms, cached = timed(load_all, repeat=5)
+        same = [v['general'] if 'general' in v else sorted(v) for v in fresh] == \
+               [v['general'] if 'general' in v else sorted(v) for v in cached]
+
+        db.session.add(Transaction(item_id=1, user_id=1, kind='buy', qty=1))
+        db.session.commit()
+        after_write_ms, _ = timed(load_all, repeat=1)
+        db.session.remove()
+
+    print(f"Sin caché (3 paneles)                {uncached_ms:>10.1f} ms")
+    print(f"Caché en frío (cálculo + guardado)   {cold_ms:>10.1f} ms")
+    print(f"Acierto de caché                     {hit_ms:>10.1f} ms   mismos datos: {'✅' if same else '❌'}")
+    print(f"Tras un commit (versión nueva)       {after_write_ms:>10.1f} ms")
+
+    # Varios procesos a la vez: el primero que calcula cada panel lo comparte con el resto
+    with app.app_context():
+        db.session.add(Transaction(item_id=1, user_id=1, kind='buy', qty=1))
+        db.session.commit()
+        db.session.remove()
+    ctx = multiprocessing.get_context('fork')
+    queue = ctx.Queue()
+    start_at = time.time() + 1.0
+    procs = [ctx.Process(target=worker, args=(db_path, start_at + i * 0.5, queue)) for i in range(args.workers)]
+    for p in procs:
+        p.start()
+    timings = [queue.get() for _ in procs]
+    for p in procs:
+        p.join()
+    print(f"\n{args.workers} workers, uno cada 0,5 s: " + ", ".join(f"{t:.0f} ms" for t in timings))
+    print(f"Contadores: {analytics_cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
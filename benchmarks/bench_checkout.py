@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Benchmark: un carrito de N artículos comprado con N POST /item/<id> (una
+transacción de escritura cada uno) frente a un solo POST /student/cart/checkout
+(UPDATE condicional por conjunto + INSERT masivo, un commit)
+
+Cuenta las consultas SQL y los commits de cada modo con eventos del engine.
+
+Uso: python benchmarks/bench_checkout.py [--lines 8] [--rounds 50]
+"""
+import argparse
+import os
+
+from common import header, temp_db_path, timed, StatementCounter
+
+# La app real, ligada a una base temporal (antes de importar app.py)
+DB_PATH = temp_db_path('checkout.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+os.environ['ANALYTICS_CACHE_PATH'] = os.path.join(os.path.dirname(DB_PATH), 'analytics_cache.db')
+os.environ['ANALYTICS_COLUMNS_PATH'] = os.path.join(os.path.dirname(DB_PATH), 'columns')
+
+from app import app, limiter  # noqa: E402
+from models import db, User, Item, Transaction, ActiveSession  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    app.config['TESTING'] = True
+    limiter.enabled = False
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username='bench', email='bench@example.com', password_hash='x', role='student'))
+        for item_id in range(1, args.lines + 1):
+            db.session.add(Item(id=item_id, name=f'Artículo {item_id}', category='Útiles', price=1.0,
+                                stock=10 * args.rounds, rentable=True))
+        db.session.commit()
+        token = ActiveSession.create_session(1, '127.0.0.1')
+        counter = StatementCounter(db.engine)
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['session_token'] = token
+    cart = [{'item_id': item_id, 'action': 'buy', 'qty': 1} for item_id in range(1, args.lines + 1)]
+
+    def one_by_one():
+        for line in cart:
+            assert client.post(f"/item/{line['item_id']}", data={'action': 'buy', 'qty': 1}).status_code == 200
+
+    def checkout():
+        with client.session_transaction() as sess:
+            sess['cart'] = cart
+        assert client.post('/student/cart/checkout').status_code == 302
+
+    header(f"⏱️  BENCHMARK checkout de {args.lines} artículos ({args.rounds} carritos)")
+    print(f"{'Modo':<26} {'ms / carrito':>13} {'Peticiones':>11} {'Consultas':>10} {'Commits':>8}")
+    print("-" * 72)
+    for label, fn, requests in [(f'{args.lines} x POST /item', one_by_one, args.lines),
+                                ('POST /student/cart/checkout', checkout, 1)]:
+        fn()  # calentamiento
+        with app.app_context():
+            counter.reset()
+            elapsed_ms, _ = timed(lambda: [fn() for _ in range(args.rounds)], repeat=1)
+        print(f"{label:<26} {elapsed_ms / args.rounds:>13.2f} {requests:>11} "
+              f"{counter.statements / args.rounds:>10.1f} {counter.commits / args.rounds:>8.1f}")
+
+    with app.app_context():
+        sold = Transaction.query.count()
+        stock = sum(item.stock for item in Item.query)
+    expected = 2 * (args.rounds + 1) * args.lines
+    print(f"\nTransacciones: {sold} (esperadas {expected}); stock restante {stock} "
+          f"{'✅' if sold == expected and stock == 10 * args.rounds * args.lines - sold else '❌'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""
+Benchmark: columnas de Transaction en archivos mapeados (ColumnStore) frente a
+la copia en memoria de cada worker
+
+Cada "worker" es un proceso nuevo (spawn, como un worker de gunicorn recién
+arrancado) que sincroniza el motor columnar y calcula los tres paneles. Se
+mide el tiempo y la memoria propia (RssAnon) y compartida (RssFile) del proceso.
+
+Uso: python benchmarks/bench_column_store.py [--transactions 1000000] [--workers 3]
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+from common import header, temp_db_path, make_app, seed, timed
+from models import db, Transaction
+from utils.columnar import ColumnarAnalytics
+
+
+def rss_mb():
+    """(RssAnon, RssFile) del proceso en MB, leídos de /proc/self/status"""
+    values = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(('RssAnon:', 'RssFile:')):
+                name, kb = line.split()[:2]
+                values[name] = int(kb) / 1024
+    return values['RssAnon:'], values['RssFile:']
+
+
+def worker(db_path, columns_path, queue):
+    """Un worker nuevo: sincroniza el motor (de archivos o de la BD) y calcula los paneles"""
+    app = make_app(db_path)
+    if columns_path:
+        app.config['ANALYTICS_COLUMNS_PATH'] = columns_path
+    engine = ColumnarAnalytics(app) if columns_path else ColumnarAnalytics()
+    with app.app_context():
+        anon_before, file_before = rss_mb()
+        started = time.perf_counter()
+        engine.refresh()
+        warmup_ms = (time.perf_counter() - started) * 1000
+        panels_ms, _ = timed(lambda: [engine.analytics_data(), engine.predictive_analytics(),
+                                      engine.supplier_intelligence()], repeat=1)
+        anon_after, file_after = rss_mb()
+        db.session.remove()
+    queue.put((warmup_ms, panels_ms, anon_after - anon_before, file_after - file_before))
+
+
+def run_workers(ctx, db_path, columns_path, count):
+    queue = ctx.Queue()
+    results = []
+    for _ in range(count):  # uno tras otro: mide el arranque de cada uno
+        process = ctx.Process(target=worker, args=(db_path, columns_path, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--transactions', type=int, default=1_000_000)
+    parser.add_argument('--items', type=int, default=2_000)
+    parser.add_argument('--workers', type=int, default=3)
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    app = make_app(db_path)
+    seed(db_path, transactions=args.transactions, items=args.items, users=1_000)
+    columns_path = os.path.join(os.path.dirname(db_path), 'columns')
+    ctx = multiprocessing.get_context('spawn')
+
+    header(f"⏱️  BENCHMARK columnas mapeadas ({args.transactions:,} transacciones, {args.workers} workers)")
+    print(f"{'Modo':<28} {'Arranque (ms)':>14} {'Paneles (ms)':>13} {'Propia (MB)':>12} {'Compartida (MB)':>16}")
+    print("-" * 87)
+
+    def report(label, results):
+        for i, (warmup_ms, panels_ms, anon_mb, file_mb) in enumerate(results, 1):
+            print(f"{f'{label} #{i}':<28} {warmup_ms:>14.1f} {panels_ms:>13.1f} {anon_mb:>12.1f} {file_mb:>16.1f}")
+
+    report("Memoria", run_workers(ctx, db_path, None, args.workers))
+    # El primero escribe los archivos; los siguientes solo los mapean
+    report("Archivos", run_workers(ctx, db_path, columns_path, args.workers))
+
+    # Filas nuevas: el siguiente worker que sincroniza las agrega al final de los archivos
+    with app.app_context():
+        db.session.add_all(Transaction(item_id=1, user_id=1, kind='buy', qty=1) for _ in range(1_000))
+        db.session.commit()
+        db.session.remove()
+    report("Archivos + 1.000 nuevas", run_workers(ctx, db_path, columns_path, 1))
+
+    size_mb = sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(columns_path) for name in names
+    ) / 1024 / 1024
+    print(f"\nArchivos de columnas: {size_mb:.1f} MB en {columns_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Benchmark: motor columnar (utils/columnar.py) frente a las funciones de
+utils/analytics.py para los tres paneles, con carga inicial, refresh sin
+cambios e incremental tras insertar transacciones nuevas
+
+Uso: python benchmarks/bench_columnar.py [--sizes 100000 1000000] [--append 1000]
+"""
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+
+from common import header, temp_db_path, make_app, seed, timed
+from models import db, Transaction
+from utils.analytics import get_analytics_data, get_predictive_analytics, get_supplier_intelligence
+from utils.cache import analytics_cache
+from utils.columnar import ColumnarAnalytics
+
+
+def sql_panels():
+    return [get_analytics_data(), get_predictive_analytics(), get_supplier_intelligence()]
+
+
+def columnar_panels(engine):
+    return [engine.analytics_data(), engine.predictive_analytics(), engine.supplier_intelligence()]
+
+
+def normalized(value):
+    """Resultados comparables: tuplas como listas, sin marcas de tiempo"""
+    if isinstance(value, dict):
+        return {k: normalized(v) for k, v in value.items() if k != 'last_updated'}
+    if isinstance(value, (list, tuple)):
+        return [normalized(v) for v in value]
+    return value
+
+
+def append_transactions(n, items, rng):
+    """n transacciones nuevas por la app (con el rollup al día) y algunas devoluciones"""
+    now = datetime.utcnow()
+    for _ in range(n):
+        kind = rng.choice(['buy', 'rent'])
+        db.session.add(Transaction(
+            item_id=rng.randint(1, items), user_id=1, kind=kind, qty=rng.randint(1, 3),
+            rent_days=7 if kind == 'rent' else None,
+            rent_due_date=(now + timedelta(days=7)).date() if kind == 'rent' else None
+        ))
+    for rental in Transaction.query.filter_by(kind='rent', returned=False).limit(n // 10):
+        rental.returned = True
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--items', type=int, default=2_000)
+    parser.add_argument('--append', type=int, default=1_000)
+    args = parser.parse_args()
+
+    header("⏱️  BENCHMARK motor columnar (3 paneles)")
+    print(f"{'Transacciones':>14} {'SQL (ms)':>10} {'Carga (ms)':>11} {'Columnar (ms)':>14} "
+          f"{'Incremental (ms)':>17} {'Iguales':>8}")
+    print("-" * 80)
+    rng = random.Random(7)
+    for size in args.sizes:
+        db_path = temp_db_path()
+        app = make_app(db_path)
+        seed(db_path, transactions=size, items=args.items, users=1_000)
+        # Como en app.py: con la caché activa, refresh() sabe si hubo escrituras
+        app.config['ANALYTICS_CACHE_PATH'] = os.path.join(os.path.dirname(db_path), 'analytics_cache.db')
+        analytics_cache.init_app(app)
+
+        with app.app_context():
+            engine = ColumnarAnalytics()
+            sql_ms, by_sql = timed(sql_panels, repeat=1)
+            load_ms, _ = timed(engine.refresh, repeat=1)
+            warm_ms, by_engine = timed(lambda: columnar_panels(engine))
+            same = normalized(by_sql) == normalized(by_engine)
+
+            append_transactions(args.append, args.items, rng)
+            incremental_ms, by_engine = timed(lambda: columnar_panels(engine), repeat=1)
+            same = same and normalized(sql_panels()) == normalized(by_engine)
+            db.session.remove()
+        print(f"{size:>14,} {sql_ms:>10.1f} {load_ms:>11.1f} {warm_ms:>14.1f} "
+              f"{incremental_ms:>17.1f} {'✅' if same else '❌':>8}")
+    print(f"\nColumnar: refresh sin cambios + 3 paneles. Incremental: tras {args.append:,} transacciones "
+          f"nuevas y {args.append // 10:,} devoluciones.")
+
+
+if __name__ == '__main__':
+    main()
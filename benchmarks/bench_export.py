@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Benchmark: exportación CSV de transacciones, Transaction.to_csv sobre objetos
+cargados frente a Transaction.iter_csv (columnas con join y yield_per)
+
+La memoria pico se mide con tracemalloc (objetos de Python). El CSV en
+streaming se consume trozo a trozo, como lo haría la respuesta HTTP.
+
+Uso: python benchmarks/bench_export.py [--sizes 100000 1000000] [--legacy-max 200000]
+"""
+import argparse
+import tracemalloc
+
+from common import header, temp_db_path, make_app, seed, timed
+from models import Transaction
+from utils.exports import gzip_chunks
+
+
+def measured(fn):
+    """(ms, MB pico, resultado) de fn(); tiempo y memoria en corridas separadas (tracemalloc es lento)"""
+    elapsed_ms, result = timed(fn, repeat=1)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return elapsed_ms, peak / 1024 / 1024, result
+
+
+def legacy_export():
+    return Transaction.to_csv(Transaction.search_query().order_by(Transaction.id).all())
+
+
+def streamed_export(gzipped=False):
+    """Consume el streaming trozo a trozo, como la respuesta HTTP; devuelve los bytes enviados"""
+    chunks = Transaction.iter_csv()
+    if gzipped:
+        chunks = gzip_chunks(chunks)
+    size = 0
+    for chunk in chunks:
+        size += len(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--items', type=int, default=2_000)
+    parser.add_argument('--legacy-max', type=int, default=200_000)
+    args = parser.parse_args()
+
+    header("⏱️  BENCHMARK exportación CSV de transacciones")
+    print(f"{'Transacciones':>14} {'Modo':<14} {'Tiempo (ms)':>12} {'Pico (MB)':>10} {'Tamaño (MB)':>12} {'Iguales':>8}")
+    print("-" * 76)
+    for size in args.sizes:
+        db_path = temp_db_path()
+        app = make_app(db_path)
+        seed(db_path, transactions=size, items=args.items, users=1_000)
+
+        with app.app_context():
+            stream_ms, stream_peak, stream_size = measured(streamed_export)
+            gzip_ms, gzip_peak, gzip_size = measured(lambda: streamed_export(gzipped=True))
+
+            same = ''
+            if size <= args.legacy_max:
+                legacy_ms, legacy_peak, legacy_text = measured(legacy_export)
+                same = '✅' if legacy_text == ''.join(Transaction.iter_csv()) else '❌'
+                print(f"{size:>14,} {'to_csv':<14} {legacy_ms:>12.1f} {legacy_peak:>10.1f} "
+                      f"{len(legacy_text.encode('utf-8')) / 1024 / 1024:>12.1f} {same:>8}")
+            print(f"{size:>14,} {'streaming':<14} {stream_ms:>12.1f} {stream_peak:>10.1f} "
+                  f"{stream_size / 1024 / 1024:>12.1f} {same:>8}")
+            print(f"{size:>14,} {'streaming gzip':<14} {gzip_ms:>12.1f} {gzip_peak:>10.1f} "
+                  f"{gzip_size / 1024 / 1024:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Benchmark: filtros calientes de Transaction/LoginAttempt antes y después de
+migrate_db.migrate_indexes (índices compuestos + columna transaction.day)
+
+Uso: python benchmarks/bench_indexes.py [--rows 2000000]
+"""
+import argparse
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from common import header, temp_db_path, make_app, seed, timed
+from migrate_db import INDEXES, migrate_indexes
+
+# (nombre, SQL antes, SQL después, parámetros)
+QUERIES = [
+    ('Renta abierta de un item (devolución NFC)',
+     'SELECT id FROM "transaction" WHERE item_id = :item AND kind = \'rent\' AND returned = 0 LIMIT 1',
+     None),
+    ('Rentas vencidas (dashboard)',
+     'SELECT count(*) FROM "transaction" WHERE kind = \'rent\' AND returned = 0 AND rent_due_date < :today',
+     None),
+    ('Rentas activas de un estudiante',
+     'SELECT count(*) FROM "transaction" WHERE user_id = :user AND kind = \'rent\' AND returned = 0',
+     None),
+    ('Últimas 10 transacciones',
+     'SELECT id FROM "transaction" ORDER BY timestamp DESC LIMIT 10',
+     None),
+    ('Ventas 30 días de un item',
+     'SELECT count(*) FROM "transaction" WHERE item_id = :item AND kind IN (\'buy\', \'rent\') AND timestamp >= :since',
+     None),
+    ('Devoluciones/restock últimos 30 días (NFC stats)',
+     'SELECT kind, count(*) FROM "transaction" WHERE kind IN (\'return\', \'restock\') AND timestamp >= :since GROUP BY kind',
+     None),
+    ('Transacciones por día y tipo (30 días)',
+     'SELECT date(timestamp), kind, count(*) FROM "transaction" WHERE timestamp >= :since_day '
+     'GROUP BY date(timestamp), kind',
+     'SELECT day, kind, count(*) FROM "transaction" WHERE day >= :since_day GROUP BY day, kind'),
+    ('Intentos fallidos recientes de una IP',
+     'SELECT count(*) FROM login_attempt WHERE ip_address = :ip AND success = 0 AND timestamp >= :login_since',
+     None),
+]
+
+
+def drop_migrated_schema(db_path):
+    """Deja la base como antes de la migración: sin índices nuevos ni columna day"""
+    conn = sqlite3.connect(db_path)
+    for name, _, _ in INDEXES:
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
+    conn.execute('ALTER TABLE "transaction" DROP COLUMN day')
+    conn.commit()
+    conn.close()
+
+
+def run_queries(conn, params, use_after):
+    results = {}
+    for name, before_sql, after_sql in QUERIES:
+        sql = after_sql if use_after and after_sql else before_sql
+        ms, _ = timed(lambda: conn.execute(sql, params).fetchall(), repeat=3)
+        results[name] = ms
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    args = parser.parse_args()
+    
+    header(f"⏱️  BENCHMARK ÍNDICES - {args.rows:,} transacciones")
+    
+    db_path = temp_db_path()
+    make_app(db_path)
+    drop_migrated_schema(db_path)
+    
+    start = time.perf_counter()
+    seed(db_path, transactions=args.rows, items=5_000, users=5_000, login_attempts=args.rows // 4)
+    print(f"Datos sintéticos generados en {time.perf_counter() - start:.1f}s ({db_path})")
+    
+    now = datetime.utcnow()
+    params = {
+        'item': 1234,
+        'user': 321,
+        'today': now.date().isoformat(),
+        'since': (now - timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S.%f'),
+        'since_day': (now - timedelta(days=30)).date().isoformat(),
+        'ip': sqlite3.connect(db_path).execute('SELECT ip_address FROM login_attempt LIMIT 1').fetchone()[0],
+        'login_since': (now - timedelta(minutes=15)).strftime('%Y-%m-%d %H:%M:%S.%f'),
+    }
+    
+    conn = sqlite3.connect(db_path)
+    before = run_queries(conn, params, use_after=False)
+    
+    start = time.perf_counter()
+    migrate_indexes(conn.cursor())
+    conn.commit()
+    print(f"Migración (day + índices) en {time.perf_counter() - start:.1f}s")
+    
+    after = run_queries(conn, params, use_after=True)
+    conn.close()
+    
+    print(f"\n{'Consulta':<50} {'Antes (ms)':>11} {'Después (ms)':>13} {'x':>8}")
+    print("-" * 85)
+    for name, _, _ in QUERIES:
+        speedup = before[name] / after[name] if after[name] else float('inf')
+        print(f"{name:<50} {before[name]:>11.2f} {after[name]:>13.2f} {speedup:>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
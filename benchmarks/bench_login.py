@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+Benchmark: avalancha de logins con tráfico de catálogo en paralelo. Hashing en el
+propio worker (PBKDF2, como antes) frente al pool de procesos acotado de
+utils/passwords.py (argon2id, rechazo rápido con 503 al saturarse)
+
+Un proceso con varios hilos hace de worker web (como gunicorn --threads): unos
+hilos inician sesión sin parar y otros piden la página de inicio. Informa logins
+por segundo, logins rechazados por saturación, latencia del catálogo y cuántos
+hashes viejos se actualizaron al algoritmo configurado.
+
+Uso: python benchmarks/bench_login.py [--login-threads 16] [--catalog-threads 2] [--seconds 10]
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+
+from werkzeug.security import generate_password_hash
+
+from common import header, temp_db_path
+
+# La app real, ligada a una base temporal (antes de importar app.py)
+DB_PATH = temp_db_path('login.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+os.environ['ANALYTICS_CACHE_PATH'] = os.path.join(os.path.dirname(DB_PATH), 'analytics_cache.db')
+os.environ['ANALYTICS_COLUMNS_PATH'] = os.path.join(os.path.dirname(DB_PATH), 'columns')
+os.environ['RATELIMIT_PATH'] = os.path.join(os.path.dirname(DB_PATH), 'ratelimit.db')
+
+from app import app, limiter  # noqa: E402
+from models import db, User  # noqa: E402
+from utils.passwords import password_pool  # noqa: E402
+
+PASSWORD = 'semestre2026'
+LEGACY_ITERATIONS = 1_000_000  # pbkdf2:sha256 por defecto de Werkzeug 3
+BUSY_BACKOFF = 0.5  # segundos que espera un cliente rechazado antes de reintentar
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+def storm(login_threads, catalog_threads, seconds, users):
+    counts = {'ok': 0, 'busy': 0, 'errors': 0}
+    latencies = []
+    lock = threading.Lock()
+    stop = threading.Event()
+    start = threading.Barrier(login_threads + catalog_threads + 1)
+
+    def login(worker):
+        start.wait()
+        n = worker
+        while not stop.is_set():
+            client = app.test_client()
+            status = client.post('/login', data={'username': f'user{n % users}', 'password': PASSWORD}).status_code
+            outcome = 'ok' if status == 302 else 'busy' if status == 503 else 'errors'
+            with lock:
+                counts[outcome] += 1
+            if outcome == 'busy':
+                time.sleep(BUSY_BACKOFF)  # el formulario muestra "intenta de nuevo en unos segundos"
+            n += login_threads
+
+    def catalog():
+        client = app.test_client()
+        start.wait()
+        while not stop.is_set():
+            started = time.perf_counter()
+            client.get('/')
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.01)
+
+    workers = [threading.Thread(target=login, args=(i,)) for i in range(login_threads)]
+    workers += [threading.Thread(target=catalog) for _ in range(catalog_threads)]
+    for worker in workers:
+        worker.start()
+    start.wait()
+    time.sleep(seconds)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    return counts, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--login-threads', type=int, default=16)
+    parser.add_argument('--catalog-threads', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--users', type=int, default=200)
+    args = parser.parse_args()
+
+    app.config['TESTING'] = True
+    limiter.enabled = False
+    legacy_hash = generate_password_hash(PASSWORD, method=f'pbkdf2:sha256:{LEGACY_ITERATIONS}')
+    with app.app_context():
+        db.create_all()
+        for i in range(args.users):
+            db.session.add(User(username=f'user{i}', email=f'user{i}@example.com',
+                                password_hash=legacy_hash, role='student'))
+        db.session.commit()
+
+    header(f"⏱️  BENCHMARK avalancha de logins: {args.login_threads} hilos de login, "
+           f"{args.catalog_threads} de catálogo, {args.seconds:.0f} s, {os.cpu_count()} CPU")
+    print(f"{'Modo':<30} {'Logins/s':>9} {'503':>6} {'Errores':>8} {'Catálogo p50':>13} "
+          f"{'p95':>8} {'p99':>8} {'Rehash':>7}")
+    print("-" * 96)
+    modes = [
+        ('En el worker, PBKDF2', {'PASSWORD_POOL_WORKERS': 0, 'PASSWORD_HASH_ALGORITHM': 'pbkdf2',
+                                  'PBKDF2_ITERATIONS': LEGACY_ITERATIONS}),
+        ('Pool acotado, PBKDF2', {'PASSWORD_POOL_WORKERS': None, 'PASSWORD_HASH_ALGORITHM': 'pbkdf2',
+                                  'PBKDF2_ITERATIONS': LEGACY_ITERATIONS}),
+        ('Pool acotado, argon2id', {'PASSWORD_POOL_WORKERS': None, 'PASSWORD_HASH_ALGORITHM': 'argon2'}),
+    ]
+    for label, settings in modes:
+        app.config.update(settings)
+        password_pool.init_app(app)
+        if password_pool.workers:
+            password_pool.hash('calentamiento')  # arranca los procesos fuera de la medición
+        counts, latencies = storm(args.login_threads, args.catalog_threads, args.seconds, args.users)
+        with app.app_context():
+            upgraded = User.query.filter(User.password_hash.like('$argon2%')).count()
+        print(f"{label:<30} {counts['ok'] / args.seconds:>9.1f} {counts['busy']:>6} {counts['errors']:>8} "
+              f"{percentile(latencies, 50):>10.1f} ms {percentile(latencies, 95):>5.1f} ms "
+              f"{percentile(latencies, 99):>5.1f} ms {upgraded:>7}")
+    password_pool.shutdown()
+    print("\nRehash: usuarios cuyo hash PBKDF2 se actualizó a argon2id al iniciar sesión.")
+
+
+if __name__ == '__main__':
+    main()
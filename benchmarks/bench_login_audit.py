@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+"""
+Benchmark: registro de intentos de login bajo credential stuffing. Un commit por
+intento (LoginAttempt.log_attempt, como antes) frente a la cola de utils/audit.py
+(INSERT multi-fila cada LOGIN_AUDIT_FLUSH_MS)
+
+Unos hilos prueban credenciales de usuarios inexistentes por POST /login (sin
+hash: el registro del intento es casi todo el trabajo) mientras otros inician
+sesión de verdad. Informa intentos por segundo, latencia de los logins reales y
+commits. Comprueba además que un worker que muere sin flush no pierde sus
+intentos: otro proceso encuentra su spool y los inserta (recover).
+
+Uso: python benchmarks/bench_login_audit.py [--attackers 8] [--users 2] [--seconds 5]
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import threading
+import time
+
+from common import header, temp_db_path, make_app, StatementCounter
+
+# La app real, ligada a una base temporal (antes de importar app.py)
+DB_PATH = temp_db_path('login_audit.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+os.environ['ANALYTICS_CACHE_PATH'] = os.path.join(os.path.dirname(DB_PATH), 'analytics_cache.db')
+os.environ['ANALYTICS_COLUMNS_PATH'] = os.path.join(os.path.dirname(DB_PATH), 'columns')
+os.environ['RATELIMIT_PATH'] = os.path.join(os.path.dirname(DB_PATH), 'ratelimit.db')
+os.environ['LOGIN_AUDIT_SPOOL_DIR'] = os.path.join(os.path.dirname(DB_PATH), 'audit')
+
+from app import app, limiter  # noqa: E402
+from models import db, User, LoginAttempt  # noqa: E402
+from utils.audit import login_audit, LoginAuditWriter  # noqa: E402
+from utils.passwords import password_pool, hash_in_worker  # noqa: E402
+
+PASSWORD = 'semestre2026'
+CRASH_ATTEMPTS = 1_000
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+def storm(attackers, users, seconds):
+    counts = {'attempts': 0}
+    latencies = []
+    lock = threading.Lock()
+    stop = threading.Event()
+    start = threading.Barrier(attackers + users + 1)
+
+    def attacker(worker):
+        client = app.test_client()
+        start.wait()
+        n = 0
+        while not stop.is_set():
+            client.post('/login', data={'username': f'bot{worker}_{n}', 'password': 'hunter2'})
+            n += 1
+        with lock:
+            counts['attempts'] += n
+
+    def user(worker):
+        start.wait()
+        while not stop.is_set():
+            client = app.test_client()
+            started = time.perf_counter()
+            status = client.post('/login', data={'username': f'user{worker}', 'password': PASSWORD}).status_code
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+            assert status == 302, status
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=attacker, args=(i,)) for i in range(attackers)]
+    threads += [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return counts['attempts'], latencies
+
+
+def crashing_worker(db_path, spool_dir):
+    """Un worker que encola intentos y muere sin flush (como un OOM kill)"""
+    crash_app = make_app(db_path)
+    crash_app.config.update(LOGIN_AUDIT_FLUSH_MS=60_000, LOGIN_AUDIT_SPOOL_DIR=spool_dir)
+    writer = LoginAuditWriter(crash_app)
+    for i in range(CRASH_ATTEMPTS):
+        writer.record(f'crash{i}', '10.9.9.9', False)
+    os._exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--attackers', type=int, default=8)
+    parser.add_argument('--users', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    app.config.update(TESTING=True, LOGIN_LIMIT='1000000 per hour', PASSWORD_POOL_WORKERS=0,
+                      PASSWORD_HASH_ALGORITHM='pbkdf2', PBKDF2_ITERATIONS=1_000)
+    limiter.enabled = False
+    password_pool.init_app(app)
+    with app.app_context():
+        db.create_all()
+        password_hash = hash_in_worker(PASSWORD, password_pool.params)
+        for i in range(args.users):
+            db.session.add(User(username=f'user{i}', email=f'user{i}@example.com',
+                                password_hash=password_hash, role='admin'))
+        db.session.commit()
+        counter = StatementCounter(db.engine)
+
+    header(f"⏱️  BENCHMARK registro de intentos de login: {args.attackers} hilos de stuffing, "
+           f"{args.users} de logins reales, {args.seconds:.0f} s")
+    print(f"{'Modo':<32} {'Intentos/s':>11} {'Commits':>8} {'Login real p50':>15} {'p99':>9} {'En la BD':>9}")
+    print("-" * 90)
+    flush_ms = app.config['LOGIN_AUDIT_FLUSH_MS']
+    for label, interval in [('Un commit por intento', 0), (f'Cola + INSERT cada {flush_ms} ms', flush_ms / 1000)]:
+        login_audit.flush_interval = interval
+        with app.app_context():
+            LoginAttempt.query.delete()
+            db.session.commit()
+        counter.reset()
+        attempts, latencies = storm(args.attackers, args.users, args.seconds)
+        commits = counter.commits
+        login_audit.flush()
+        with app.app_context():
+            stored = LoginAttempt.query.count()
+        print(f"{label:<32} {attempts / args.seconds:>11.0f} {commits:>8,} {percentile(latencies, 50):>12.1f} ms "
+              f"{percentile(latencies, 99):>6.1f} ms {stored:>9,}")
+
+    # Un worker muere sin flush: su spool se recupera desde otro proceso
+    ctx = multiprocessing.get_context('spawn')
+    process = ctx.Process(target=crashing_worker, args=(DB_PATH, login_audit.spool_dir))
+    process.start()
+    process.join()
+    started = time.perf_counter()
+    recovered = login_audit.recover()
+    elapsed = (time.perf_counter() - started) * 1000
+    with app.app_context():
+        stored = LoginAttempt.query.filter(LoginAttempt.username.like('crash%')).count()
+    print(f"\nWorker caído (exit {process.exitcode}) con {CRASH_ATTEMPTS} intentos en cola: {recovered} recuperados "
+          f"del spool en {elapsed:.1f} ms, {stored} en la BD {'✅' if stored == CRASH_ATTEMPTS else '❌'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+Benchmark: lote NFC (/api/nfc/batch, /nfc/api/batch) con el bucle por operación
+frente a utils.inventory.apply_nfc_batch
+
+Uso: python benchmarks/bench_nfc_batch.py [--ops 10000]
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+
+from sqlalchemy import event
+
+from common import header, temp_db_path, make_app, seed
+from models import db, Item, Transaction
+from utils.inventory import apply_nfc_batch
+
+
+def legacy_batch(operations):
+    """Bucle original: Item.query.get + consulta de renta por operación"""
+    results = []
+    for op in operations:
+        item = db.session.get(Item, op['item_id'])
+        if not item:
+            results.append({'success': False})
+            continue
+        if op['action'] == 'return':
+            rental = Transaction.query.filter(
+                Transaction.item_id == op['item_id'],
+                Transaction.kind == 'rent',
+                Transaction.returned == False
+            ).first()
+            if rental:
+                rental.returned = True
+                rental.return_date = datetime.utcnow()
+                item.stock += rental.qty
+                results.append({'success': True, 'new_stock': item.stock})
+            else:
+                results.append({'success': False})
+        else:
+            item.stock += op['qty']
+            results.append({'success': True, 'new_stock': item.stock})
+    return results
+
+
+def build_operations(app, count, rng):
+    with app.app_context():
+        rented = [row[0] for row in db.session.query(Transaction.item_id).filter(
+            Transaction.kind == 'rent', Transaction.returned == False
+        ).order_by(Transaction.id)]
+        item_count = Item.query.count()
+    operations = []
+    for _ in range(count):
+        if rng.random() < 0.6:
+            operations.append({'item_id': rng.choice(rented), 'action': 'return'})
+        else:
+            operations.append({'item_id': rng.randint(1, item_count), 'action': 'restock', 'qty': rng.randint(1, 5)})
+    return operations
+
+
+def run(app, fn, operations):
+    queries = [0]
+    
+    def count(*args):
+        queries[0] += 1
+    
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+        start = time.perf_counter()
+        results = fn(operations)
+        db.session.commit()
+        elapsed = (time.perf_counter() - start) * 1000
+        event.remove(db.engine, 'before_cursor_execute', count)
+    return elapsed, queries[0], results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ops', type=int, default=10_000)
+    args = parser.parse_args()
+    
+    header(f"⏱️  BENCHMARK LOTE NFC - {args.ops:,} operaciones")
+    
+    timings = {}
+    final_state = {}
+    for name, fn in (('Bucle por operación', legacy_batch), ('apply_nfc_batch', apply_nfc_batch)):
+        db_path = temp_db_path()
+        app = make_app(db_path)
+        seed(db_path, transactions=200_000, items=5_000, users=2_000)
+        operations = build_operations(app, args.ops, random.Random(7))
+        elapsed, queries, results = run(app, fn, operations)
+        ok = sum(1 for r in results if r['success'])
+        timings[name] = elapsed
+        with app.app_context():
+            final_state[name] = (
+                db.session.query(db.func.sum(Item.stock)).scalar(),
+                Transaction.query.filter_by(kind='rent', returned=False).count()
+            )
+        print(f"{name:<22} {elapsed:>9.1f} ms  {queries:>6} consultas  {ok:>6} exitosas")
+    
+    same = len(set(final_state.values())) == 1
+    print(f"\nEstado final idéntico (stock total, rentas abiertas): {'✅' if same else '❌'} {final_state}")
+    print(f"Aceleración: {timings['Bucle por operación'] / timings['apply_nfc_batch']:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+Benchmark: paginación OFFSET + COUNT(*) (paginate) frente a keyset (timestamp, id)
+en la página 1 y en la página 10.000 del historial de transacciones
+
+Uso: python benchmarks/bench_pagination.py [--transactions 1000000] [--per-page 30]
+"""
+import argparse
+
+from common import header, temp_db_path, make_app, seed, timed
+from models import db, Transaction
+from utils.pagination import next_cursor_for
+
+KEYS = (Transaction.timestamp, Transaction.id)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--transactions', type=int, default=1_000_000)
+    parser.add_argument('--per-page', type=int, default=30)
+    parser.add_argument('--deep-page', type=int, default=10_000)
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    app = make_app(db_path)
+    seed(db_path, transactions=args.transactions, items=2_000, users=1_000)
+
+    header(f"⏱️  BENCHMARK paginación ({args.transactions:,} transacciones, {args.per_page} por página)")
+    print(f"{'Filtro':>8} {'Página':>8} {'OFFSET (ms)':>12} {'Keyset (ms)':>12} {'Iguales':>8}")
+    print("-" * 52)
+    with app.app_context():
+        for kind in (None, 'buy'):
+            # Cursor que apunta al final de la página anterior a la consultada (sin cronometrar)
+            cursors = {1: ''}
+            previous = Transaction.search(page=args.deep_page - 1, per_page=args.per_page, kind=kind)
+            cursors[args.deep_page] = next_cursor_for(previous.items, KEYS, previous.has_next)
+
+            for page in (1, args.deep_page):
+                offset_ms, by_offset = timed(
+                    lambda: Transaction.search(page=page, per_page=args.per_page, kind=kind))
+                keyset_ms, by_keyset = timed(
+                    lambda: Transaction.search(per_page=args.per_page, kind=kind, cursor=cursors[page]))
+                same = [t.id for t in by_offset.items] == [t.id for t in by_keyset.items]
+                print(f"{kind or 'todas':>8} {page:>8,} {offset_ms:>12.1f} {keyset_ms:>12.1f} {'✅' if same else '❌':>8}")
+        db.session.remove()
+
+
+if __name__ == '__main__':
+    main()
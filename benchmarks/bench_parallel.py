@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Benchmark: paneles predictive_analytics y supplier_intelligence en serie frente
+al pool de hilos (una sesión por tarea):
+- consultas por filas: get_predictive_analytics/get_supplier_intelligence, que
+  reparten sus análisis con run_parallel
+- motor columnar (lo que sirven los snapshots de /admin/predictive y
+  /admin/suppliers): solo analyze_supplier_comparison va al pool, solapada con
+  el cálculo sobre columnas
+
+Con un solo núcleo el paralelismo aporta poco: SQLite y NumPy liberan el GIL,
+pero la CPU es la misma. La ganancia aparece con varios núcleos o con una base
+remota, donde analyze_supplier_comparison espera a la red.
+
+Uso: python benchmarks/bench_parallel.py [--transactions 1000000]
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+
+from common import header, temp_db_path, make_app, seed, timed
+from utils.analytics import (
+    analyze_slow_rotation, analyze_slow_suppliers, analyze_supplier_comparison,
+    forecast_revenue, get_predictive_analytics, get_supplier_intelligence, get_trending_products,
+)
+from utils.cache import analytics_cache
+from utils.columnar import ColumnarAnalytics
+from utils.parallel import run_parallel
+
+
+def report_parts(panels):
+    """Imprime el tiempo de cada parte; devuelve (suma, suma de los máximos por panel)"""
+    sequential_ms = ideal_ms = 0
+    for panel, parts in panels.items():
+        print(f"{panel}")
+        part_times = []
+        for name, fn in parts:
+            part_ms, _ = timed(fn)
+            part_times.append(part_ms)
+            print(f"  {name:<30} {part_ms:>10.1f} ms")
+        sequential_ms += sum(part_times)
+        ideal_ms += max(part_times)
+    return sequential_ms, ideal_ms
+
+
+def report_totals(label, sequential_ms, ideal_ms, parallel_ms, predictive, supplier):
+    complete = 'partial' not in predictive and 'partial' not in supplier
+    print(f"En serie (suma de las partes)       {sequential_ms:>10.1f} ms")
+    print(f"Ideal con núcleos libres (máximos)  {ideal_ms:>10.1f} ms")
+    print(f"{label:<35} {parallel_ms:>10.1f} ms   completos: {'✅' if complete else '❌'}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--transactions', type=int, default=1_000_000)
+    parser.add_argument('--items', type=int, default=2_000)
+    args = parser.parse_args()
+
+    db_path = temp_db_path()
+    app = make_app(db_path)
+    seed(db_path, transactions=args.transactions, items=args.items, users=1_000)
+    # Como en app.py: con la caché activa, refresh() sabe que no hubo escrituras
+    app.config['ANALYTICS_CACHE_PATH'] = os.path.join(os.path.dirname(db_path), 'analytics_cache.db')
+    analytics_cache.init_app(app)
+
+    header(f"⏱️  BENCHMARK análisis en paralelo ({args.transactions:,} transacciones, {os.cpu_count()} CPU)")
+    with app.app_context():
+        # Consultas por filas: cada panel reparte sus análisis con run_parallel
+        row_parts = {
+            'get_predictive_analytics': [
+                ('forecast_revenue', lambda: forecast_revenue(weeks=12)),
+                ('get_trending_products', lambda: get_trending_products(days=30, limit=8)),
+            ],
+            'get_supplier_intelligence': [
+                ('analyze_slow_suppliers', analyze_slow_suppliers),
+                ('analyze_slow_rotation', analyze_slow_rotation),
+                ('analyze_supplier_comparison', analyze_supplier_comparison),
+            ],
+        }
+        sequential_ms, ideal_ms = report_parts(row_parts)
+        parallel_ms, (predictive, supplier) = timed(
+            lambda: (get_predictive_analytics(), get_supplier_intelligence())
+        )
+        report_totals('run_parallel (consultas por filas)', sequential_ms, ideal_ms, parallel_ms,
+                      predictive, supplier)
+
+        engine = ColumnarAnalytics()
+        s = engine.refresh()  # carga fuera de la medición: el snapshot la reutiliza
+        today = datetime.utcnow().date()
+
+        # Cada parte por separado: en paralelo, el panel tarda lo que la más lenta
+        panels = {
+            'predictive_analytics': [
+                ('forecast_revenue', lambda: engine._forecast_revenue(s, today)),
+                ('trending_products', lambda: engine._trending_products(s, today)),
+                ('total_transactions', lambda: int(s.valid().sum())),
+            ],
+            'supplier_intelligence': [
+                ('slow_suppliers', lambda: engine._slow_suppliers(s)),
+                ('slow_rotation', lambda: engine._slow_rotation(s, today)),
+                ('analyze_supplier_comparison', analyze_supplier_comparison),
+            ],
+        }
+        sequential_ms, ideal_ms = report_parts(panels)
+        # Solo supplier_intelligence usa el pool (la comparación de proveedores);
+        # el ideal es el del solapamiento completo de todas las partes
+        parallel_ms, (predictive, supplier) = timed(
+            lambda: (engine.predictive_analytics(), engine.supplier_intelligence())
+        )
+        report_totals('columnar, comparación solapada', sequential_ms, ideal_ms, parallel_ms,
+                      predictive, supplier)
+
+        # Tiempo agotado: la tarea lenta aporta su valor por defecto y el resto llega igual
+        started = time.perf_counter()
+        results, failed = run_parallel({
+            'rapida': (lambda: 'ok', None),
+            'lenta': (lambda: time.sleep(2) or 'tarde', 'por defecto'),
+        }, timeout=0.5)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"Con timeout de 0,5 s y una tarea de 2 s: {elapsed_ms:.0f} ms, {results}, fallidas: {failed}")
+
+
+if __name__ == '__main__':
+    main()
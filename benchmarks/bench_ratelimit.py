@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Benchmark: coste por comprobación de rate limit. El conteo anterior
+(COUNT de intentos fallidos de la IP en la ventana) frente al token bucket de
+utils/ratelimit.py (lectura / escritura por clave primaria en un archivo compartido)
+
+También comprueba que varios procesos comparten el conteo: N procesos golpean la
+misma clave y el total permitido debe ser exactamente el límite.
+
+Uso: python benchmarks/bench_ratelimit.py [--attempts 1000 100000] [--processes 4]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from common import header, temp_db_path, make_app, timed
+from models import db, LoginAttempt
+from utils.ratelimit import RateLimiter
+
+CHECKS = 2_000
+
+
+def seed_attempts(attempts, attacker_share=0.2):
+    """Intentos fallidos en los últimos 15 minutos; una parte desde la IP atacante"""
+    now = datetime.utcnow()
+    rows = []
+    for i in range(attempts):
+        ip = '10.0.0.66' if random.random() < attacker_share else f'10.{i % 250}.{i % 199}.{i % 97}'
+        rows.append({'username': f'user{i % 500}', 'ip_address': ip, 'success': False,
+                     'timestamp': now - timedelta(seconds=random.uniform(0, 900))})
+    db.session.execute(LoginAttempt.__table__.insert(), rows)
+    db.session.commit()
+
+
+def count_failed_attempts(ip_address, minutes=15, max_attempts=5):
+    """Comprobación anterior (LoginAttempt.check_rate_limit): COUNT en la tabla de intentos"""
+    cutoff_time = datetime.utcnow() - timedelta(minutes=minutes)
+    failed_attempts = LoginAttempt.query.filter(
+        LoginAttempt.ip_address == ip_address,
+        LoginAttempt.success == False,
+        LoginAttempt.timestamp >= cutoff_time
+    ).count()
+    return failed_attempts >= max_attempts
+
+
+def worker(path, hits, result_queue):
+    limiter = RateLimiter()
+    limiter.path = path
+    allowed = sum(limiter.hit('shared', 1_000, 3600)[0] for _ in range(hits))
+    result_queue.put(allowed)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--attempts', type=int, nargs='+', default=[1_000, 100_000])
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+
+    header("⏱️  BENCHMARK rate limiting: coste por comprobación")
+    print(f"{'Intentos en tabla':>18} {'Modo':<32} {'µs / comprobación':>18}")
+    print("-" * 70)
+    for attempts in args.attempts:
+        db_path = temp_db_path()
+        app = make_app(db_path)
+        app.config['RATELIMIT_PATH'] = os.path.join(os.path.dirname(db_path), 'ratelimit.db')
+        limiter = RateLimiter(app)
+        with app.app_context():
+            seed_attempts(attempts)
+            count_ms, _ = timed(lambda: [count_failed_attempts('10.0.0.66') for _ in range(CHECKS)], repeat=1)
+        peek_ms, _ = timed(lambda: [limiter.peek('login:10.0.0.66', 5, 900) for _ in range(CHECKS)], repeat=1)
+        hit_ms, _ = timed(lambda: [limiter.hit(f'api:{i % 50}', 10**9, 3600) for i in range(CHECKS)], repeat=1)
+        # En memoria, más la sincronización en lote (una transacción para las 50 claves)
+        deferred_ms, _ = timed(lambda: ([limiter.hit_deferred(f'api:{i % 50}', 10**9, 3600) for i in range(CHECKS)],
+                                        limiter.sync()), repeat=1)
+        for label, elapsed_ms in [('COUNT en LoginAttempt', count_ms), ('token bucket: peek (login)', peek_ms),
+                                  ('token bucket: hit (API)', hit_ms),
+                                  ('token bucket: hit_deferred (API)', deferred_ms)]:
+            print(f"{attempts:>18,} {label:<32} {elapsed_ms * 1000 / CHECKS:>18.1f}")
+
+    # Conteo compartido entre procesos: límite 1000, el doble de peticiones repartidas
+    path = os.path.join(os.path.dirname(temp_db_path()), 'ratelimit.db')
+    app = make_app(os.path.join(os.path.dirname(path), 'shared.db'))
+    app.config['RATELIMIT_PATH'] = path
+    RateLimiter(app)
+    hits = 2 * 1_000 // args.processes
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    started = time.perf_counter()
+    processes = [ctx.Process(target=worker, args=(path, hits, queue)) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    allowed = sum(queue.get() for _ in processes)
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+    print(f"\n{args.processes} procesos x {hits} peticiones sobre una clave con límite 1000: "
+          f"{allowed} permitidas en {elapsed:.2f} s {'✅' if allowed == 1_000 else '❌'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Benchmark: get_reorder_recommendations (consulta agregada + numpy + heap) frente
+al bucle anterior de get_analytics_data con dos COUNT por item con stock bajo
+
+Uso: python benchmarks/bench_reorder.py [--items 50000] [--transactions 1000000] [--top 50]
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func
+
+from common import header, temp_db_path, make_app, seed, timed
+from models import db, Item, Transaction
+from utils.analytics import get_reorder_recommendations
+
+
+def legacy_reorder(limit=3):
+    """Bucle anterior de get_analytics_data (copia para comparar)"""
+    today = datetime.utcnow().date()
+    thirty_days_ago = today - timedelta(days=30)
+    reorder = []
+    for item in Item.query.all():
+        if item.stock and item.stock <= (2 if item.rentable else 10):
+            total_tx = db.session.query(func.count(Transaction.id)).filter(
+                Transaction.item_id == item.id
+            ).scalar() or 0
+            
+            recent_tx = db.session.query(func.count(Transaction.id)).filter(
+                Transaction.item_id == item.id,
+                Transaction.timestamp >= thirty_days_ago
+            ).scalar() or 0
+            
+            consumption = recent_tx / 30.0 if recent_tx > 0 else 0
+            min_stock = max(2 if item.rentable else 10, int(consumption * 7))
+            
+            score = (recent_tx * 40) + ((min_stock - item.stock) * 30) + (total_tx * 0.3)
+            
+            reorder.append({
+                'item': item,
+                'score': score,
+                'consumption_rate': round(consumption, 2),
+                'recommended_stock': min_stock
+            })
+    
+    return sorted(reorder, key=lambda x: x['score'], reverse=True)[:limit]
+
+
+def measure(app, fn, repeat):
+    queries = [0]
+    
+    def count(*args):
+        queries[0] += 1
+    
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+        ms, result = timed(fn, repeat=repeat)
+        event.remove(db.engine, 'before_cursor_execute', count)
+        summary = [(r['item'].id, r['score'], r['consumption_rate'], r['recommended_stock']) for r in result]
+        db.session.remove()
+    return ms, queries[0] // repeat, summary
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=50_000)
+    parser.add_argument('--transactions', type=int, default=1_000_000)
+    parser.add_argument('--top', type=int, default=50)
+    args = parser.parse_args()
+    
+    header(f"⏱️  BENCHMARK REPOSICIÓN - {args.items:,} items, {args.transactions:,} transacciones, top {args.top}")
+    
+    db_path = temp_db_path()
+    app = make_app(db_path)
+    seed(db_path, transactions=args.transactions, items=args.items, users=5_000)
+    
+    legacy_ms, legacy_q, legacy = measure(app, lambda: legacy_reorder(args.top), repeat=1)
+    new_ms, new_q, new = measure(app, lambda: get_reorder_recommendations(args.top), repeat=5)
+    
+    print(f"Bucle anterior                 {legacy_ms:>9.1f} ms  {legacy_q:>6} consultas")
+    print(f"get_reorder_recommendations    {new_ms:>9.1f} ms  {new_q:>6} consultas")
+    print(f"Mismo top {args.top}: {'✅' if legacy == new else '❌'}")
+
+
+if __name__ == '__main__':
+    main()
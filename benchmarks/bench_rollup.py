@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+Benchmark: consultas del dashboard sobre transaction_daily_rollup frente a las
+mismas consultas sobre las filas de transaction, y costo del mantenimiento
+incremental (before_flush) al insertar transacciones
+
+Uso: python benchmarks/bench_rollup.py [--sizes 100000 1000000 3000000] [--items 300]
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, desc
+
+from common import header, temp_db_path, make_app, seed, timed
+from models import db, Item, Transaction, TransactionDailyRollup, _maintain_transaction_rollup
+
+
+# Copias de las consultas anteriores (sobre transaction), para comparar resultados
+def legacy_dashboard():
+    thirty_days_ago = datetime.utcnow().date() - timedelta(days=30)
+    daily = db.session.query(
+        Transaction.day, func.count(Transaction.id), Transaction.kind
+    ).filter(Transaction.day >= thirty_days_ago).group_by(Transaction.day, Transaction.kind).all()
+    popular = db.session.query(
+        Item.name, func.count(Transaction.id)
+    ).join(Transaction).group_by(Item.id).order_by(func.count(Transaction.id).desc(), Item.id).limit(5).all()
+    nfc = db.session.query(Transaction.kind, func.count(Transaction.id)).filter(
+        Transaction.day >= thirty_days_ago, Transaction.kind.in_(['return', 'restock'])
+    ).group_by(Transaction.kind).all()
+    return ([tuple(r) for r in daily], [tuple(r) for r in popular], sorted(tuple(r) for r in nfc))
+
+
+def rollup_dashboard():
+    thirty_days_ago = datetime.utcnow().date() - timedelta(days=30)
+    R = TransactionDailyRollup
+    daily = db.session.query(
+        R.day, func.sum(R.count), R.kind
+    ).filter(R.day >= thirty_days_ago).group_by(R.day, R.kind).all()
+    popular = db.session.query(
+        Item.name, func.sum(R.count)
+    ).join(R, R.item_id == Item.id).group_by(Item.id).order_by(func.sum(R.count).desc(), Item.id).limit(5).all()
+    nfc = db.session.query(R.kind, func.sum(R.count)).filter(
+        R.day >= thirty_days_ago, R.kind.in_(['return', 'restock'])
+    ).group_by(R.kind).all()
+    return ([tuple(r) for r in daily], [tuple(r) for r in popular], sorted(tuple(r) for r in nfc))
+
+
+def _trending_bounds(days=30):
+    today = datetime.utcnow().date()
+    return [(today - timedelta(days=days), today - timedelta(days=days // 2)),
+            (today - timedelta(days=days // 2), today)]
+
+
+def legacy_trending_periods():
+    """Consultas por mitad de período de get_trending_products, sobre transaction"""
+    return [sorted(tuple(r) for r in db.session.query(
+        Item.id, func.count(Transaction.id), func.sum(Transaction.qty)
+    ).join(Transaction).filter(
+        Transaction.timestamp >= start, Transaction.timestamp <= end,
+        Transaction.kind.in_(['buy', 'rent'])
+    ).group_by(Item.id).all()) for start, end in _trending_bounds()]
+
+
+def rollup_trending_periods():
+    """Las mismas consultas sobre el agregado diario"""
+    R = TransactionDailyRollup
+    return [sorted(tuple(r) for r in db.session.query(
+        Item.id, func.sum(R.count), func.sum(R.qty)
+    ).join(R, R.item_id == Item.id).filter(
+        R.day >= start, R.day < end,
+        R.kind.in_(['buy', 'rent'])
+    ).group_by(Item.id).all()) for start, end in _trending_bounds()]
+
+
+def insert_many(n):
+    """n transacciones nuevas, un commit por transacción (como el flujo web)"""
+    for i in range(n):
+        db.session.add(Transaction(item_id=(i % 500) + 1, user_id=1, kind='buy', qty=1))
+        db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000, 3_000_000])
+    parser.add_argument('--items', type=int, default=300)
+    parser.add_argument('--inserts', type=int, default=2_000)
+    args = parser.parse_args()
+
+    header("⏱️  BENCHMARK transaction_daily_rollup")
+    print(f"{'Transacciones':>14} {'Filas rollup':>13} {'Dashboard (ms)':>15} {'Rollup (ms)':>12} "
+          f"{'Trending (ms)':>14} {'Rollup (ms)':>12} {'Iguales':>8}")
+    print("-" * 96)
+    for size in args.sizes:
+        db_path = temp_db_path()
+        app = make_app(db_path)
+        seed(db_path, transactions=size, items=args.items, users=1_000, days=730)
+
+        with app.app_context():
+            rollup_rows = TransactionDailyRollup.query.count()
+            legacy_ms, legacy = timed(legacy_dashboard)
+            rollup_ms, rolled = timed(rollup_dashboard)
+            legacy_trend_ms, legacy_trend = timed(legacy_trending_periods)
+            trend_ms, rolled_trend = timed(rollup_trending_periods)
+            same = legacy == rolled and legacy_trend == rolled_trend
+            db.session.remove()
+        print(f"{size:>14,} {rollup_rows:>13,} {legacy_ms:>15.1f} {rollup_ms:>12.1f} "
+              f"{legacy_trend_ms:>14.1f} {trend_ms:>12.1f} {'✅' if same else '❌':>8}")
+
+    # Costo de escritura: mismo flujo con y sin el listener before_flush
+    db_path = temp_db_path()
+    app = make_app(db_path)
+    seed(db_path, transactions=10_000, items=500, users=10)
+    with app.app_context():
+        with_ms, _ = timed(lambda: insert_many(args.inserts), repeat=1)
+        event.remove(db.session, 'before_flush', _maintain_transaction_rollup)
+        without_ms, _ = timed(lambda: insert_many(args.inserts), repeat=1)
+        event.listen(db.session, 'before_flush', _maintain_transaction_rollup)
+        db.session.remove()
+    print(f"\n{args.inserts:,} inserciones (un commit c/u): {without_ms:.0f} ms sin rollup, "
+          f"{with_ms:.0f} ms con rollup ({(with_ms / without_ms - 1) * 100:+.0f} %)")
+
+
+if __name__ == '__main__':
+    main()
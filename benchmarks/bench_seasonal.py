@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+"""
+Benchmark: calculate_seasonal_demand (GROUP BY mes en la BD) frente a la versión
+anterior que cargaba todas las Transaction como objetos ORM. Mide latencia y
+pico de memoria Python (tracemalloc).
+
+Uso: python benchmarks/bench_seasonal.py [--sizes 1000000 10000000] [--legacy-max 1000000]
+"""
+import argparse
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+
+from common import header, temp_db_path, make_app, seed
+from models import db, Transaction
+from utils.analytics import calculate_seasonal_demand
+
+
+# Copia de la implementación anterior, para comparar
+def legacy_calculate_seasonal_demand():
+    """Analiza patrones estacionales y predice demanda para próximos 3 meses"""
+    try:
+        all_transactions = Transaction.query.filter(
+            Transaction.timestamp != None
+        ).all()
+        
+        if not all_transactions:
+            return {'peaks': {}, 'forecast': {}, 'seasonal_pattern': {}}
+        
+        seasonal_pattern = defaultdict(int)
+        
+        for t in all_transactions:
+            if t.timestamp:
+                month = t.timestamp.month
+                month_name = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
+                             'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre'][month - 1]
+                seasonal_pattern[month_name] += 1
+        
+        if seasonal_pattern:
+            avg_transactions = sum(seasonal_pattern.values()) / len(seasonal_pattern)
+            peaks = {}
+            
+            back_to_school = ['Julio', 'Agosto', 'Septiembre']
+            christmas = ['Noviembre', 'Diciembre']
+            midterm = ['Marzo', 'Octubre', 'Noviembre']
+            
+            for month, count in seasonal_pattern.items():
+                if month in back_to_school:
+                    peaks[month] = {
+                        'type': 'Escolar (Vuelta a clases)',
+                        'intensity': count / avg_transactions if avg_transactions > 0 else 1
+                    }
+                elif month in christmas:
+                    peaks[month] = {
+                        'type': 'Fin de Año',
+                        'intensity': count / avg_transactions if avg_transactions > 0 else 1
+                    }
+                elif month in midterm and count > avg_transactions:
+                    peaks[month] = {
+                        'type': 'Semana de Parciales',
+                        'intensity': count / avg_transactions if avg_transactions > 0 else 1
+                    }
+            
+            today = datetime.utcnow()
+            current_month = today.month
+            forecast = {}
+            
+            for i in range(1, 4):
+                future_month = (current_month + i - 1) % 12 + 1
+                month_name = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
+                            'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre'][future_month - 1]
+                
+                historical = seasonal_pattern.get(month_name, 0)
+                predicted = int(historical * 1.05) if historical > 0 else int(avg_transactions)
+                peak_indicator = 'Alza' if predicted > avg_transactions * 1.2 else 'Normal'
+                
+                forecast[month_name] = {
+                    'predicted_transactions': predicted,
+                    'trend': peak_indicator,
+                    'vs_average': f"+{((predicted / avg_transactions - 1) * 100):.0f}%" if avg_transactions > 0 else "0%"
+                }
+            
+            return {
+                'peaks': peaks,
+                'forecast': forecast,
+                'seasonal_pattern': dict(seasonal_pattern),
+                'average_monthly': int(avg_transactions)
+            }
+    
+    except Exception as e:
+        print(f"Error en calculate_seasonal_demand: {str(e)}")
+        return {'peaks': {}, 'forecast': {}, 'seasonal_pattern': {}, 'error': str(e)}
+
+def get_reorder_recommendations(limit=3):
+    """Top-k de items a reponer: una consulta agregada + puntaje vectorizado + heap"""
+    thirty_days_ago = datetime.utcnow().date() - timedelta(days=30)
+    
+    # Candidatos con stock bajo (2 si es rentable, 10 si no) y sus conteos total / 30 días
+    rows = db.session.query(
+        Item.id,
+        Item.stock,
+        Item.rentable,
+        func.count(Transaction.id),
+        func.coalesce(func.sum(case((Transaction.timestamp >= thirty_days_ago, 1), else_=0)), 0)
+    ).outerjoin(
+        Transaction, Transaction.item_id == Item.id
+    ).filter(
+        Item.stock != 0,
+        Item.stock <= case((Item.rentable == True, 2), else_=10)
+    ).group_by(Item.id).order_by(Item.id).all()
+    
+    if not rows:
+        return []
+    
+    item_ids, stock, rentable, total_tx, recent_tx = (np.array(col) for col in zip(*rows))
+    rentable = rentable.astype(bool)
+    
+    consumption = recent_tx / 30.0
+    min_stock = np.maximum(np.where(rentable, 2, 10), (consumption * 7).astype(np.int64))
+    scores = (recent_tx * 40) + ((min_stock - stock) * 30) + (total_tx * 0.3)
+    
+    # nlargest conserva el orden estable de sorted(..., reverse=True)[:limit]
+    top = heapq.nlargest(limit, range(len(item_ids)), key=scores.tolist().__getitem__)
+    items = {item.id: item for item in Item.query.filter(Item.id.in_([int(item_ids[i]) for i in top]))}
+    
+    return [{
+        'item': items[int(item_ids[i])],
+        'score': float(scores[i]),
+        'consumption_rate': round(float(consumption[i]), 2),
+        'recommended_stock': int(min_stock[i]),
+        'recent_transactions': int(recent_tx[i]),
+        'transaction_count': int(total_tx[i])
+    } for i in top]
+
+
+
+def measure(app, fn):
+    with app.app_context():
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        db.session.remove()
+    return elapsed, peak / (1024 * 1024), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--legacy-max', type=int, default=1_000_000,
+                        help='no ejecutar la versión anterior por encima de este tamaño (RAM)')
+    args = parser.parse_args()
+    
+    header("⏱️  BENCHMARK calculate_seasonal_demand")
+    print(f"{'Transacciones':>14} {'Versión':<10} {'Tiempo (ms)':>12} {'Pico memoria (MB)':>18} {'Iguales':>8}")
+    print("-" * 68)
+    for size in args.sizes:
+        db_path = temp_db_path()
+        app = make_app(db_path)
+        seed(db_path, transactions=size, items=5_000, users=5_000)
+        
+        new_ms, new_mb, new = measure(app, calculate_seasonal_demand)
+        same = '-'
+        if size <= args.legacy_max:
+            legacy_ms, legacy_mb, legacy = measure(app, legacy_calculate_seasonal_demand)
+            same = '✅' if legacy == new else '❌'
+            print(f"{size:>14,} {'anterior':<10} {legacy_ms:>12.1f} {legacy_mb:>18.1f}")
+        print(f"{size:>14,} {'GROUP BY':<10} {new_ms:>12.1f} {new_mb:>18.3f} {same:>8}")
+
+
+if __name__ == '__main__':
+    main()
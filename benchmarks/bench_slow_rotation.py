@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+Benchmark: analyze_slow_rotation (una consulta agrupada) frente a la versión
+anterior con dos COUNT por item + carga perezosa del proveedor
+
+Uso: python benchmarks/bench_slow_rotation.py [--sizes 1000 5000 20000]
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from common import header, temp_db_path, make_app, seed, timed
+from models import db, Item, Transaction
+from utils.analytics import analyze_slow_rotation
+
+
+# Copia de la implementación anterior, para comparar resultados y consultas
+def legacy_analyze_slow_rotation():
+    """Identifica productos con rotación lenta"""
+    try:
+        today = datetime.utcnow().date()
+        thirty_days_ago = today - timedelta(days=30)
+        
+        slow_rotation_items = []
+        
+        items = Item.query.all()
+        
+        for item in items:
+            # Transacciones últimos 30 días
+            recent_sales = Transaction.query.filter(
+                Transaction.item_id == item.id,
+                Transaction.kind.in_(['buy', 'rent']),
+                Transaction.timestamp >= thirty_days_ago
+            ).count()
+            
+            # Transacciones últimas 12 semanas
+            twelve_weeks_ago = today - timedelta(weeks=12)
+            historical_sales = Transaction.query.filter(
+                Transaction.item_id == item.id,
+                Transaction.kind.in_(['buy', 'rent']),
+                Transaction.timestamp >= twelve_weeks_ago
+            ).count()
+            
+            # Calcular velocidad
+            daily_velocity = recent_sales / 30.0
+            historical_velocity = historical_sales / 84.0 if historical_sales > 0 else 0
+            
+            # Determinar si es lento
+            if daily_velocity < 0.5 and item.stock > 5:  # Menos de 1 cada 2 días
+                rotation_status = "🐢 LENTO"
+                priority = "ALTO"
+            elif daily_velocity < 1.0 and item.stock > 10:
+                rotation_status = "🚶 MODERADO"
+                priority = "MEDIO"
+            else:
+                rotation_status = "⚡ RÁPIDO"
+                priority = "BAJO"
+            
+            # Si tiene rotación histórica pero ahora es lenta
+            if historical_velocity > 1 and daily_velocity < 0.3:
+                trend = "📉 CAÍDA FUERTE"
+            elif daily_velocity > historical_velocity:
+                trend = "📈 MEJORANDO"
+            else:
+                trend = "➡️ ESTABLE"
+            
+            # Obtener nombre de proveedor de forma safe
+            supplier_name = 'Sin proveedor'
+            try:
+                if hasattr(item, 'supplier') and item.supplier:
+                    supplier_name = item.supplier.name
+            except:
+                supplier_name = 'Sin proveedor'
+            
+            if rotation_status != "⚡ RÁPIDO":  # Solo reportar items lento/moderados
+                slow_rotation_items.append({
+                    'item_id': item.id,
+                    'name': item.name,
+                    'category': item.category,
+                    'supplier_id': getattr(item, 'supplier_id', None),
+                    'supplier_name': supplier_name,
+                    'price': item.price,
+                    'stock': item.stock,
+                    'recent_sales_30d': recent_sales,
+                    'daily_velocity': round(daily_velocity, 2),
+                    'historical_velocity': round(historical_velocity, 2),
+                    'rotation_status': rotation_status,
+                    'trend': trend,
+                    'priority': priority
+                })
+        
+        return sorted(slow_rotation_items, key=lambda x: x['daily_velocity'])
+    
+    except Exception as e:
+        print(f"Error en analyze_slow_rotation: {str(e)}")
+        return []
+
+
+
+def measure(app, fn):
+    queries = [0]
+    
+    def count(*args):
+        queries[0] += 1
+    
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+        ms, result = timed(fn, repeat=1)
+        event.remove(db.engine, 'before_cursor_execute', count)
+        db.session.remove()
+    return ms, queries[0], result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 5_000, 20_000])
+    args = parser.parse_args()
+    
+    header("⏱️  BENCHMARK analyze_slow_rotation")
+    print(f"{'Items':>8} {'Anterior (ms)':>14} {'Consultas':>10} {'Nueva (ms)':>11} {'Consultas':>10} {'Iguales':>8}")
+    print("-" * 66)
+    for size in args.sizes:
+        db_path = temp_db_path()
+        app = make_app(db_path)
+        seed(db_path, transactions=size * 10, items=size, users=1_000, days=120)
+        
+        legacy_ms, legacy_queries, legacy = measure(app, legacy_analyze_slow_rotation)
+        new_ms, new_queries, new = measure(app, analyze_slow_rotation)
+        same = legacy == new
+        print(f"{size:>8,} {legacy_ms:>14.1f} {legacy_queries:>10} {new_ms:>11.1f} {new_queries:>10} {'✅' if same else '❌':>8}")
+
+
+if __name__ == '__main__':
+    main()
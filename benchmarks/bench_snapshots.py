@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Benchmark: paneles de admin servidos desde analytics_snapshot frente al cálculo
+en la petición, con distintos tamaños de historial
+
+Uso: python benchmarks/bench_snapshots.py [--sizes 100000 1000000]
+"""
+import argparse
+
+from common import header, temp_db_path, make_app, seed, timed
+from models import db, AnalyticsSnapshot
+from utils.snapshots import SNAPSHOT_FUNCTIONS, refresh_snapshots, get_snapshot
+
+
+def compute_all():
+    return [fn() for fn in SNAPSHOT_FUNCTIONS.values()]
+
+
+def from_snapshots():
+    data = [get_snapshot(name)[0] for name in SNAPSHOT_FUNCTIONS]
+    db.session.expunge_all()  # como en una petición nueva: nada queda en la identity map
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    header("⏱️  BENCHMARK snapshots de analytics (3 paneles)")
+    print(f"{'Transacciones':>14} {'Cálculo (ms)':>13} {'Job (ms)':>10} {'Snapshot (ms)':>14} {'Iguales':>8}")
+    print("-" * 64)
+    for size in args.sizes:
+        db_path = temp_db_path()
+        app = make_app(db_path)
+        seed(db_path, transactions=size, items=2_000, users=1_000)
+
+        with app.app_context():
+            compute_ms, fresh = timed(compute_all, repeat=1)
+            job_ms, _ = timed(refresh_snapshots, repeat=1)
+            snapshot_ms, served = timed(from_snapshots)
+            same = [v['general'] if 'general' in v else sorted(v) for v in fresh] == \
+                   [v['general'] if 'general' in v else sorted(v) for v in served]
+            assert AnalyticsSnapshot.query.count() == len(SNAPSHOT_FUNCTIONS)
+            db.session.remove()
+        print(f"{size:>14,} {compute_ms:>13.1f} {job_ms:>10.1f} {snapshot_ms:>14.1f} {'✅' if same else '❌':>8}")
+
+
+if __name__ == '__main__':
+    main()
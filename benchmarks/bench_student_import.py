@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""
+Benchmark: alta de estudiantes de un semestre. Una cuenta por formulario (el
+patrón de register_student: consulta de unicidad, hash y commit por cuenta)
+frente a la importación masiva de utils/student_import.py (archivo en
+streaming, una consulta IN por bloque, hashes en el pool de procesos e INSERT
+masivo)
+
+Sube el archivo por POST /admin/students/import como un admin, lo procesa con
+process_imports() (lo que hace worker.py) y consulta el progreso en paralelo
+por GET /admin/students/import/<id>. Al final activa una cuenta con su enlace.
+
+Las filas sin contraseña reciben un enlace de activación (sin hash caro); las
+filas con contraseña se hashean con argon2id en el pool, cuyo rendimiento
+escala con los núcleos: se mide una muestra y se proyecta a --accounts.
+
+Uso: python benchmarks/bench_student_import.py [--accounts 10000] [--with-password 200] [--legacy 100]
+"""
+import argparse
+import csv
+import io
+import os
+import threading
+import time
+import uuid
+
+from common import header, temp_db_path, StatementCounter
+
+# La app real, ligada a una base temporal (antes de importar app.py)
+DB_PATH = temp_db_path('student_import.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+os.environ['ANALYTICS_CACHE_PATH'] = os.path.join(os.path.dirname(DB_PATH), 'analytics_cache.db')
+os.environ['ANALYTICS_COLUMNS_PATH'] = os.path.join(os.path.dirname(DB_PATH), 'columns')
+os.environ['RATELIMIT_PATH'] = os.path.join(os.path.dirname(DB_PATH), 'ratelimit.db')
+os.environ['STUDENT_IMPORT_DIR'] = os.path.join(os.path.dirname(DB_PATH), 'imports')
+
+from app import app, limiter  # noqa: E402
+from models import db, User, ActiveSession, StudentImport  # noqa: E402
+from utils.security import hash_password  # noqa: E402
+from utils.passwords import password_pool  # noqa: E402
+from utils.student_import import process_imports  # noqa: E402
+
+PASSWORD = 'semestre2026'
+
+
+def legacy_register(email, password):
+    """Patrón de register_student: consulta de unicidad, hash y commit por cuenta"""
+    if User.query.filter_by(email=email).first():
+        return False
+    db.session.add(User(username=email.split('@')[0] + '_' + str(uuid.uuid4())[:8], email=email,
+                        password_hash=hash_password(password), role='student'))
+    db.session.commit()
+    return True
+
+
+def make_csv(prefix, accounts, with_password, repeated=0):
+    """CSV en memoria; `repeated` correos ya registrados al principio"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['email', 'password'])
+    for i in range(repeated):
+        writer.writerow([f'legacy{i}@example.com', ''])
+    for i in range(accounts):
+        writer.writerow([f'{prefix}{i}@example.com', PASSWORD if with_password else ''])
+    return output.getvalue().encode('utf-8')
+
+
+def admin_client():
+    """Cliente de prueba con la sesión de un admin"""
+    with app.app_context():
+        admin = User(username='admin', email='admin@example.com', password_hash='!', role='admin')
+        db.session.add(admin)
+        db.session.commit()
+        token = ActiveSession.create_session(admin.id, '127.0.0.1', '')
+        admin_id = admin.id
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = admin_id
+        sess['session_token'] = token
+    return client
+
+
+def run_import(client, name, payload):
+    """Sube el archivo, lo procesa como el worker y muestrea el progreso. (segundos, job, muestras)"""
+    response = client.post('/admin/students/import', data={'file': (io.BytesIO(payload), name)},
+                           content_type='multipart/form-data')
+    assert response.status_code == 302, response.status_code
+    with app.app_context():
+        job_id = StudentImport.query.order_by(StudentImport.id.desc()).first().id
+
+    samples, done = [], threading.Event()
+
+    def poll():
+        poller = app.test_client()
+        with client.session_transaction() as source, poller.session_transaction() as target:
+            target.update(source)
+        while not done.wait(0.25):
+            samples.append(poller.get(f'/admin/students/import/{job_id}').get_json()['percent'])
+
+    thread = threading.Thread(target=poll)
+    thread.start()
+    started = time.perf_counter()
+    with app.app_context():
+        process_imports()
+    elapsed = time.perf_counter() - started
+    done.set()
+    thread.join()
+    return elapsed, client.get(f'/admin/students/import/{job_id}').get_json(), samples
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--accounts', type=int, default=10_000)
+    parser.add_argument('--with-password', type=int, default=200)
+    parser.add_argument('--legacy', type=int, default=100)
+    args = parser.parse_args()
+
+    app.config['TESTING'] = True
+    limiter.enabled = False
+    with app.app_context():
+        db.create_all()
+        counter = StatementCounter(db.engine)
+    client = admin_client()
+    password_pool.hash('calentamiento')  # arranca los procesos fuera de la medición
+
+    header(f"⏱️  BENCHMARK importación de estudiantes ({args.accounts:,} cuentas, {os.cpu_count()} CPU, "
+           f"{password_pool.params['algorithm']})")
+    print(f"{'Modo':<40} {'Cuentas':>8} {'Segundos':>9} {'Cuentas/s':>10} {'Consultas':>10} "
+          f"{'Commits':>8} {'Proy. {:,}'.format(args.accounts):>12}")
+    print("-" * 104)
+
+    def report(label, accounts, elapsed):
+        rate = accounts / elapsed if elapsed else 0
+        print(f"{label:<40} {accounts:>8,} {elapsed:>9.2f} {rate:>10.1f} {counter.statements:>10,} "
+              f"{counter.commits:>8,} {args.accounts / rate if rate else 0:>10.1f} s")
+
+    # Una cuenta por formulario: muestra y proyección
+    with app.app_context():
+        counter.reset()
+        started = time.perf_counter()
+        for i in range(args.legacy):
+            legacy_register(f'legacy{i}@example.com', PASSWORD)
+        report('Una por formulario (register_student)', args.legacy, time.perf_counter() - started)
+
+    # Importación con contraseña: hashes argon2id en el pool
+    with app.app_context():
+        counter.reset()
+    elapsed, job, _ = run_import(client, 'con_password.csv', make_csv('pw', args.with_password, True))
+    report('Importación, con contraseña (pool)', job['created'], elapsed)
+
+    # Importación sin contraseña: enlaces de activación, el caso del semestre
+    with app.app_context():
+        counter.reset()
+    elapsed, job, samples = run_import(client, 'semestre.csv', make_csv('student', args.accounts, False, args.legacy))
+    report('Importación, enlaces de activación', job['created'], elapsed)
+
+    print(f"\nCreadas {job['created']:,}, omitidas {job['skipped']:,} (ya registradas: {args.legacy}), "
+          f"enlaces {job['activations']:,}, estado {job['status']}")
+    print(f"Progreso observado por GET /admin/students/import/{job['id']}: "
+          f"{', '.join(f'{p}%' for p in samples) or '-'} → {job['percent']}%")
+    print(f"{args.accounts:,} cuentas en menos de un minuto: {'✅' if elapsed < 60 else '❌'} ({elapsed:.1f} s)")
+
+    # Descargar los enlaces y activar una cuenta
+    links = client.get(f"/admin/students/import/{job['id']}/activations.csv").get_data(as_text=True).splitlines()
+    email, _, link = next(csv.reader([links[1]]))
+    path = link.split('localhost', 1)[1]
+    activation = app.test_client()
+    status = activation.post(path, data={'password': PASSWORD, 'password_confirm': PASSWORD}).status_code
+    login = activation.post('/student/login', data={'email': email, 'password': PASSWORD}).status_code
+    reuse = activation.get(path).status_code
+    print(f"Activación de {email}: HTTP {status}, login HTTP {login}, enlace reutilizado HTTP {reuse} "
+          f"{'✅' if (status, login, reuse) == (302, 302, 302) else '❌'}")
+    with app.app_context():
+        activated = User.query.filter_by(email=email).first()
+        print(f"Token consumido: {'✅' if activated.activation_token_hash is None else '❌'}")
+    password_pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
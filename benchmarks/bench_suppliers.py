@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+"""
+Benchmark: analyze_slow_suppliers (una consulta agrupada) frente a la versión
+anterior con tres consultas por proveedor + carga perezosa de items
+
+Uso: python benchmarks/bench_suppliers.py [--orders 10000 100000]
+"""
+import argparse
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from common import header, temp_db_path, make_app, seed, timed
+from models import db
+from utils.analytics import analyze_slow_suppliers
+
+STATUSES = ['delivered', 'pending', 'delayed', 'cancelled']
+STATUS_WEIGHTS = [70, 15, 10, 5]
+# La versión anterior usaba is_overdue(), que solo aplica a órdenes pendientes:
+# su puntualidad era siempre 100 %, así que esos campos no se comparan
+SKIP_FIELDS = {'punctuality_rate', 'risk_level'}
+
+
+# Copia de la implementación anterior, para comparar resultados y consultas
+def legacy_analyze_slow_suppliers():
+    """Identifica proveedores lentos (entregas atrasadas)"""
+    try:
+        from models import Supplier, PurchaseOrder
+        
+        suppliers_analysis = []
+        
+        suppliers = Supplier.query.all()
+        
+        for supplier in suppliers:
+            # Órdenes completadas
+            completed_orders = PurchaseOrder.query.filter(
+                PurchaseOrder.supplier_id == supplier.id,
+                PurchaseOrder.status == 'delivered'
+            ).all()
+            
+            # Órdenes retrasadas
+            delayed_orders = PurchaseOrder.query.filter(
+                PurchaseOrder.supplier_id == supplier.id,
+                PurchaseOrder.status == 'delayed'
+            ).count()
+            
+            # Órdenes pendientes
+            pending_orders = PurchaseOrder.query.filter(
+                PurchaseOrder.supplier_id == supplier.id,
+                PurchaseOrder.status == 'pending'
+            ).count()
+            
+            if not completed_orders and pending_orders == 0:
+                continue  # Sin historial
+            
+            # Calcular promedio de días de entrega
+            total_days = 0
+            for order in completed_orders:
+                if order.expected_delivery_date and order.actual_delivery_date:
+                    days = (order.actual_delivery_date - order.expected_delivery_date).days
+                    total_days += max(0, days)  # Solo contar retrasos
+            
+            avg_delay_days = total_days / len(completed_orders) if completed_orders else 0
+            
+            # Calcular tasa de puntualidad
+            on_time = sum(1 for o in completed_orders if not o.is_overdue())
+            punctuality_rate = (on_time / len(completed_orders) * 100) if completed_orders else 100
+            
+            # Clasificar riesgo
+            if avg_delay_days > 5 or punctuality_rate < 60:
+                risk_level = "🔴 ALTO"
+            elif avg_delay_days > 2 or punctuality_rate < 80:
+                risk_level = "🟡 MEDIO"
+            else:
+                risk_level = "🟢 BAJO"
+            
+            suppliers_analysis.append({
+                'supplier_id': supplier.id,
+                'name': supplier.name,
+                'contact': supplier.contact,
+                'city': supplier.city,
+                'total_orders': len(completed_orders) + delayed_orders + pending_orders,
+                'completed_orders': len(completed_orders),
+                'delayed_orders': delayed_orders,
+                'pending_orders': pending_orders,
+                'avg_delay_days': round(avg_delay_days, 1),
+                'punctuality_rate': round(punctuality_rate, 1),
+                'risk_level': risk_level,
+                'items_supplied': len(supplier.items)
+            })
+        
+        return sorted(suppliers_analysis, key=lambda x: x['avg_delay_days'], reverse=True)
+    
+    except Exception as e:
+        print(f"Error en analyze_slow_suppliers: {str(e)}")
+        return []
+
+
+def seed_orders(db_path, orders, items, suppliers, rng_seed=7):
+    """Órdenes de compra sintéticas con entregas a tiempo, adelantadas y tardías"""
+    rng = random.Random(rng_seed)
+    now = datetime.utcnow()
+    rows = []
+    for _ in range(orders):
+        ordered = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+        expected = ordered + timedelta(days=rng.randint(2, 10))
+        status = rng.choices(STATUSES, STATUS_WEIGHTS)[0]
+        actual = None
+        if status == 'delivered' and rng.random() < 0.95:
+            actual = expected + timedelta(hours=rng.randint(-72, 240))
+        fmt = lambda d: d.strftime('%Y-%m-%d %H:%M:%S.%f') if d else None
+        rows.append((rng.randint(1, suppliers), rng.randint(1, items), fmt(ordered), fmt(expected),
+                     fmt(actual), rng.randint(1, 50), 1000.0, 0, status, fmt(ordered)))
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        'INSERT INTO purchase_order (supplier_id, item_id, order_date, expected_delivery_date, '
+        'actual_delivery_date, quantity, unit_price, total_cost, status, created_at) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        rows
+    )
+    conn.commit()
+    conn.close()
+
+
+def comparable(results):
+    return [{k: v for k, v in row.items() if k not in SKIP_FIELDS} for row in results]
+
+
+def measure(app, fn):
+    queries = [0]
+    
+    def count(*args):
+        queries[0] += 1
+    
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count)
+        ms, result = timed(fn, repeat=1)
+        event.remove(db.engine, 'before_cursor_execute', count)
+        db.session.remove()
+    return ms, queries[0], result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--suppliers', type=int, default=500)
+    args = parser.parse_args()
+    
+    header("⏱️  BENCHMARK analyze_slow_suppliers")
+    print(f"{'Órdenes':>8} {'Anterior (ms)':>14} {'Consultas':>10} {'Nueva (ms)':>11} {'Consultas':>10} {'Iguales':>8}")
+    print("-" * 66)
+    for orders in args.orders:
+        db_path = temp_db_path()
+        app = make_app(db_path)
+        seed(db_path, transactions=0, items=5_000, users=10, suppliers=args.suppliers)
+        seed_orders(db_path, orders, items=5_000, suppliers=args.suppliers)
+        
+        legacy_ms, legacy_queries, legacy = measure(app, legacy_analyze_slow_suppliers)
+        new_ms, new_queries, new = measure(app, analyze_slow_suppliers)
+        same = comparable(legacy) == comparable(new)
+        print(f"{orders:>8,} {legacy_ms:>14.1f} {legacy_queries:>10} {new_ms:>11.1f} {new_queries:>10} {'✅' if same else '❌':>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""Utilidades compartidas por los benchmarks: app aislada y datos sintéticos"""
+import atexit
+import os
+import random
+import shutil
+import sys
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from flask import Flask
+from sqlalchemy import event
+from models import db
+from migrate_db import ROLLUP_BACKFILL_SQL
+
+KINDS = ['buy', 'rent', 'return', 'restock']
+KIND_WEIGHTS = [50, 30, 15, 5]
+CATEGORIES = ['Cuadernos', 'Lápices', 'Calculadoras', 'Papel', 'Arte', 'Laboratorio', 'Oficina', 'Electrónica']
+
+
+def header(title):
+    """Imprime un encabezado con el mismo formato que test_system.py"""
+    print("\n" + "=" * 70)
+    print(title)
+    print("=" * 70)
+
+
+def temp_db_path(name='bench.db'):
+    """Ruta a una base SQLite temporal (nunca toca inventory.db); se borra al salir"""
+    directory = tempfile.mkdtemp(prefix='inventory_bench_')
+    atexit.register(shutil.rmtree, directory, True)
+    return os.path.join(directory, name)
+
+
+def make_app(db_path):
+    """App Flask mínima ligada a una base SQLite propia del benchmark"""
+    app = Flask('benchmark')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def timed(fn, repeat=3):
+    """Ejecuta fn `repeat` veces y devuelve (mejor tiempo en ms, último resultado)"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+class StatementCounter:
+    """Sentencias SQL y commits ejecutados en un engine"""
+    def __init__(self, engine):
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine, 'before_cursor_execute', self._statement)
+        event.listen(engine, 'commit', self._commit)
+
+    def _statement(self, *args):
+        self.statements += 1
+
+    def _commit(self, *args):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = self.commits = 0
+
+
+def seed(db_path, transactions=100_000, items=2_000, users=1_000, suppliers=50,
+         login_attempts=0, days=730, batch=50_000, rng_seed=42):
+    """Llena la base con datos sintéticos usando sqlite3 directo (rápido)"""
+    rng = random.Random(rng_seed)
+    now = datetime.utcnow()
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    cur.execute('PRAGMA journal_mode=WAL')
+    cur.execute('PRAGMA synchronous=OFF')
+    
+    cur.executemany(
+        'INSERT INTO supplier (id, name, city, avg_delivery_days, total_orders, on_time_deliveries, created_at) '
+        'VALUES (?, ?, ?, 0, 0, 0, ?)',
+        [(i, f'Proveedor {i}', 'Bogotá', now) for i in range(1, suppliers + 1)]
+    )
+    cur.executemany(
+        'INSERT INTO user (id, username, email, password_hash, role, two_fa_enabled) VALUES (?, ?, ?, ?, ?, 0)',
+        [(i, f'student{i}', f'student{i}@example.com', 'x', 'student') for i in range(1, users + 1)]
+    )
+    cur.executemany(
+        'INSERT INTO item (id, name, category, price, stock, total_stock, rentable, supplier_id, '
+        'rotation_score, sales_velocity) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, 0)',
+        [(i, f'Item {i}', rng.choice(CATEGORIES), round(rng.uniform(500, 50000), 0),
+          rng.randint(0, 40), 40, rng.random() < 0.3,
+          rng.randint(1, suppliers) if suppliers and rng.random() < 0.9 else None)
+         for i in range(1, items + 1)]
+    )
+    
+    columns = [row[1] for row in cur.execute('PRAGMA table_info("transaction")')]
+    has_day = 'day' in columns
+    span = days * 86400
+    inserted = 0
+    while inserted < transactions:
+        rows = []
+        for _ in range(min(batch, transactions - inserted)):
+            ts = now - timedelta(seconds=rng.randint(0, span))
+            kind = rng.choices(KINDS, KIND_WEIGHTS)[0]
+            rent_days = due = None
+            returned = False
+            if kind == 'rent':
+                rent_days = rng.randint(1, 14)
+                due = (ts + timedelta(days=rent_days)).date().isoformat()
+                returned = rng.random() < 0.8
+            row = [rng.randint(1, users), rng.randint(1, items), kind, rng.randint(1, 3), rent_days,
+                   ts.strftime('%Y-%m-%d %H:%M:%S.%f'), ts.date().isoformat() if kind == 'rent' else None,
+                   due, returned]
+            if has_day:
+                row.append(ts.date().isoformat())
+            rows.append(row)
+        cur.executemany(
+            'INSERT INTO "transaction" (user_id, item_id, kind, qty, rent_days, timestamp, rent_start_date, '
+            'rent_due_date, returned' + (', day' if has_day else '') + ') VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?'
+            + (', ?' if has_day else '') + ')',
+            rows
+        )
+        inserted += len(rows)
+    
+    if login_attempts:
+        ips = [f'10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}' for _ in range(5_000)]
+        cur.executemany(
+            'INSERT INTO login_attempt (username, ip_address, success, timestamp) VALUES (?, ?, ?, ?)',
+            [(f'student{rng.randint(1, users)}', rng.choice(ips), rng.random() < 0.7,
+              (now - timedelta(seconds=rng.randint(0, span))).strftime('%Y-%m-%d %H:%M:%S.%f'))
+             for _ in range(login_attempts)]
+        )
+    
+    # Agregado diario, como lo dejaría migrate_db.py
+    if cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='transaction_daily_rollup'").fetchone():
+        cur.execute('DELETE FROM transaction_daily_rollup')
+        cur.execute(ROLLUP_BACKFILL_SQL)
+    
+    conn.commit()
+    conn.close()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+"""
+Prueba de estrés: muchos hilos comprando el mismo item a la vez
+
+Compara el patrón anterior de view_item (leer stock, comprobar en Python,
+escribir stock - qty) con take_stock (UPDATE ... WHERE stock >= qty), y luego
+golpea la ruta real POST /item/<id>. Informa throughput, sobreventas (ventas
+por encima del stock inicial) y descuadre (stock descontado distinto de lo vendido).
+
+Uso: python benchmarks/stress_stock.py [--threads 16] [--stock 200] [--think-ms 2]
+"""
+import argparse
+import os
+import threading
+import time
+
+from common import header, temp_db_path
+
+# La app real, ligada a una base temporal (antes de importar app.py)
+DB_PATH = temp_db_path('stress.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+os.environ['ANALYTICS_CACHE_PATH'] = os.path.join(os.path.dirname(DB_PATH), 'analytics_cache.db')
+os.environ['ANALYTICS_COLUMNS_PATH'] = os.path.join(os.path.dirname(DB_PATH), 'columns')
+
+from app import app, limiter  # noqa: E402
+from models import db, User, Item, Transaction, ActiveSession  # noqa: E402
+from utils.inventory import take_stock  # noqa: E402
+
+
+def legacy_buy(item_id, think):
+    """Patrón anterior: comprobación en Python y escritura del valor calculado"""
+    item = db.session.get(Item, item_id)
+    if item.stock < 1:
+        return False
+    time.sleep(think)  # trabajo de la petición entre la lectura y la escritura
+    item.stock -= 1
+    db.session.add(Transaction(item_id=item_id, user_id=1, kind='buy', qty=1))
+    db.session.commit()
+    return True
+
+
+def atomic_buy(item_id, think):
+    """Patrón actual: el UPDATE condicional decide"""
+    time.sleep(think)
+    if not take_stock(item_id, 1):
+        db.session.rollback()
+        return False
+    db.session.add(Transaction(item_id=item_id, user_id=1, kind='buy', qty=1))
+    db.session.commit()
+    return True
+
+
+def reset_item(stock):
+    with app.app_context():
+        Transaction.query.delete()
+        item = db.session.get(Item, 1)
+        item.stock = stock
+        db.session.commit()
+
+
+def hammer(threads, attempt, max_errors=20):
+    """Cada hilo compra hasta recibir 'sin stock' (o max_errors errores seguidos)"""
+    counts = {'sold': 0, 'rejected': 0, 'errors': 0}
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def run():
+        start.wait()
+        errors_in_a_row = 0
+        while errors_in_a_row < max_errors:
+            try:
+                outcome = attempt()
+            except Exception:
+                outcome = 'errors'
+            with lock:
+                counts[outcome] += 1
+            if outcome == 'rejected':
+                return
+            errors_in_a_row = errors_in_a_row + 1 if outcome == 'errors' else 0
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return counts['sold'], counts['rejected'], counts['errors'], time.perf_counter() - started
+
+
+def check(label, stock, result):
+    sold, rejected, errors, seconds = result
+    with app.app_context():
+        final_stock = db.session.get(Item, 1).stock
+        recorded = Transaction.query.count()
+    oversold = max(0, recorded - stock)
+    mismatch = (stock - final_stock) - recorded
+    requests = sold + rejected + errors
+    ok = oversold == 0 and mismatch == 0 and final_stock >= 0
+    print(f"{label:<24} {requests / seconds:>8.0f} {recorded:>7} {final_stock:>7} {errors:>8} "
+          f"{oversold:>11} {mismatch:>10} {'✅' if ok else '❌':>4}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--stock', type=int, default=200)
+    parser.add_argument('--think-ms', type=float, default=2.0)
+    args = parser.parse_args()
+    think = args.think_ms / 1000
+
+    app.config['TESTING'] = True
+    limiter.enabled = False  # un solo "cliente" haciendo cientos de compras
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username='stress', email='stress@example.com', password_hash='x', role='student'))
+        db.session.add(Item(id=1, name='Cuaderno', category='Cuadernos', price=1.0, stock=args.stock, rentable=True))
+        db.session.commit()
+        token = ActiveSession.create_session(1, '127.0.0.1')
+
+    header(f"⏱️  ESTRÉS de stock: {args.threads} hilos, stock {args.stock}, {args.think_ms} ms por petición")
+    print(f"{'Modo':<24} {'Ops/s':>8} {'Ventas':>7} {'Stock':>7} {'Errores':>8} "
+          f"{'Sobreventas':>11} {'Descuadre':>10} {'OK':>4}")
+    print("-" * 82)
+
+    for label, buy in [('Leer-comprobar-escribir', legacy_buy), ('UPDATE condicional', atomic_buy)]:
+        reset_item(args.stock)
+
+        def attempt(buy=buy):
+            with app.app_context():
+                return 'sold' if buy(1, think) else 'rejected'
+
+        check(label, args.stock, hammer(args.threads, attempt))
+
+    # Ruta real: POST /item/1 con la sesión de un estudiante
+    reset_item(args.stock)
+    local = threading.local()
+
+    def attempt_route():
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+            with local.client.session_transaction() as sess:
+                sess['user_id'] = 1
+                sess['session_token'] = token
+        response = local.client.post('/item/1', data={'action': 'buy', 'qty': 1})
+        if response.status_code == 200:
+            return 'sold'
+        if response.status_code == 400 and 'Stock insuficiente' in response.get_data(as_text=True):
+            return 'rejected'
+        return 'errors'
+
+    check('POST /item (ruta)', args.stock, hammer(args.threads, attempt_route))
+    print("\nVentas: transacciones registradas. Descuadre: stock descontado - ventas (debe ser 0).")
+
+
+if __name__ == '__main__':
+    main()
@@ -27,6 +27,41 @@ class Config:
     SESSION_COOKIE_SAMESITE = 'Lax'
     PERMANENT_SESSION_LIFETIME = timedelta(hours=8)
     SESSION_REFRESH_EACH_REQUEST = True
+    SESSION_CACHE_TTL = 5  # segundos que una sesión validada se sirve desde memoria
+    SESSION_ACTIVITY_FLUSH_SECONDS = 5  # intervalo de escritura masiva de last_activity
+    
+    # Caché de analytics compartida entre workers (por defecto instance/analytics_cache.db)
+    ANALYTICS_CACHE_PATH = os.environ.get('ANALYTICS_CACHE_PATH')
+    ANALYTICS_CACHE_TTL = 300  # segundos máximos de vida de un resultado, aunque no cambien los datos
+    ANALYTICS_CACHE_LEASE_SECONDS = 60  # espera máxima por el cálculo de otro worker
+    ANALYTICS_CACHE_STATS_FLUSH_SECONDS = 30  # intervalo en que cada worker suma sus aciertos/fallos al archivo
+    # Columnas de Transaction mapeadas en memoria por el motor columnar (por defecto instance/columns)
+    ANALYTICS_COLUMNS_PATH = os.environ.get('ANALYTICS_COLUMNS_PATH')
+    
+    # Snapshots de analytics (worker.py o scheduler del servidor de desarrollo)
+    ANALYTICS_SNAPSHOT_MINUTES = 10  # intervalo de recálculo periódico
+    ANALYTICS_REFRESH_POLL_SECONDS = 15  # cada cuánto se atienden los "Actualizar ahora"
+    ANALYTICS_SNAPSHOT_KEEP = 5  # snapshots conservados por análisis
+    
+    # Análisis independientes de un mismo panel, en paralelo (utils/parallel.py)
+    ANALYTICS_PARALLEL_WORKERS = 4  # hilos del pool por proceso
+    ANALYTICS_TASK_TIMEOUT = 30  # segundos; un análisis que no termina aporta su valor vacío
+    
+    # Contraseñas (utils/passwords.py): hashes viejos se actualizan en el siguiente login
+    PASSWORD_HASH_ALGORITHM = 'argon2'  # 'argon2' (argon2id) o 'pbkdf2'
+    ARGON2_TIME_COST = 3
+    ARGON2_MEMORY_COST = 65536  # KiB
+    ARGON2_PARALLELISM = 1
+    PBKDF2_ITERATIONS = 600000
+    PASSWORD_POOL_WORKERS = None  # procesos por worker web (None = núcleos; 0 = en el propio worker)
+    PASSWORD_POOL_MAX_PENDING = None  # operaciones en curso o en cola (None = 4 por proceso)
+    PASSWORD_POOL_TIMEOUT = 10  # segundos de espera antes de responder "ocupado"
+    
+    # Importación masiva de estudiantes (utils/student_import.py, atendida por worker.py)
+    STUDENT_IMPORT_DIR = os.environ.get('STUDENT_IMPORT_DIR')  # por defecto instance/imports
+    STUDENT_IMPORT_POLL_SECONDS = 5  # cada cuánto el worker busca importaciones pendientes
+    STUDENT_IMPORT_CHUNK_SIZE = 500  # filas por consulta de unicidad + INSERT masivo
+    ACTIVATION_TOKEN_DAYS = 14  # vigencia de los enlaces de activación (filas sin contraseña)
     
     # Upload files
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
@@ -43,12 +78,35 @@ class Config:
     
     # JWT
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'dev-jwt-secret')
-    JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=30)
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=15)  # tokens de acceso de la API (POST /api/token)
     
     # Rate Limiting
     RATELIMIT_STORAGE_URL = "memory://"
-    API_LIMIT = "100 per hour"
+    # Token buckets de login y API compartidos entre workers (por defecto instance/ratelimit.db)
+    RATELIMIT_PATH = os.environ.get('RATELIMIT_PATH')
+    LOGIN_LIMIT = "5 per 15 minutes"  # intentos fallidos por IP
+    API_LIMIT = "100 per hour"  # por API key
     ADMIN_API_LIMIT = "200 per hour"
+    RATELIMIT_SYNC_SECONDS = 1  # escritura en lote del consumo de la API (0: una escritura por request)
+    
+    # Autenticación de API keys (utils/api_keys.py)
+    API_KEY_CACHE_TTL = 60  # segundos que una key validada se sirve desde memoria
+    API_KEY_FLUSH_SECONDS = 30  # intervalo de escritura masiva de last_used_at
+    
+    # Registro de intentos de login en lote (utils/audit.py)
+    LOGIN_AUDIT_FLUSH_MS = 500  # intervalo del INSERT multi-fila (0 = un commit por intento)
+    LOGIN_AUDIT_BATCH_SIZE = 500  # intentos en cola que adelantan el flush
+    LOGIN_AUDIT_MAX_PENDING = 50000  # tope de la cola en memoria si la BD no responde
+    LOGIN_AUDIT_SPOOL_DIR = os.environ.get('LOGIN_AUDIT_SPOOL_DIR')  # por defecto instance/audit
+    
+    # Detector de anomalías de login en memoria (utils/anomaly.py, panel de seguridad)
+    ANOMALY_WINDOW_SECONDS = 86400  # ventana deslizante (24 h)
+    ANOMALY_BUCKET_SECONDS = 900  # resolución de la ventana (96 buckets por clave como máximo)
+    ANOMALY_MAX_KEYS = 10000  # IPs / usuarios con contadores exactos (LRU)
+    ANOMALY_TOP_K = 64  # contadores del sketch de infractores por dimensión
+    ANOMALY_FAILURE_THRESHOLD = 5  # fallidos en la ventana para marcar una IP o usuario
+    ANOMALY_PUBLISH_SECONDS = 5  # cada cuánto cada worker publica su top
+    ANOMALY_STATE_DIR = os.environ.get('ANOMALY_STATE_DIR')  # por defecto instance/anomaly
 
 class DevelopmentConfig(Config):
     """Configuración para desarrollo"""
@@ -63,6 +121,7 @@ class TestingConfig(Config):
     """Configuración para testing"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    LOGIN_AUDIT_FLUSH_MS = 0  # intentos escritos en el momento: los tests los consultan enseguida
 
 # Seleccionar configuración según el ambiente
 config = {
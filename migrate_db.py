@@ -7,10 +7,143 @@ from pathlib import Path
 
 os.chdir(Path(__file__).parent)
 
-def migrate_database():
-    """Añadir columnas faltantes a la tabla item"""
-    db_path = 'inventory.db'
+# Índices compuestos para los filtros más usados (mismos nombres que en models.py)
+INDEXES = [
+    ('ix_transaction_item_kind_returned', 'transaction', ('item_id', 'kind', 'returned')),
+    ('ix_transaction_item_timestamp', 'transaction', ('item_id', 'timestamp')),
+    ('ix_transaction_user_kind_returned', 'transaction', ('user_id', 'kind', 'returned')),
+    ('ix_transaction_user_timestamp', 'transaction', ('user_id', 'timestamp')),
+    ('ix_transaction_kind_returned_due', 'transaction', ('kind', 'returned', 'rent_due_date')),
+    ('ix_transaction_kind_timestamp', 'transaction', ('kind', 'timestamp')),
+    ('ix_transaction_timestamp', 'transaction', ('timestamp',)),
+    ('ix_transaction_day_kind', 'transaction', ('day', 'kind')),
+    ('ix_login_attempt_ip_success_timestamp', 'login_attempt', ('ip_address', 'success', 'timestamp')),
+    ('ix_login_attempt_timestamp', 'login_attempt', ('timestamp',)),
+]
+
+def migrate_indexes(cursor):
+    """Añade transaction.day (date(timestamp)) y crea los índices compuestos"""
+    cursor.execute('PRAGMA table_info("transaction")')
+    columns = {row[1] for row in cursor.fetchall()}
+    
+    if not columns:
+        print("   ⚠️  Tabla 'transaction' no existe - será creada por SQLAlchemy")
+        return 0
+    
+    if 'day' not in columns:
+        cursor.execute('ALTER TABLE "transaction" ADD COLUMN day DATE')
+        print("   ✅ Añadida columna: transaction.day (DATE)")
+    
+    # Backfill de filas antiguas (idempotente: solo las que no tienen day)
+    cursor.execute(
+        'UPDATE "transaction" SET day = date(timestamp) '
+        'WHERE day IS NULL AND timestamp IS NOT NULL'
+    )
+    if cursor.rowcount:
+        print(f"   ✅ transaction.day calculado para {cursor.rowcount} filas")
+    
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='index'")
+    existing = {row[0] for row in cursor.fetchall()}
+    
+    indexes_created = 0
+    for name, table, cols in INDEXES:
+        if name in existing:
+            print(f"   ✓ Índice ya existe: {name}")
+            continue
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({", ".join(cols)})')
+        print(f"   ✅ Creado índice: {name}")
+        indexes_created += 1
+    
+    # Estadísticas para que el planificador elija los índices nuevos
+    if indexes_created:
+        cursor.execute('ANALYZE')
+    
+    return indexes_created
+
+# Mismo cálculo que TransactionDailyRollup.rebuild()
+ROLLUP_BACKFILL_SQL = '''
+    INSERT INTO transaction_daily_rollup
+        (day, item_id, kind, count, qty, returned_count, returned_qty)
+    SELECT day, COALESCE(item_id, 0), kind, COUNT(id), COALESCE(SUM(qty), 0),
+           SUM(CASE WHEN returned THEN 1 ELSE 0 END),
+           SUM(CASE WHEN returned THEN COALESCE(qty, 0) ELSE 0 END)
+    FROM "transaction"
+    WHERE day IS NOT NULL AND kind IS NOT NULL
+    GROUP BY day, COALESCE(item_id, 0), kind
+'''
+
+def migrate_rollup(cursor):
+    """Crea transaction_daily_rollup y, si está vacía, la llena desde el historial"""
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name='transaction'"
+    )
+    if not cursor.fetchone():
+        return 0
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transaction_daily_rollup (
+            day DATE NOT NULL,
+            item_id INTEGER NOT NULL,
+            kind VARCHAR(10) NOT NULL,
+            count INTEGER NOT NULL,
+            qty INTEGER NOT NULL,
+            returned_count INTEGER NOT NULL,
+            returned_qty INTEGER NOT NULL,
+            PRIMARY KEY (day, item_id, kind)
+        )
+    ''')
+    
+    cursor.execute('SELECT 1 FROM transaction_daily_rollup LIMIT 1')
+    if cursor.fetchone():
+        print("   ✓ transaction_daily_rollup ya tiene datos (usar 'flask --app app rebuild-rollup' para recalcular)")
+        return 0
+    
+    cursor.execute(ROLLUP_BACKFILL_SQL)
+    print(f"   ✅ transaction_daily_rollup calculado: {cursor.rowcount} filas")
+    return cursor.rowcount
+
+def migrate_api_keys(cursor):
+    """Añade api_key.expires_at (NULL = la key no vence)"""
+    cursor.execute('PRAGMA table_info(api_key)')
+    columns = {row[1] for row in cursor.fetchall()}
     
+    if not columns:
+        print("   ⚠️  Tabla 'api_key' no existe - será creada por SQLAlchemy")
+        return 0
+    if 'expires_at' in columns:
+        print("   ✓ Columna ya existe: api_key.expires_at")
+        return 0
+    
+    cursor.execute('ALTER TABLE api_key ADD COLUMN expires_at DATETIME')
+    print("   ✅ Añadida columna: api_key.expires_at (DATETIME)")
+    return 1
+
+def migrate_user_activation(cursor):
+    """Añade user.activation_token_hash (índice único) y user.activation_expires_at"""
+    cursor.execute('PRAGMA table_info("user")')
+    columns = {row[1] for row in cursor.fetchall()}
+    
+    if not columns:
+        print("   ⚠️  Tabla 'user' no existe - será creada por SQLAlchemy")
+        return 0
+    
+    added = 0
+    for column, col_type in [('activation_token_hash', 'VARCHAR(64)'), ('activation_expires_at', 'DATETIME')]:
+        if column in columns:
+            print(f"   ✓ Columna ya existe: user.{column}")
+            continue
+        cursor.execute(f'ALTER TABLE "user" ADD COLUMN {column} {col_type}')
+        print(f"   ✅ Añadida columna: user.{column} ({col_type})")
+        added += 1
+    
+    # SQLite no admite ADD COLUMN ... UNIQUE: la unicidad la da el índice
+    cursor.execute(
+        'CREATE UNIQUE INDEX IF NOT EXISTS ix_user_activation_token_hash ON "user" (activation_token_hash)'
+    )
+    return added
+
+def migrate_database(db_path='inventory.db'):
+    """Añadir columnas faltantes a la tabla item"""
     if not os.path.exists(db_path):
         print(f"❌ Base de datos no encontrada: {db_path}")
         return False
@@ -49,6 +182,22 @@ def migrate_database():
         
         conn.commit()
         
+        # Índices y columna day de transaction
+        indexes_created = migrate_indexes(cursor)
+        conn.commit()
+        
+        # Agregado diario de transacciones (requiere transaction.day)
+        migrate_rollup(cursor)
+        conn.commit()
+        
+        # Vencimiento de API keys
+        columns_added += migrate_api_keys(cursor)
+        conn.commit()
+        
+        # Activación de cuentas importadas en lote
+        columns_added += migrate_user_activation(cursor)
+        conn.commit()
+        
         # Verificar que Supplier y PurchaseOrder existan
         cursor.execute(
             "SELECT name FROM sqlite_master WHERE type='table' AND name='supplier'"
@@ -68,7 +217,7 @@ def migrate_database():
         
         conn.close()
         
-        print(f"\n✅ Migración completada - {columns_added} columnas añadidas")
+        print(f"\n✅ Migración completada - {columns_added} columnas añadidas, {indexes_created} índices creados")
         return True
         
     except Exception as e:
@@ -1,7 +1,9 @@
 """Modelos de base de datos"""
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_, or_
+from collections import defaultdict
+from sqlalchemy import func, and_, or_, case, event, inspect, insert, delete
+from sqlalchemy.orm import column_property
 import uuid
 import io
 import csv
@@ -22,6 +24,10 @@ class User(db.Model):
     last_login_ip = db.Column(db.String(45), nullable=True)
     last_login_time = db.Column(db.DateTime, nullable=True)
     
+    # Cuentas importadas sin contraseña: huella del token de activación
+    activation_token_hash = db.Column(db.String(64), unique=True, index=True, nullable=True)
+    activation_expires_at = db.Column(db.DateTime, nullable=True)
+    
     # Relationships
     api_keys = db.relationship('ApiKey', backref='user', lazy=True, cascade='all, delete-orphan')
     login_attempts = db.relationship('LoginAttempt', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -31,6 +37,13 @@ class User(db.Model):
 
 class LoginAttempt(db.Model):
     """Registra intentos de login para detección de ataques"""
+    __table_args__ = (
+        # security-log?ip=: historial de una IP (los límites de login usan utils/ratelimit.py)
+        db.Index('ix_login_attempt_ip_success_timestamp', 'ip_address', 'success', 'timestamp'),
+        # security_dashboard / security-log: recientes primero
+        db.Index('ix_login_attempt_timestamp', 'timestamp'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     username = db.Column(db.String(80), nullable=False)
@@ -39,17 +52,6 @@ class LoginAttempt(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     user_agent = db.Column(db.String(500), nullable=True)
     
-    @classmethod
-    def check_rate_limit(cls, ip_address, minutes=15, max_attempts=5):
-        """Verifica si una IP excedió límite de intentos fallidos"""
-        cutoff_time = datetime.utcnow() - timedelta(minutes=minutes)
-        failed_attempts = cls.query.filter(
-            cls.ip_address == ip_address,
-            cls.success == False,
-            cls.timestamp >= cutoff_time
-        ).count()
-        return failed_attempts >= max_attempts
-    
     @classmethod
     def log_attempt(cls, username, ip_address, success, user_agent=None, user_id=None):
         """Registra un intento de login"""
@@ -89,24 +91,6 @@ class ActiveSession(db.Model):
         db.session.add(new_session)
         db.session.commit()
         return session_token
-    
-    @classmethod
-    def validate_session(cls, user_id, session_token, current_ip):
-        """Valida sesión y verifica cambios de IP"""
-        session = cls.query.filter_by(
-            user_id=user_id,
-            session_token=session_token,
-            is_active=True
-        ).first()
-        
-        if not session:
-            return False
-        
-        ip_changed = session.ip_address != current_ip
-        session.last_activity = datetime.utcnow()
-        db.session.commit()
-        
-        return not ip_changed  # Return True if IP is OK, False if changed
 
 
 class ApiKey(db.Model):
@@ -116,7 +100,8 @@ class ApiKey(db.Model):
     name = db.Column(db.String(120), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    last_used_at = db.Column(db.DateTime, nullable=True)
+    last_used_at = db.Column(db.DateTime, nullable=True)  # escrito en lote por utils/api_keys.py
+    expires_at = db.Column(db.DateTime, nullable=True)  # None = no vence
     is_active = db.Column(db.Boolean, default=True)
 
 
@@ -193,8 +178,32 @@ class Item(db.Model):
     transactions = db.relationship('Transaction', backref='item', lazy=True, cascade='all, delete-orphan')
 
 
+def _transaction_day(context):
+    """Default de Transaction.day: fecha (sin hora) del timestamp de la fila"""
+    timestamp = context.get_current_parameters().get('timestamp')
+    return timestamp.date() if timestamp else None
+
+
 class Transaction(db.Model):
     """Registro de compras, rentas y devoluciones"""
+    __table_args__ = (
+        # Rentas abiertas de un item (devoluciones NFC, disponibilidad)
+        db.Index('ix_transaction_item_kind_returned', 'item_id', 'kind', 'returned'),
+        # Ventanas de tiempo por item (rotación, reposición)
+        db.Index('ix_transaction_item_timestamp', 'item_id', 'timestamp'),
+        # Historial y estadísticas de estudiante
+        db.Index('ix_transaction_user_kind_returned', 'user_id', 'kind', 'returned'),
+        db.Index('ix_transaction_user_timestamp', 'user_id', 'timestamp'),
+        # Rentas activas / vencidas
+        db.Index('ix_transaction_kind_returned_due', 'kind', 'returned', 'rent_due_date'),
+        # Ventanas de tiempo por tipo (forecast, trending, NFC stats)
+        db.Index('ix_transaction_kind_timestamp', 'kind', 'timestamp'),
+        # Listados ordenados por fecha
+        db.Index('ix_transaction_timestamp', 'timestamp'),
+        # Agrupaciones diarias sobre la columna day
+        db.Index('ix_transaction_day_kind', 'day', 'kind'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     item_id = db.Column(db.Integer, db.ForeignKey('item.id'))
@@ -202,9 +211,11 @@ class Transaction(db.Model):
     qty = db.Column(db.Integer, default=1)
     rent_days = db.Column(db.Integer, nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    day = db.Column(db.Date, default=_transaction_day)  # date(timestamp), evita func.date() en GROUP BY
     rent_start_date = db.Column(db.Date, nullable=True)
     rent_due_date = db.Column(db.Date, nullable=True)
-    returned = db.Column(db.Boolean, default=False)
+    # active_history: el rollup diario necesita el valor anterior aunque la fila esté expirada
+    returned = column_property(db.Column(db.Boolean, default=False), active_history=True)
     return_date = db.Column(db.DateTime, nullable=True)
     
     # Extensiones de renta
@@ -213,13 +224,21 @@ class Transaction(db.Model):
     extension_approved = db.Column(db.Boolean, default=False)
     extension_approved_at = db.Column(db.DateTime, nullable=True)
 
+    CSV_HEADER = ['ID', 'Item', 'Tipo', 'Cantidad', 'Días', 'Fecha', 'Inicio', 'Vencimiento', 'Devuelto']
+
     @classmethod
-    def search(cls, page=1, per_page=10, kind=None, returned=None, overdue=None):
-        """Buscar transacciones con filtros"""
-        query = cls.query.join(Item).order_by(cls.timestamp.desc())
+    def search_query(cls, kind=None, returned=None, overdue=None, date_from=None, date_to=None, item_id=None):
+        """Consulta de transacciones con filtros (sin paginar ni ordenar); fechas inclusivas"""
+        query = cls.query.join(Item)
 
         if kind:
             query = query.filter(cls.kind == kind)
+        if item_id:
+            query = query.filter(cls.item_id == item_id)
+        if date_from:
+            query = query.filter(cls.day >= date_from)
+        if date_to:
+            query = query.filter(cls.day <= date_to)
         if returned is not None:
             query = query.filter(cls.returned == returned)
         if overdue:
@@ -230,24 +249,302 @@ class Transaction(db.Model):
                 cls.rent_due_date < today
             )
 
-        return query.paginate(page=page, per_page=per_page)
+        return query
+
+    @classmethod
+    def search(cls, page=1, per_page=10, cursor=None, **filters):
+        """Buscar transacciones con filtros (ver search_query). Con cursor (aunque sea '') pagina por keyset"""
+        from utils.pagination import keyset_paginate
+
+        query = cls.search_query(**filters)
+        if cursor is not None:
+            return keyset_paginate(query, (cls.timestamp, cls.id), cursor=cursor, per_page=per_page)
+        return query.order_by(cls.timestamp.desc(), cls.id.desc()).paginate(page=page, per_page=per_page)
+
+    @staticmethod
+    def _csv_row(tx_id, item_name, kind, qty, rent_days, timestamp, rent_start_date, rent_due_date, returned):
+        return [
+            tx_id,
+            item_name or '',
+            kind,
+            qty,
+            rent_days or '',
+            timestamp.strftime('%Y-%m-%d %H:%M:%S') if timestamp else '',
+            rent_start_date.strftime('%Y-%m-%d') if rent_start_date else '',
+            rent_due_date.strftime('%Y-%m-%d') if rent_due_date else '',
+            'Sí' if returned else 'No'
+        ]
 
     @classmethod
     def to_csv(cls, transactions):
         """Exportar transacciones a CSV"""
         output = io.StringIO()
         writer = csv.writer(output)
-        writer.writerow(['ID', 'Item', 'Tipo', 'Cantidad', 'Días', 'Fecha', 'Inicio', 'Vencimiento', 'Devuelto'])
+        writer.writerow(cls.CSV_HEADER)
         for tx in transactions:
-            writer.writerow([
-                tx.id,
-                tx.item.name if tx.item else '',
-                tx.kind,
-                tx.qty,
-                tx.rent_days or '',
-                tx.timestamp.strftime('%Y-%m-%d %H:%M:%S') if tx.timestamp else '',
-                tx.rent_start_date.strftime('%Y-%m-%d') if tx.rent_start_date else '',
-                tx.rent_due_date.strftime('%Y-%m-%d') if tx.rent_due_date else '',
-                'Sí' if tx.returned else 'No'
-            ])
+            writer.writerow(cls._csv_row(
+                tx.id, tx.item.name if tx.item else '', tx.kind, tx.qty, tx.rent_days,
+                tx.timestamp, tx.rent_start_date, tx.rent_due_date, tx.returned
+            ))
         return output.getvalue()
+
+    @classmethod
+    def iter_csv(cls, batch_size=1000, **filters):
+        """
+        CSV de las transacciones filtradas (ver search_query) en trozos de texto, uno por lote.
+
+        Lee columnas sueltas con el nombre del item por join (sin cargar objetos ni
+        una consulta por fila) y en lotes de yield_per: la memoria no crece con el
+        número de filas. Pensado para una respuesta en streaming.
+        """
+        rows = cls.search_query(**filters).with_entities(
+            cls.id, Item.name, cls.kind, cls.qty, cls.rent_days,
+            cls.timestamp, cls.rent_start_date, cls.rent_due_date, cls.returned
+        ).order_by(cls.id).yield_per(batch_size)
+
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(cls.CSV_HEADER)
+        for count, row in enumerate(rows, 1):
+            writer.writerow(cls._csv_row(*row))
+            if count % batch_size == 0:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+        yield output.getvalue()
+
+
+ROLLUP_COUNTERS = ('count', 'qty', 'returned_count', 'returned_qty')
+
+
+class TransactionDailyRollup(db.Model):
+    """Agregado diario de transacciones por (día, item, tipo), mantenido en la misma unidad de trabajo"""
+    __tablename__ = 'transaction_daily_rollup'
+    
+    day = db.Column(db.Date, primary_key=True)
+    item_id = db.Column(db.Integer, primary_key=True)  # 0 = transacción sin item
+    kind = db.Column(db.String(10), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    qty = db.Column(db.Integer, nullable=False, default=0)
+    returned_count = db.Column(db.Integer, nullable=False, default=0)
+    returned_qty = db.Column(db.Integer, nullable=False, default=0)
+    
+    @staticmethod
+    def delta_for(day, item_id, kind, qty, returned, sign=1):
+        """Clave y contadores (count, qty, returned_count, returned_qty) que aporta una transacción"""
+        qty = qty or 0
+        returned = 1 if returned else 0
+        return (day, item_id or 0, kind), (sign, sign * qty, sign * returned, sign * returned * qty)
+    
+    @classmethod
+    def apply_deltas(cls, deltas, session=None):
+        """
+        Suma deltas {(day, item_id, kind): (count, qty, returned_count, returned_qty)}
+        con un upsert por lote. Usa la conexión de la sesión: mismo commit/rollback.
+        """
+        session = session or db.session
+        rows = [
+            dict(zip(('day', 'item_id', 'kind') + ROLLUP_COUNTERS, key + tuple(values)))
+            for key, values in deltas.items()
+            if key[0] is not None and key[2] is not None and any(values)
+        ]
+        if not rows:
+            return
+        
+        table = cls.__table__
+        connection = session.connection()
+        dialect = connection.dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert as upsert
+            else:
+                from sqlalchemy.dialects.postgresql import insert as upsert
+            stmt = upsert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['day', 'item_id', 'kind'],
+                set_={name: table.c[name] + stmt.excluded[name] for name in ROLLUP_COUNTERS}
+            )
+            connection.execute(stmt, rows)
+            return
+        
+        # Otros motores: UPDATE y, si no existía la fila, INSERT
+        for row in rows:
+            updated = connection.execute(
+                table.update().where(
+                    table.c.day == row['day'],
+                    table.c.item_id == row['item_id'],
+                    table.c.kind == row['kind']
+                ).values({name: table.c[name] + row[name] for name in ROLLUP_COUNTERS})
+            ).rowcount
+            if not updated:
+                connection.execute(table.insert().values(**row))
+    
+    @classmethod
+    def rebuild(cls):
+        """Recalcula el agregado completo desde el historial de transacciones (no hace commit)"""
+        table = cls.__table__
+        returned = Transaction.returned == True
+        source = db.session.query(
+            Transaction.day,
+            func.coalesce(Transaction.item_id, 0),
+            Transaction.kind,
+            func.count(Transaction.id),
+            func.coalesce(func.sum(Transaction.qty), 0),
+            func.sum(case((returned, 1), else_=0)),
+            func.sum(case((returned, func.coalesce(Transaction.qty, 0)), else_=0))
+        ).filter(
+            Transaction.day != None,
+            Transaction.kind != None
+        ).group_by(
+            Transaction.day,
+            func.coalesce(Transaction.item_id, 0),
+            Transaction.kind
+        )
+        
+        db.session.execute(delete(table))
+        db.session.execute(insert(table).from_select(
+            ['day', 'item_id', 'kind'] + list(ROLLUP_COUNTERS), source.statement
+        ))
+        return db.session.query(func.count()).select_from(table).scalar()
+
+
+class AnalyticsSnapshot(db.Model):
+    """Resultado precalculado de un análisis (get_analytics_data, etc.), generado en segundo plano"""
+    __tablename__ = 'analytics_snapshot'
+    __table_args__ = (
+        # latest(): último snapshot por nombre
+        db.Index('ix_analytics_snapshot_name_generated_at', 'name', 'generated_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)
+    generated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    duration_ms = db.Column(db.Integer, nullable=True)
+    payload = db.Column(db.PickleType, nullable=False)
+
+    @classmethod
+    def latest(cls, name):
+        """Snapshot más reciente de `name` (una búsqueda por índice)"""
+        return cls.query.filter_by(name=name).order_by(cls.generated_at.desc(), cls.id.desc()).first()
+
+    @classmethod
+    def prune(cls, name, keep=5):
+        """Borra los snapshots de `name` más antiguos que los últimos `keep` (no hace commit)"""
+        keep_ids = db.session.query(cls.id).filter_by(name=name).order_by(
+            cls.generated_at.desc(), cls.id.desc()
+        ).limit(keep).subquery()
+        return cls.query.filter(
+            cls.name == name, cls.id.notin_(db.select(keep_ids.c.id))
+        ).delete(synchronize_session=False)
+
+
+class AnalyticsRefreshRequest(db.Model):
+    """Pedido de recálculo de snapshots ("Actualizar ahora"), atendido por el worker"""
+    __tablename__ = 'analytics_refresh_request'
+
+    id = db.Column(db.Integer, primary_key=True)
+    requested_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    requested_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    @classmethod
+    def pending(cls):
+        """Pedido aún no terminado, si lo hay"""
+        return cls.query.filter(cls.finished_at == None).order_by(cls.requested_at).first()
+
+
+class StudentImport(db.Model):
+    """Importación masiva de estudiantes (CSV/JSON) atendida por el worker, con su progreso"""
+    __tablename__ = 'student_import'
+
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    path = db.Column(db.String(500), nullable=False)
+    requested_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    requested_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, done, failed
+
+    # Progreso: bytes leídos del archivo y filas procesadas
+    bytes_total = db.Column(db.Integer, nullable=False, default=0)
+    bytes_done = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    created = db.Column(db.Integer, nullable=False, default=0)
+    activations = db.Column(db.Integer, nullable=False, default=0)
+    skipped = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.JSON, nullable=True)  # primeras filas rechazadas: [{'row', 'email', 'error'}]
+
+    @property
+    def percent(self):
+        if self.status == 'done':
+            return 100
+        return int(100 * self.bytes_done / self.bytes_total) if self.bytes_total else 0
+
+    def to_dict(self):
+        """Progreso para el polling de la página de importación"""
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'percent': self.percent,
+            'processed': self.processed,
+            'created': self.created,
+            'activations': self.activations,
+            'skipped': self.skipped,
+            'errors': self.errors or [],
+            'requested_at': self.requested_at.isoformat() if self.requested_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+def _committed_value(obj, name):
+    """Valor de un atributo antes de los cambios pendientes"""
+    history = inspect(obj).attrs[name].history
+    return history.deleted[0] if history.deleted else getattr(obj, name)
+
+
+@event.listens_for(db.session, 'before_flush')
+def _maintain_transaction_rollup(session, flush_context, instances):
+    """Mantiene transaction_daily_rollup al insertar, borrar o devolver transacciones"""
+    deltas = defaultdict(lambda: [0, 0, 0, 0])
+    
+    def add(key, values):
+        totals = deltas[key]
+        for i, value in enumerate(values):
+            totals[i] += value
+    
+    for obj in session.new:
+        if not isinstance(obj, Transaction):
+            continue
+        # Se fijan aquí los defaults para que fila y agregado coincidan
+        if obj.timestamp is None:
+            obj.timestamp = datetime.utcnow()
+        if obj.day is None:
+            obj.day = obj.timestamp.date()
+        if obj.qty is None:
+            obj.qty = 1
+        if obj.returned is None:
+            obj.returned = False
+        add(*TransactionDailyRollup.delta_for(obj.day, obj.item_id, obj.kind, obj.qty, obj.returned))
+    
+    for obj in session.deleted:
+        if isinstance(obj, Transaction):
+            add(*TransactionDailyRollup.delta_for(
+                _committed_value(obj, 'day'), _committed_value(obj, 'item_id'), _committed_value(obj, 'kind'),
+                _committed_value(obj, 'qty'), _committed_value(obj, 'returned'), sign=-1
+            ))
+    
+    for obj in session.dirty:
+        if not isinstance(obj, Transaction) or not session.is_modified(obj):
+            continue
+        fields = ('day', 'item_id', 'kind', 'qty', 'returned')
+        old = tuple(_committed_value(obj, name) for name in fields)
+        new = tuple(getattr(obj, name) for name in fields)
+        if old != new:
+            add(*TransactionDailyRollup.delta_for(*old, sign=-1))
+            add(*TransactionDailyRollup.delta_for(*new))
+    
+    if deltas:
+        TransactionDailyRollup.apply_deltas(deltas, session)
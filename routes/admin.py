@@ -1,17 +1,38 @@
 """Rutas de administrador: dashboard, CRUD productos, seguridad"""
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, g
-from models import User, Item, Transaction, LoginAttempt, ActiveSession, db
-from utils.analytics import get_analytics_data, calculate_seasonal_demand, get_predictive_analytics, get_supplier_intelligence
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, g, Response, stream_with_context
+from models import User, Item, Transaction, TransactionDailyRollup, LoginAttempt, ActiveSession, ApiKey, StudentImport, db
+from utils.analytics import get_analytics_data
 from utils.security import get_client_ip
+from utils.pagination import keyset_paginate
+from utils.cache import analytics_cache
+from utils.snapshots import get_snapshot, request_refresh
+from utils.exports import gzip_chunks
+from utils.api_keys import api_key_auth
+from utils.student_import import queue_import, activations_path
+from utils.anomaly import anomaly_detector
 from functools import wraps
 from datetime import datetime, timedelta
 from sqlalchemy import func, desc
+import csv
+import io
 import logging
 import os
+import secrets
+from urllib.parse import urlencode
 
 logger = logging.getLogger(__name__)
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+# Productos que lista el dashboard; el resto, paginado en /admin/items
+DASHBOARD_ITEMS = 20
+
+# Datos mínimos del dashboard mientras se genera el primer snapshot o si falla la carga
+EMPTY_ANALYTICS = {
+    'general': {'total_items': 0, 'total_stock': 0, 'low_stock_count': 0, 'active_rentals': 0, 'overdue_count': 0},
+    'reorder_recommendation': [],
+    'category_distribution': []
+}
+
 def admin_required(f):
     """Decorador para requerir rol admin"""
     @wraps(f)
@@ -28,17 +49,20 @@ def admin_required(f):
 def index():
     """Dashboard de administrador"""
     try:
-        analytics = get_analytics_data()
-        seasonal = calculate_seasonal_demand()
-        
-        # Todas los items
-        items = Item.query.all()
+        analytics, generated_at = get_snapshot('analytics_data')
+        pending = analytics is None
+        if pending:
+            analytics = EMPTY_ANALYTICS
+        seasonal = analytics.get('seasonal_demand', {})
         
-        # Últimas transacciones
-        recent_transactions = Transaction.query.order_by(desc(Transaction.timestamp)).limit(10).all()
-        
-        # Items bajos en stock
-        low_stock = Item.query.filter(Item.stock <= 2).all()
+        # Primera página del inventario (stock al momento, para editar); los
+        # totales y el stock bajo vienen del snapshot
+        items = Item.query.order_by(Item.id).limit(DASHBOARD_ITEMS).all()
+        # Stock al momento de los items recomendados (el snapshot puede tener minutos)
+        reorder_ids = [rec['item']['id'] for rec in analytics['reorder_recommendation']]
+        current_stock = dict(
+            db.session.query(Item.id, Item.stock).filter(Item.id.in_(reorder_ids)).all()
+        ) if reorder_ids else {}
         
         logger.info(f"Admin dashboard loaded: {len(items)} items, analytics: {analytics['general']['total_items']}")
         
@@ -46,23 +70,17 @@ def index():
                              analytics=analytics,
                              seasonal=seasonal,
                              items=items,
-                             recent_transactions=recent_transactions,
-                             low_stock=low_stock)
+                             current_stock=current_stock,
+                             snapshot_generated_at=generated_at,
+                             snapshot_pending=pending)
     except Exception as e:
         logger.error(f"Error en admin dashboard: {str(e)}", exc_info=True)
         flash(f'Error: {str(e)}', 'danger')
         # Proporcionar datos mínimos en caso de error
-        empty_analytics = {
-            'general': {'total_items': 0, 'total_stock': 0, 'low_stock_count': 0, 'active_rentals': 0, 'overdue_count': 0},
-            'reorder_recommendation': [],
-            'category_distribution': []
-        }
         return render_template('admin.html',
-                             analytics=empty_analytics,
+                             analytics=EMPTY_ANALYTICS,
                              seasonal={},
-                             items=[],
-                             recent_transactions=[],
-                             low_stock=[])
+                             items=[])
 
 @admin_bp.route('/items')
 @admin_required
@@ -186,21 +204,33 @@ def admin_delete_item(item_id):
 @admin_bp.route('/transactions')
 @admin_required
 def admin_transactions():
-    """Ver transacciones"""
+    """Ver transacciones; con format=csv las exporta (gzip=1 para comprimir)"""
     page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')  # presente (aunque vacío) = paginación por keyset
     kind = request.args.get('kind', '')
     returned = request.args.get('returned', '')
     overdue = request.args.get('overdue', '')
+    date_from = request.args.get('date_from', '')
+    date_to = request.args.get('date_to', '')
+    item_id = request.args.get('item_id', type=int)
+    
+    filters = dict(
+        kind=kind or None,
+        returned=(returned.lower() == 'true') if returned else None,
+        overdue=bool(overdue),
+        date_from=_parse_date_arg(date_from),
+        date_to=_parse_date_arg(date_to),
+        item_id=item_id
+    )
     
-    query = Transaction.query
-    if kind:
-        query = query.filter_by(kind=kind)
-    if returned:
-        query = query.filter_by(returned=(returned.lower() == 'true'))
-    if overdue:
-        query = Transaction.search(overdue=True)
+    if request.args.get('format') == 'csv':
+        return _transactions_csv_response(filters, gzipped=request.args.get('gzip') == '1')
     
-    pagination = query.order_by(desc(Transaction.timestamp)).paginate(page=page, per_page=30)
+    try:
+        pagination = Transaction.search(page=page, per_page=30, cursor=cursor, **filters)
+    except ValueError:
+        flash('Cursor de paginación inválido', 'warning')
+        pagination = Transaction.search(per_page=30, cursor='', **filters)
     transactions = pagination.items
     
     return render_template('admin_transactions.html', 
@@ -208,23 +238,56 @@ def admin_transactions():
                          pagination=pagination,
                          kind=kind,
                          returned=returned,
-                         overdue=overdue)
+                         overdue=overdue,
+                         date_from=date_from,
+                         date_to=date_to,
+                         item_id=item_id,
+                         export_args={k: v for k, v in request.args.items() if k in EXPORT_FILTER_ARGS and v})
+
+# Filtros del listado que se conservan al exportar
+EXPORT_FILTER_ARGS = ('kind', 'returned', 'overdue', 'date_from', 'date_to', 'item_id')
+
+def _parse_date_arg(value):
+    """Fecha AAAA-MM-DD de un parámetro; None si falta o es inválida"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        flash(f'Fecha inválida: {value}', 'warning')
+        return None
+
+def _transactions_csv_response(filters, gzipped=False):
+    """Respuesta en streaming con el CSV de las transacciones filtradas"""
+    filename = f"transacciones_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
+    chunks = Transaction.iter_csv(**filters)
+    mimetype = 'text/csv; charset=utf-8'
+    if gzipped:
+        chunks = gzip_chunks(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    logger.info(f"Admin {g.user.id} exported transactions {filters}")
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
 
 @admin_bp.route('/analytics')
 @admin_required
 def admin_analytics():
     """Dashboard de análisis"""
     try:
-        analytics = get_analytics_data()
-        seasonal = calculate_seasonal_demand()
+        analytics = analytics_cache.get_or_compute('analytics_data', get_analytics_data)
+        seasonal = analytics['seasonal_demand']
         
         # Gráficos de datos
         daily_data = db.session.query(
-            func.date(Transaction.timestamp).label('date'),
-            func.count(Transaction.id).label('count')
+            TransactionDailyRollup.day.label('date'),
+            func.sum(TransactionDailyRollup.count).label('count')
         ).filter(
-            Transaction.timestamp >= datetime.utcnow() - timedelta(days=30)
-        ).group_by(func.date(Transaction.timestamp)).all()
+            TransactionDailyRollup.day >= (datetime.utcnow() - timedelta(days=30)).date()
+        ).group_by(TransactionDailyRollup.day).all()
         
         dates = [str(d[0]) for d in daily_data]
         counts = [d[1] for d in daily_data]
@@ -233,21 +296,48 @@ def admin_analytics():
                              analytics=analytics,
                              seasonal=seasonal,
                              dates=dates,
-                             counts=counts)
+                             counts=counts,
+                             cache_stats=analytics_cache.stats())
     except Exception as e:
         logger.error(f"Error in analytics: {e}")
         flash(f'Error: {str(e)}', 'danger')
         return render_template('admin_analytics.html')
 
+@admin_bp.route('/cache-stats')
+@admin_required
+def admin_cache_stats():
+    """Aciertos/fallos de la caché de analytics (JSON)"""
+    return jsonify(analytics_cache.stats())
+
+@admin_bp.route('/snapshots/refresh', methods=['POST'])
+@admin_required
+def admin_refresh_snapshots():
+    """Encola el recálculo de los snapshots de analytics (lo atiende el worker)"""
+    try:
+        refresh_request = request_refresh(user_id=g.user.id)
+        logger.info(f"Analytics refresh requested by {g.user.username} (request {refresh_request.id})")
+        flash('Recálculo de análisis en cola: los paneles se actualizarán en unos segundos', 'info')
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error requesting analytics refresh: {e}")
+        flash(f'Error: {str(e)}', 'danger')
+    
+    next_url = request.form.get('next', '')
+    if not next_url.startswith('/admin'):
+        next_url = url_for('admin.index')
+    return redirect(next_url)
+
 @admin_bp.route('/predictive')
 @admin_required
 def admin_predictive():
     """Panel Predictivo - Forecast de ingresos y productos trending"""
     try:
-        predictive_data = get_predictive_analytics()
+        predictive_data, generated_at = get_snapshot('predictive_analytics')
         
         return render_template('admin_predictive.html',
-                             predictive=predictive_data)
+                             predictive=predictive_data or {},
+                             snapshot_generated_at=generated_at,
+                             snapshot_pending=predictive_data is None)
     except Exception as e:
         logger.error(f"Error in predictive analytics: {e}")
         flash(f'Error: {str(e)}', 'danger')
@@ -258,10 +348,12 @@ def admin_predictive():
 def admin_suppliers():
     """Panel de Análisis de Proveedores - Detección de lentos e inseguros"""
     try:
-        supplier_data = get_supplier_intelligence()
+        supplier_data, generated_at = get_snapshot('supplier_intelligence')
         
         return render_template('admin_suppliers.html',
-                             supplier=supplier_data)
+                             supplier=supplier_data or {},
+                             snapshot_generated_at=generated_at,
+                             snapshot_pending=supplier_data is None)
     except Exception as e:
         logger.error(f"Error in supplier analytics: {e}")
         flash(f'Error: {str(e)}', 'danger')
@@ -298,26 +390,127 @@ def admin_settings():
     
     return render_template('admin_settings.html', user=g.user)
 
+@admin_bp.route('/api-keys', methods=['GET', 'POST'])
+@admin_required
+def admin_api_keys():
+    """Crear y revocar API keys"""
+    if request.method == 'POST':
+        try:
+            action = request.form.get('action')
+            if action == 'create':
+                name = request.form.get('name', '').strip()
+                expires_days = request.form.get('expires_days', type=int)
+                if not name:
+                    flash('Nombre requerido', 'danger')
+                else:
+                    key_obj = ApiKey(
+                        key=secrets.token_hex(32),
+                        name=name,
+                        user_id=g.user.id,
+                        expires_at=datetime.utcnow() + timedelta(days=expires_days) if expires_days else None
+                    )
+                    db.session.add(key_obj)
+                    db.session.commit()
+                    logger.info(f"Admin {g.user.username} created API key {key_obj.id}")
+                    flash('API key creada', 'success')
+            elif action == 'revoke':
+                key_obj = ApiKey.query.get_or_404(request.form.get('key_id', type=int))
+                # Commit + invalidación inmediata de la caché en todos los workers
+                api_key_auth.revoke(key_obj)
+                logger.info(f"Admin {g.user.username} revoked API key {key_obj.id}")
+                flash('API key revocada', 'success')
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error managing API keys: {e}")
+            flash(f'Error: {str(e)}', 'danger')
+        return redirect(url_for('admin.admin_api_keys'))
+    
+    api_keys = ApiKey.query.filter_by(is_active=True).order_by(desc(ApiKey.created_at)).all()
+    return render_template('admin_api_keys.html', api_keys=api_keys)
+
+@admin_bp.route('/students/import', methods=['GET', 'POST'])
+@admin_required
+def admin_student_import():
+    """Subir un CSV/JSON de estudiantes; lo importa el worker en segundo plano"""
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Selecciona un archivo', 'danger')
+            return redirect(url_for('admin.admin_student_import'))
+        try:
+            job = queue_import(upload, user_id=g.user.id)
+            logger.info(f"Admin {g.user.username} queued student import {job.id} ({job.bytes_total} bytes)")
+            flash('Archivo recibido: la importación se procesa en segundo plano', 'success')
+        except ValueError as e:
+            flash(str(e), 'danger')
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error queuing student import: {e}")
+            flash(f'Error: {str(e)}', 'danger')
+        return redirect(url_for('admin.admin_student_import'))
+    
+    imports = StudentImport.query.order_by(desc(StudentImport.requested_at)).limit(20).all()
+    return render_template('admin_student_import.html', imports=imports)
+
+@admin_bp.route('/students/import/<int:import_id>')
+@admin_required
+def admin_student_import_status(import_id):
+    """Progreso de una importación (JSON, para el polling de la página)"""
+    return jsonify(StudentImport.query.get_or_404(import_id).to_dict())
+
+@admin_bp.route('/students/import/<int:import_id>/activations.csv')
+@admin_required
+def admin_student_import_activations(import_id):
+    """CSV con los enlaces de activación de las cuentas importadas sin contraseña"""
+    job = StudentImport.query.get_or_404(import_id)
+    path = activations_path(job)
+    if not os.path.exists(path):
+        flash('Esta importación no emitió enlaces de activación', 'warning')
+        return redirect(url_for('admin.admin_student_import'))
+    
+    def rows(batch_size=1000):
+        # Se lee en streaming y el token se convierte en el enlace completo
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(['email', 'username', 'enlace'])
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for count, (email, username, token) in enumerate(reader, 1):
+                writer.writerow([email, username, url_for('auth.activate_account', token=token, _external=True)])
+                if count % batch_size == 0:
+                    yield output.getvalue()
+                    output.seek(0)
+                    output.truncate()
+        yield output.getvalue()
+    
+    logger.info(f"Admin {g.user.username} downloaded activation links of import {job.id}")
+    return Response(
+        stream_with_context(rows()),
+        mimetype='text/csv; charset=utf-8',
+        headers={'Content-Disposition': f'attachment; filename=activaciones_{job.id}.csv'}
+    )
+
+# Entradas del top de anomalías que se sirven por vista (?limit=)
+ANOMALY_MAX_LIMIT = 100
+
+def _anomaly_limit(default):
+    """?limit= acotado a 1..ANOMALY_MAX_LIMIT"""
+    return max(1, min(request.args.get('limit', default, type=int), ANOMALY_MAX_LIMIT))
+
 @admin_bp.route('/security')
 @admin_required
 def security_dashboard():
     """Dashboard de seguridad"""
-    # Intentos fallidos en últimas 24 horas
+    # Intentos fallidos en últimas 24 horas (por índice de timestamp, con LIMIT)
     failed_attempts = LoginAttempt.query.filter(
         LoginAttempt.timestamp >= datetime.utcnow() - timedelta(hours=24),
         LoginAttempt.success == False
     ).order_by(desc(LoginAttempt.timestamp)).limit(50).all()
     
-    # IPs sospechosas (5+ intentos fallidos)
-    suspicious_ips = db.session.query(
-        LoginAttempt.client_ip,
-        func.count(LoginAttempt.id).label('count')
-    ).filter(
-        LoginAttempt.success == False,
-        LoginAttempt.timestamp >= datetime.utcnow() - timedelta(hours=24)
-    ).group_by(LoginAttempt.client_ip).having(
-        func.count(LoginAttempt.id) >= 5
-    ).all()
+    # Top de IPs y usuarios con intentos fallidos: del detector en memoria, sin GROUP BY
+    anomalies = anomaly_detector.summary(limit=_anomaly_limit(20))
+    suspicious_ips = [entry for entry in anomalies['ips'] if entry['suspicious']]
     
     # Sesiones activas
     active_sessions = ActiveSession.query.filter(
@@ -327,17 +520,50 @@ def security_dashboard():
     return render_template('security_dashboard.html',
                          failed_attempts=failed_attempts,
                          suspicious_ips=suspicious_ips,
+                         anomalies=anomalies,
                          active_sessions=active_sessions)
 
+@admin_bp.route('/security/anomalies')
+@admin_required
+def security_anomalies():
+    """Top de IPs y usuarios con intentos fallidos (JSON), o los contadores de una IP / usuario"""
+    ip = request.args.get('ip')
+    username = request.args.get('username')
+    if ip or username:
+        dimension, key = ('ip', ip) if ip else ('username', username)
+        return jsonify({'dimension': dimension, 'key': key, 'stats': anomaly_detector.stats(dimension, key)})
+    return jsonify(anomaly_detector.summary(limit=_anomaly_limit(10)))
+
 @admin_bp.route('/security-log')
 @admin_required
 def admin_security_log():
-    """Registro de intentos de login"""
+    """Registro de intentos de login; ?ip= o ?username= para el histórico de uno (desde el panel)"""
     page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')  # presente (aunque vacío) = paginación por keyset
+    ip = request.args.get('ip', '').strip()
+    username = request.args.get('username', '').strip()
+    
+    query = LoginAttempt.query
+    if ip:
+        query = query.filter(LoginAttempt.ip_address == ip)
+    if username:
+        query = query.filter(LoginAttempt.username == username)
+    filter_args = {k: v for k, v in (('ip', ip), ('username', username)) if v}
     
-    logs = LoginAttempt.query.order_by(desc(LoginAttempt.timestamp)).paginate(page=page, per_page=50)
+    if cursor is not None:
+        try:
+            logs = keyset_paginate(query, (LoginAttempt.timestamp, LoginAttempt.id),
+                                   cursor=cursor, per_page=50)
+        except ValueError:
+            flash('Cursor de paginación inválido', 'warning')
+            logs = keyset_paginate(query, (LoginAttempt.timestamp, LoginAttempt.id), per_page=50)
+    else:
+        logs = query.order_by(
+            desc(LoginAttempt.timestamp), desc(LoginAttempt.id)
+        ).paginate(page=page, per_page=50)
     
-    return render_template('admin_security_log.html', logs=logs)
+    return render_template('admin_security_log.html', logs=logs, pagination=logs,
+                           filter_args=filter_args, filter_qs=urlencode(filter_args))
 
 @admin_bp.route('/rental-extensions')
 @admin_required
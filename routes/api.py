@@ -1,17 +1,27 @@
 """API REST endpoints: items, transactions, NFC operations"""
-from flask import Blueprint, jsonify, request, g
+from flask import Blueprint, jsonify, request, g, current_app
 from models import Item, Transaction, User, db, ApiKey
+from routes.nfc import _nfc_counts
 from utils.security import verify_password, get_client_ip
+from utils.inventory import apply_nfc_batch, checkout_cart, MAX_CART_LINES
+from utils.pagination import keyset_paginate, next_cursor_for
+from utils.ratelimit import rate_limiter, parse_limit
+from utils.api_keys import api_key_auth, TokenError, TokenUser
 from datetime import datetime, timedelta
 from sqlalchemy import desc, and_
+from sqlalchemy.orm import joinedload
 from functools import wraps
 import logging
 
 logger = logging.getLogger(__name__)
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+def _is_access_token(credential):
+    """Los tokens de acceso son JWT (tres partes con puntos); las API keys son hex"""
+    return credential.count('.') == 2
+
 def api_key_required(f):
-    """Decorador para requerir API key válida"""
+    """Decorador para requerir API key válida o token de acceso de POST /api/token"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
         api_key = request.headers.get('Authorization', '').replace('Bearer ', '')
@@ -19,31 +29,76 @@ def api_key_required(f):
         if not api_key:
             return jsonify({'error': 'API key required'}), 401
         
-        key_obj = ApiKey.query.filter_by(key=api_key, is_active=True).first()
+        # Token firmado: se verifica solo con CPU y la lista de denegación en memoria
+        if _is_access_token(api_key):
+            try:
+                token_user = TokenUser(api_key_auth.verify_token(api_key))
+            except TokenError as e:
+                return jsonify({'error': str(e)}), 401
+            
+            limited = rate_limit_api(token_user)
+            if limited:
+                return limited
+            
+            g.api_user = token_user
+            return f(*args, **kwargs)
         
-        if not key_obj or key_obj.expires_at and key_obj.expires_at < datetime.utcnow():
+        # Caché por huella de la key; last_used_at se escribe en lote (utils/api_keys.py)
+        entry = api_key_auth.authenticate(api_key)
+        
+        if not entry:
             return jsonify({'error': 'Invalid or expired API key'}), 401
         
-        key_obj.last_used_at = datetime.utcnow()
-        db.session.commit()
+        limited = rate_limit_api(entry)
+        if limited:
+            return limited
         
-        g.api_user = key_obj.user
+        g.api_user = api_key_auth.get_user(entry)
         return f(*args, **kwargs)
     return decorated_function
 
-def rate_limit_api(f):
-    """Rate limiting para API: 100 requests/hora"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        client_ip = get_client_ip()
-        hour_ago = datetime.utcnow() - timedelta(hours=1)
-        
-        # Contar requests en última hora desde esta IP
-        from flask_limiter import Limiter
-        # Implementación simple: registrar en transaction logs para API
-        
-        return f(*args, **kwargs)
-    return decorated_function
+def _include_total():
+    """?include_total=true pide el COUNT exacto en modo cursor (por defecto se omite)"""
+    return request.args.get('include_total', 'false').lower() == 'true'
+
+def rate_limit_api(entry):
+    """Rate limiting por API key (API_LIMIT, ADMIN_API_LIMIT para admins): respuesta 429 o None
+    
+    entry: CachedApiKey o TokenUser; los tokens cuentan contra la key que los emitió.
+    Se decide en memoria; el consumo se escribe en lote en ratelimit.db (RATELIMIT_SYNC_SECONDS).
+    """
+    setting = 'ADMIN_API_LIMIT' if entry.role == 'admin' else 'API_LIMIT'
+    limit, period = parse_limit(current_app.config.get(setting, '100 per hour'))
+    allowed, retry_after = rate_limiter.hit_deferred(f'api:{entry.key_id}', limit, period)
+    if allowed:
+        return None
+    retry_after = max(1, int(retry_after + 0.999))
+    response = jsonify({'error': 'Rate limit exceeded', 'retry_after': retry_after})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+@api_bp.route('/token', methods=['POST'])
+def api_token():
+    """POST /api/token - Canjear una API key por un token de acceso de vida corta"""
+    api_key = request.headers.get('Authorization', '').replace('Bearer ', '')
+    
+    if not api_key or _is_access_token(api_key):
+        return jsonify({'error': 'API key required'}), 401
+    
+    entry = api_key_auth.authenticate(api_key)
+    if not entry:
+        return jsonify({'error': 'Invalid or expired API key'}), 401
+    
+    limited = rate_limit_api(entry)
+    if limited:
+        return limited
+    
+    token, expires_in = api_key_auth.issue_token(entry)
+    return jsonify({
+        'access_token': token,
+        'token_type': 'Bearer',
+        'expires_in': expires_in
+    })
 
 @api_bp.route('/items', methods=['GET'])
 @api_key_required
@@ -68,13 +123,27 @@ def api_items():
             (Item.description.ilike(f'%{search}%'))
         )
     
-    items = query.paginate(page=page, per_page=50)
+    keys = (Item.id,)
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        try:
+            items = keyset_paginate(query, keys, cursor=cursor, per_page=50, descending=False,
+                                    with_total=_include_total())
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        meta = {'next_cursor': items.next_cursor, 'total': items.total}
+    else:
+        items = query.order_by(Item.id).paginate(page=page, per_page=50)
+        meta = {
+            'page': page,
+            'total': items.total,
+            'pages': items.pages,
+            'next_cursor': next_cursor_for(items.items, keys, items.has_next)
+        }
     
     return jsonify({
         'status': 'success',
-        'page': page,
-        'total': items.total,
-        'pages': items.pages,
+        **meta,
         'items': [{
             'id': item.id,
             'name': item.name,
@@ -83,7 +152,7 @@ def api_items():
             'price': float(item.price),
             'stock': item.stock,
             'rentable': item.rentable,
-            'image': item.image
+            'image': item.image_filename
         } for item in items.items]
     })
 
@@ -103,7 +172,7 @@ def api_item(item_id):
             'price': float(item.price),
             'stock': item.stock,
             'rentable': item.rentable,
-            'image': item.image,
+            'image': item.image_filename,
             'created_at': item.created_at.isoformat() if item.created_at else None
         }
     })
@@ -120,19 +189,34 @@ def api_transactions():
     if kind:
         query = query.filter_by(kind=kind)
     
-    transactions = query.order_by(desc(Transaction.timestamp)).paginate(page=page, per_page=50)
+    query = query.options(joinedload(Transaction.item))
+    keys = (Transaction.timestamp, Transaction.id)
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        try:
+            transactions = keyset_paginate(query, keys, cursor=cursor, per_page=50,
+                                           with_total=_include_total())
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        meta = {'next_cursor': transactions.next_cursor, 'total': transactions.total}
+    else:
+        transactions = query.order_by(desc(Transaction.timestamp), desc(Transaction.id)).paginate(page=page, per_page=50)
+        meta = {
+            'page': page,
+            'total': transactions.total,
+            'pages': transactions.pages,
+            'next_cursor': next_cursor_for(transactions.items, keys, transactions.has_next)
+        }
     
     return jsonify({
         'status': 'success',
-        'page': page,
-        'total': transactions.total,
-        'pages': transactions.pages,
+        **meta,
         'transactions': [{
             'id': t.id,
             'item_id': t.item_id,
             'kind': t.kind,
-            'quantity': t.quantity,
-            'amount': float(t.amount),
+            'quantity': t.qty,
+            'amount': float((t.item.price or 0) * (t.qty or 0)) if t.item else 0.0,
             'timestamp': t.timestamp.isoformat(),
             'returned': t.returned,
             'return_date': t.return_date.isoformat() if t.return_date else None
@@ -192,12 +276,12 @@ def api_nfc_update():
             ).first_or_404()
             
             rental.returned = True
-            rental.actual_return_date = datetime.utcnow()
-            item.stock += rental.quantity
+            rental.return_date = datetime.utcnow()
+            item.stock = Item.stock + (rental.qty or 0)
             
         elif action == 'restock':
             # Recargar stock
-            item.stock += quantity
+            item.stock = Item.stock + quantity
         else:
             return jsonify({'error': 'Invalid action'}), 400
         
@@ -226,66 +310,27 @@ def api_nfc_batch_update():
         if not operations:
             return jsonify({'error': 'operations array required'}), 400
         
+        reasons = {
+            'not_found': 'Item not found',
+            'no_rental': 'No active rental found',
+            'invalid_action': 'Invalid action',
+            'invalid_quantity': 'Invalid quantity'
+        }
         results = []
         
-        for op in operations:
-            item_id = op.get('item_id')
-            action = op.get('action')
-            quantity = op.get('quantity', 1)
-            
-            try:
-                item = Item.query.get(item_id)
-                if not item:
-                    results.append({
-                        'item_id': item_id,
-                        'status': 'failed',
-                        'reason': 'Item not found'
-                    })
-                    continue
-                
-                if action == 'return':
-                    rental = Transaction.query.filter(
-                        Transaction.item_id == item_id,
-                        Transaction.kind == 'rent',
-                        Transaction.returned == False
-                    ).first()
-                    
-                    if rental:
-                        rental.returned = True
-                        rental.actual_return_date = datetime.utcnow()
-                        item.stock += rental.quantity
-                        results.append({
-                            'item_id': item_id,
-                            'status': 'success',
-                            'action': action,
-                            'new_stock': item.stock
-                        })
-                    else:
-                        results.append({
-                            'item_id': item_id,
-                            'status': 'failed',
-                            'reason': 'No active rental found'
-                        })
-                
-                elif action == 'restock':
-                    item.stock += quantity
-                    results.append({
-                        'item_id': item_id,
-                        'status': 'success',
-                        'action': action,
-                        'new_stock': item.stock
-                    })
-                else:
-                    results.append({
-                        'item_id': item_id,
-                        'status': 'failed',
-                        'reason': 'Invalid action'
-                    })
-            except Exception as e:
+        for op in apply_nfc_batch(operations, qty_field='quantity'):
+            if op['success']:
+                results.append({
+                    'item_id': op['item_id'],
+                    'status': 'success',
+                    'action': op['action'],
+                    'new_stock': op['new_stock']
+                })
+            else:
                 results.append({
-                    'item_id': item_id,
+                    'item_id': op['item_id'],
                     'status': 'failed',
-                    'reason': str(e)
+                    'reason': reasons[op['error']]
                 })
         
         db.session.commit()
@@ -301,27 +346,83 @@ def api_nfc_batch_update():
         logger.error(f"NFC batch error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@api_bp.route('/checkout', methods=['POST'])
+@api_key_required
+def api_checkout():
+    """POST /api/checkout - Compra / renta de varias líneas, todo o nada (kiosko)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        lines = data.get('lines', [])
+        
+        if not lines or not isinstance(lines, list):
+            return jsonify({'error': 'lines array required'}), 400
+        if not all(isinstance(line, dict) for line in lines):
+            return jsonify({'error': 'Each line must be an object'}), 400
+        if len(lines) > MAX_CART_LINES:
+            return jsonify({'error': f'At most {MAX_CART_LINES} lines per checkout'}), 400
+        
+        # Un kiosko con llave de admin puede cobrar a nombre de un estudiante
+        try:
+            user_id = int(data.get('user_id', g.api_user.id))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid user_id'}), 400
+        if user_id != g.api_user.id:
+            if g.api_user.role != 'admin':
+                return jsonify({'error': 'Only admin keys can checkout for another user'}), 403
+            if not db.session.get(User, user_id):
+                return jsonify({'error': 'User not found'}), 404
+        
+        reasons = {
+            'not_found': 'Item not found',
+            'invalid_action': 'Invalid action',
+            'invalid_quantity': 'Invalid quantity',
+            'not_rentable': 'Item is not rentable',
+            'invalid_days': 'Invalid rent days',
+            'invalid_date': 'Invalid start date',
+            'insufficient_stock': 'Insufficient stock',
+            'stock_changed': 'Stock changed during checkout, retry'
+        }
+        ok, checkout = checkout_cart(user_id, lines)
+        results = []
+        for line in checkout:
+            if line['success']:
+                results.append({'item_id': line['item_id'], 'status': 'success', 'action': line['action']})
+            else:
+                results.append({
+                    'item_id': line['item_id'],
+                    'status': 'failed',
+                    'reason': reasons[line['error']]
+                })
+        
+        if not ok:
+            db.session.rollback()
+            errors = {line['error'] for line in checkout if line['error']}
+            status = 409 if errors <= {'insufficient_stock', 'stock_changed'} else 400
+            return jsonify({'status': 'failed', 'total': len(results), 'results': results}), status
+        
+        db.session.commit()
+        logger.info(f"API checkout: {len(results)} lines for user {user_id}")
+        
+        return jsonify({
+            'status': 'success',
+            'total': len(results),
+            'results': results
+        })
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"API checkout error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @api_bp.route('/nfc/stats', methods=['GET'])
 @api_key_required
 def api_nfc_stats():
     """GET /api/nfc/stats - Estadísticas de dispositivo NFC"""
     days = request.args.get('days', 30, type=int)
-    start_date = datetime.utcnow() - timedelta(days=days)
-    
-    total_operations = Transaction.query.filter(
-        Transaction.timestamp >= start_date,
-        Transaction.kind.in_(['return', 'restock'])
-    ).count()
+    start_date = (datetime.utcnow() - timedelta(days=days)).date()
     
-    returns = Transaction.query.filter(
-        Transaction.timestamp >= start_date,
-        Transaction.kind == 'return'
-    ).count()
-    
-    restocks = Transaction.query.filter(
-        Transaction.timestamp >= start_date,
-        Transaction.kind == 'restock'
-    ).count()
+    # Conteos por tipo desde el agregado diario (ventana en días completos)
+    returns, restocks = _nfc_counts(start_date)
+    total_operations = returns + restocks
     
     return jsonify({
         'status': 'success',
@@ -1,8 +1,15 @@
 """Rutas de autenticación: login, register, logout, 2FA"""
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, g
-from models import User, LoginAttempt, ActiveSession, db
-from utils.security import hash_password, verify_password, get_client_ip, get_2fa_qr_url, verify_2fa_token, generate_2fa_secret
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, g, current_app
+from models import User, ActiveSession, db
+from utils.security import hash_password, verify_password, verify_and_upgrade, get_client_ip, get_2fa_qr_url, verify_2fa_token, generate_2fa_secret
+from utils.passwords import PasswordPoolBusy
+from utils.sessions import session_validator
+from utils.ratelimit import rate_limiter, parse_limit
+from utils.audit import login_audit
+from utils.anomaly import anomaly_detector
+from utils.student_import import find_activation, activate_account as consume_activation
 from datetime import datetime
+import math
 import uuid
 import logging
 
@@ -11,10 +18,40 @@ auth_bp = Blueprint('auth', __name__)
 
 # ============ HELPER FUNCTIONS (Funciones auxiliares sin duplicación) ============
 
+BUSY_MESSAGE = 'El servidor está atendiendo muchos inicios de sesión. Intenta de nuevo en unos segundos.'
+
 def _validate_login(identifier, password, identifier_field='username'):
-    """Valida credenciales de usuario. identifier_field: 'username' o 'email'"""
+    """Valida credenciales de usuario. identifier_field: 'username' o 'email'
+    
+    Un hash con algoritmo o coste viejo se actualiza aquí (se guarda con el commit de la sesión).
+    Lanza PasswordPoolBusy si el pool de hashing está saturado.
+    """
     user = User.query.filter(getattr(User, identifier_field) == identifier).first()
-    return user if user and verify_password(user.password_hash, password) else None
+    return user if user and verify_and_upgrade(user, password) else None
+
+def _consume_login_attempt(client_ip):
+    """
+    Consume un intento del bucket de la IP (LOGIN_LIMIT) antes de verificar la contraseña.
+    
+    Comprobar y consumir es una sola operación atómica: una ráfaga de POSTs
+    simultáneos no obtiene más intentos que el límite. Devuelve el mensaje de
+    bloqueo si la IP ya no tiene intentos, o None.
+    """
+    limit, period = parse_limit(current_app.config.get('LOGIN_LIMIT', '5 per 15 minutes'))
+    allowed, retry_after = rate_limiter.hit(f'login:{client_ip}', limit, period)
+    if allowed:
+        return None
+    return f'Demasiados intentos. Intenta nuevamente en {max(1, math.ceil(retry_after / 60))} minutos.'
+
+def _refund_login_attempt(client_ip):
+    """Devuelve el intento consumido: login correcto, pool saturado o paso previo al 2FA"""
+    limit, period = parse_limit(current_app.config.get('LOGIN_LIMIT', '5 per 15 minutes'))
+    rate_limiter.refund(f'login:{client_ip}', limit, period)
+
+def _log_attempt(identifier, client_ip, success, user_agent=None, user_id=None):
+    """Encola el intento para el registro en lote y alimenta el detector de anomalías"""
+    login_audit.record(identifier, client_ip, success, user_agent, user_id)
+    anomaly_detector.observe(identifier, client_ip, success)
 
 def _create_session_for_user(user, client_ip, user_agent):
     """Crea sesión y activa token para usuario"""
@@ -61,19 +98,25 @@ def login():
         client_ip = get_client_ip()
         user_agent = request.headers.get('User-Agent', '')[:500]
         
-        # Rate limiting
-        if LoginAttempt.check_rate_limit(client_ip):
-            flash('Demasiados intentos. Intenta nuevamente en 15 minutos.', 'danger')
-            return render_template('login.html')
-        
         if not username or not password:
             flash('Usuario y contraseña requeridos', 'danger')
             return render_template('login.html')
+        
+        # Rate limiting: el intento se consume antes de verificar
+        blocked = _consume_login_attempt(client_ip)
+        if blocked:
+            flash(blocked, 'danger')
+            return render_template('login.html')
 
-        user = _validate_login(username, password, 'username')
+        try:
+            user = _validate_login(username, password, 'username')
+        except PasswordPoolBusy:
+            _refund_login_attempt(client_ip)
+            flash(BUSY_MESSAGE, 'warning')
+            return render_template('login.html'), 503, {'Retry-After': '2'}
         
         if not user:
-            LoginAttempt.log_attempt(username, client_ip, False, user_agent)
+            _log_attempt(username, client_ip, False, user_agent)
             logger.warning(f"Failed login for {username} from {client_ip}")
             flash('Usuario o contraseña incorrectos', 'danger')
             return render_template('login.html', require_2fa=False)
@@ -81,12 +124,15 @@ def login():
         # Verificar 2FA si está habilitado
         if user.two_fa_enabled:
             if not totp_token or not verify_2fa_token(user.two_fa_secret, totp_token):
+                if not totp_token:
+                    _refund_login_attempt(client_ip)  # solo se pide el código: no es un fallo
                 flash('Código 2FA incorrecto', 'danger')
                 return render_template('login.html', username=username, require_2fa=True, password=password)
         
-        # Login exitoso
+        # Login exitoso: no cuenta contra el límite
+        _refund_login_attempt(client_ip)
         _create_session_for_user(user, client_ip, user_agent)
-        LoginAttempt.log_attempt(username, client_ip, True, user_agent, user.id)
+        _log_attempt(username, client_ip, True, user_agent, user.id)
         
         logger.info(f"Successful login for {username} from {client_ip}")
         flash('Sesión iniciada correctamente', 'success')
@@ -149,24 +195,31 @@ def student_login():
         client_ip = get_client_ip()
         user_agent = request.headers.get('User-Agent', '')[:500]
         
-        if LoginAttempt.check_rate_limit(client_ip):
-            flash('Demasiados intentos. Intenta nuevamente en 15 minutos.', 'danger')
-            return render_template('student_login.html')
-        
         if not email or not password:
             flash('Correo y contraseña requeridos', 'danger')
             return render_template('student_login.html')
+        
+        blocked = _consume_login_attempt(client_ip)
+        if blocked:
+            flash(blocked, 'danger')
+            return render_template('student_login.html')
 
-        user = _validate_login(email, password, 'email')
+        try:
+            user = _validate_login(email, password, 'email')
+        except PasswordPoolBusy:
+            _refund_login_attempt(client_ip)
+            flash(BUSY_MESSAGE, 'warning')
+            return render_template('student_login.html'), 503, {'Retry-After': '2'}
         
         if not user:
-            LoginAttempt.log_attempt(email, client_ip, False, user_agent)
+            _log_attempt(email, client_ip, False, user_agent)
             flash('Correo o contraseña incorrectos', 'danger')
             return render_template('student_login.html')
         
-        # Login exitoso
+        # Login exitoso: no cuenta contra el límite
+        _refund_login_attempt(client_ip)
         _create_session_for_user(user, client_ip, user_agent)
-        LoginAttempt.log_attempt(email, client_ip, True, user_agent, user.id)
+        _log_attempt(email, client_ip, True, user_agent, user.id)
         
         logger.info(f"Student login: {email} from {client_ip}")
         flash('Sesión iniciada correctamente', 'success')
@@ -220,9 +273,47 @@ def register_student():
     return render_template('register_student.html')
 
 
+@auth_bp.route('/activate/<token>', methods=['GET', 'POST'])
+def activate_account(token):
+    """Activación de una cuenta importada en lote: el estudiante elige su contraseña"""
+    user = find_activation(token)
+    if user is None:
+        flash('El enlace de activación no es válido o ya venció', 'danger')
+        return redirect(url_for('auth.student_login'))
+    
+    if request.method == 'POST':
+        password = request.form.get('password', '').strip()
+        password_confirm = request.form.get('password_confirm', '').strip()
+        
+        is_valid, error_msg = _validate_registration(password=password, password_confirm=password_confirm)
+        if not is_valid:
+            flash(error_msg, 'danger')
+            return render_template('reset_password.html', username=user.email)
+        
+        try:
+            consume_activation(user, hash_password(password))
+            db.session.commit()
+            logger.info(f"Student account activated: {user.email}")
+            flash('Cuenta activada. Ya puedes iniciar sesión', 'success')
+            return redirect(url_for('auth.student_login'))
+        except PasswordPoolBusy:
+            flash(BUSY_MESSAGE, 'warning')
+            return render_template('reset_password.html', username=user.email), 503, {'Retry-After': '2'}
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error: {str(e)}', 'danger')
+    
+    return render_template('reset_password.html', username=user.email)
+
+
 @auth_bp.route('/logout')
 def logout():
     """Cerrar sesión"""
+    session_token = session.get('session_token')
+    if session_token:
+        ActiveSession.query.filter_by(session_token=session_token).update({'is_active': False})
+        db.session.commit()
+        session_validator.invalidate(session_token)
     session.clear()
     flash('Sesión cerrada', 'info')
     return redirect(url_for('index'))
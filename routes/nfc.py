@@ -1,6 +1,7 @@
 """Rutas NFC/QR: generación de códigos QR y control de dispositivos"""
 from flask import Blueprint, render_template, request, send_file, jsonify, g
-from models import Item, Transaction, db
+from models import Item, Transaction, TransactionDailyRollup, db
+from utils.inventory import apply_nfc_batch
 from datetime import datetime, timedelta
 from io import BytesIO
 from sqlalchemy import desc, func
@@ -16,6 +17,17 @@ try:
 except ImportError:
     HAS_QR = False
 
+def _nfc_counts(start_day):
+    """(returns, restocks) desde start_day, leídos del agregado diario"""
+    counts = dict(db.session.query(
+        TransactionDailyRollup.kind,
+        func.sum(TransactionDailyRollup.count)
+    ).filter(
+        TransactionDailyRollup.day >= start_day,
+        TransactionDailyRollup.kind.in_(['return', 'restock'])
+    ).group_by(TransactionDailyRollup.kind).all())
+    return int(counts.get('return') or 0), int(counts.get('restock') or 0)
+
 @nfc_bp.route('/qr/<int:item_id>')
 def qr_item(item_id):
     """GET /nfc/qr/<item_id> - Generar código QR para item (enlace)"""
@@ -89,8 +101,8 @@ def nfc_control():
                     
                     if rental:
                         rental.returned = True
-                        rental.actual_return_date = datetime.utcnow()
-                        item.stock += rental.quantity
+                        rental.return_date = datetime.utcnow()
+                        item.stock = Item.stock + (rental.qty or 0)
                         db.session.commit()
                         return jsonify({
                             'status': 'success',
@@ -105,7 +117,7 @@ def nfc_control():
                 
                 elif scan_action == 'restock':
                     quantity = int(request.form.get('quantity', 1))
-                    item.stock += quantity
+                    item.stock = Item.stock + quantity
                     db.session.commit()
                     return jsonify({
                         'status': 'success',
@@ -131,22 +143,22 @@ def nfc_stats():
     start_date = datetime.utcnow() - timedelta(days=days)
     
     try:
-        # Transacciones de return/restock en período
-        transactions = Transaction.query.filter(
-            Transaction.timestamp >= start_date,
-            Transaction.kind.in_(['return', 'restock'])
-        ).all()
+        # Conteos de return/restock en período desde el agregado diario
+        returns, restocks = _nfc_counts(start_date.date())
         
-        returns = len([t for t in transactions if t.kind == 'return'])
-        restocks = len([t for t in transactions if t.kind == 'restock'])
+        # Último escaneo: una lectura del índice (kind, timestamp) por tipo
+        last_scan = db.session.query(func.max(Transaction.timestamp)).filter(
+            Transaction.kind.in_(['return', 'restock']),
+            Transaction.timestamp >= start_date
+        ).scalar()
         
         return jsonify({
             'status': 'success',
             'period_days': days,
-            'total_scans': len(transactions),
+            'total_scans': returns + restocks,
             'returns': returns,
             'restocks': restocks,
-            'last_scan': max([t.timestamp for t in transactions]).isoformat() if transactions else None,
+            'last_scan': last_scan.isoformat() if last_scan else None,
             'device_status': 'online'
         })
     except Exception as e:
@@ -190,7 +202,7 @@ def api_nfc_scan():
             if rental:
                 rental.returned = True
                 rental.return_date = datetime.utcnow()
-                item.stock += rental.qty
+                item.stock = Item.stock + rental.qty
                 db.session.commit()
                 return jsonify({
                     'success': True,
@@ -201,7 +213,7 @@ def api_nfc_scan():
                 return jsonify({'success': False, 'message': 'No rental found'}), 400
         
         elif action == 'restock':
-            item.stock += qty
+            item.stock = Item.stock + qty
             db.session.commit()
             return jsonify({
                 'success': True,
@@ -230,65 +242,28 @@ def api_nfc_batch():
         if not operations:
             return jsonify({'success': False, 'message': 'operations required'}), 400
         
+        messages = {
+            'not_found': 'Item not found',
+            'no_rental': 'No rental found',
+            'invalid_action': 'Invalid action',
+            'invalid_quantity': 'Invalid quantity'
+        }
         results = []
         
-        for op in operations:
-            item_id = op.get('item_id')
-            action = op.get('action')
-            qty = op.get('qty', 1)
-            
-            try:
-                item = Item.query.get(item_id)
-                if not item:
-                    results.append({
-                        'item_id': item_id,
-                        'success': False,
-                        'message': 'Item not found'
-                    })
-                    continue
-                
-                if action == 'return':
-                    rental = Transaction.query.filter(
-                        Transaction.item_id == item_id,
-                        Transaction.kind == 'rent',
-                        Transaction.returned == False
-                    ).first()
-                    
-                    if rental:
-                        old_stock = item.stock
-                        rental.returned = True
-                        rental.return_date = datetime.utcnow()
-                        item.stock += rental.qty
-                        results.append({
-                            'item_id': item_id,
-                            'item_name': item.name,
-                            'success': True,
-                            'old_stock': old_stock,
-                            'new_stock': item.stock
-                        })
-                    else:
-                        results.append({
-                            'item_id': item_id,
-                            'success': False,
-                            'message': 'No rental found'
-                        })
-                
-                elif action == 'restock':
-                    old_stock = item.stock
-                    item.stock += qty
-                    results.append({
-                        'item_id': item_id,
-                        'item_name': item.name,
-                        'success': True,
-                        'old_stock': old_stock,
-                        'new_stock': item.stock
-                    })
-            
-            except Exception as e:
+        for op in apply_nfc_batch(operations, qty_field='qty'):
+            if op['success']:
                 results.append({
-                    'item_id': item_id,
+                    'item_id': op['item_id'],
+                    'item_name': op['item_name'],
+                    'success': True,
+                    'old_stock': op['old_stock'],
+                    'new_stock': op['new_stock']
+                })
+            else:
+                results.append({
+                    'item_id': op['item_id'],
                     'success': False,
-                    'message': str(e)
+                    'message': messages[op['error']]
                 })
         
         db.session.commit()
@@ -307,26 +282,20 @@ def api_nfc_stats():
     
     try:
         days = request.args.get('days', 30, type=int)
-        start_date = datetime.utcnow() - timedelta(days=days)
-        
-        transactions = Transaction.query.filter(
-            Transaction.timestamp >= start_date,
-            Transaction.kind.in_(['return', 'restock'])
-        ).all()
+        start_date = (datetime.utcnow() - timedelta(days=days)).date()
         
-        total = len(transactions)
-        returns = len([t for t in transactions if t.kind == 'return'])
-        restocks = len([t for t in transactions if t.kind == 'restock'])
+        returns, restocks = _nfc_counts(start_date)
+        total = returns + restocks
         
         # Top items escaneados
-        from sqlalchemy import func
+        scans = func.sum(TransactionDailyRollup.count)
         top_items = db.session.query(
             Item.name,
-            func.count(Transaction.id).label('scans')
-        ).join(Transaction).filter(
-            Transaction.timestamp >= start_date,
-            Transaction.kind.in_(['return', 'restock'])
-        ).group_by(Item.id).order_by(desc(func.count(Transaction.id))).limit(5).all()
+            scans.label('scans')
+        ).join(TransactionDailyRollup, TransactionDailyRollup.item_id == Item.id).filter(
+            TransactionDailyRollup.day >= start_date,
+            TransactionDailyRollup.kind.in_(['return', 'restock'])
+        ).group_by(Item.id).order_by(desc(scans)).limit(5).all()
         
         return jsonify({
             'success': True,
@@ -1,6 +1,7 @@
 """Rutas de estudiante: dashboard, rentals, estadísticas"""
-from flask import Blueprint, render_template, request, redirect, url_for, flash, g
+from flask import Blueprint, render_template, request, redirect, url_for, flash, g, session
 from models import Item, Transaction, User, db
+from utils.inventory import checkout_cart, CART_ACTIONS, MAX_CART_LINES
 from datetime import datetime, timedelta
 from sqlalchemy import and_, desc
 from functools import wraps
@@ -120,12 +121,12 @@ def return_rental(transaction_id):
     
     try:
         transaction.returned = True
-        transaction.actual_return_date = datetime.utcnow()
+        transaction.return_date = datetime.utcnow()
         
         # Restaurar stock
         item = Item.query.get(transaction.item_id)
         if item:
-            item.stock += transaction.quantity
+            item.stock = Item.stock + (transaction.qty or 0)
         
         db.session.commit()
         logger.info(f"Student {g.user.id} returned rental: {transaction.id}")
@@ -164,6 +165,96 @@ def request_extension(transaction_id):
     
     return redirect(url_for('student.student_rentals'))
 
+# ============ Carrito: líneas en la sesión, checkout todo o nada ============
+
+CHECKOUT_ERRORS = {
+    'not_found': 'El artículo ya no existe',
+    'invalid_action': 'Acción inválida',
+    'invalid_quantity': 'Cantidad inválida',
+    'not_rentable': 'El artículo no es rentable',
+    'invalid_days': 'Días de renta inválidos',
+    'invalid_date': 'Fecha de inicio inválida',
+    'insufficient_stock': 'Stock insuficiente',
+    'stock_changed': 'El stock cambió durante el checkout, intente de nuevo',
+}
+
+@student_bp.route('/cart')
+@student_required
+def cart():
+    """Carrito de compras y rentas pendientes de checkout"""
+    lines = session.get('cart', [])
+    item_ids = {line['item_id'] for line in lines}
+    items = {item.id: item for item in Item.query.filter(Item.id.in_(item_ids))} if item_ids else {}
+    return render_template('student_cart.html', lines=lines, items=items, max_lines=MAX_CART_LINES)
+
+@student_bp.route('/cart/add/<int:item_id>', methods=['POST'])
+@student_required
+def cart_add(item_id):
+    """Agrega una línea (compra o renta) al carrito"""
+    item = Item.query.get_or_404(item_id)
+    action = request.form.get('action', 'buy')
+    qty = request.form.get('qty', 1, type=int)
+    
+    if action not in CART_ACTIONS or not qty or qty < 1:
+        flash('Cantidad o acción inválida', 'danger')
+        return redirect(url_for('view_item', item_id=item.id))
+    if action == 'rent' and not item.rentable:
+        flash('Este item no es rentable', 'danger')
+        return redirect(url_for('view_item', item_id=item.id))
+    
+    lines = session.get('cart', [])
+    if len(lines) >= MAX_CART_LINES:
+        flash(f'El carrito admite hasta {MAX_CART_LINES} líneas', 'warning')
+        return redirect(url_for('student.cart'))
+    
+    line = {'item_id': item.id, 'action': action, 'qty': qty}
+    if action == 'rent':
+        line['days'] = request.form.get('days', 7, type=int)
+        line['start_date'] = request.form.get('start_date') or None
+    lines.append(line)
+    session['cart'] = lines
+    flash(f'{item.name} agregado al carrito', 'success')
+    return redirect(url_for('student.cart'))
+
+@student_bp.route('/cart/remove/<int:index>', methods=['POST'])
+@student_required
+def cart_remove(index):
+    """Quita una línea del carrito"""
+    lines = session.get('cart', [])
+    if 0 <= index < len(lines):
+        lines.pop(index)
+        session['cart'] = lines
+    return redirect(url_for('student.cart'))
+
+@student_bp.route('/cart/checkout', methods=['POST'])
+@student_required
+def cart_checkout():
+    """Compra / renta todas las líneas del carrito en una sola transacción"""
+    lines = session.get('cart', [])
+    if not lines:
+        flash('El carrito está vacío', 'warning')
+        return redirect(url_for('student.cart'))
+    
+    try:
+        ok, results = checkout_cart(g.user.id, lines)
+        if not ok:
+            db.session.rollback()
+            for result in results:
+                if result['error']:
+                    flash(f"Artículo {result['item_id']}: {CHECKOUT_ERRORS[result['error']]}", 'danger')
+            return redirect(url_for('student.cart'))
+        
+        db.session.commit()
+        session.pop('cart', None)
+        logger.info(f"Student {g.user.id} checked out {len(lines)} cart lines")
+        flash(f'Checkout realizado: {len(lines)} artículos', 'success')
+        return redirect(url_for('student.student_rentals'))
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error in cart checkout: {e}")
+        flash(f'Error: {str(e)}', 'danger')
+        return redirect(url_for('student.cart'))
+
 @student_bp.route('/statistics')
 @student_required
 def student_statistics():
@@ -5,12 +5,23 @@ Script de prueba integral para verificar que todo el sistema funciona correctame
 
 import sys
 import os
+import shutil
+import tempfile
+from datetime import datetime
 from pathlib import Path
 
 os.chdir(Path(__file__).parent)
 
-from app import app, db
-from models import User, Item, Supplier, PurchaseOrder, Transaction, ApiKey, LoginAttempt, ActiveSession
+# Copia de inventory.db migrada al arrancar como en un despliegue (init_db):
+# las pruebas no modifican la base versionada
+TEST_DB = os.path.join(tempfile.mkdtemp(), 'inventory.db')
+shutil.copy('inventory.db', TEST_DB)
+os.environ['DATABASE_URL'] = f'sqlite:///{TEST_DB}'
+
+from app import app, db, init_db
+from models import User, Item, Supplier, PurchaseOrder, Transaction, TransactionDailyRollup, ApiKey, LoginAttempt, ActiveSession
+from utils.inventory import apply_nfc_batch
+from utils.api_keys import api_key_auth
 from utils.analytics import (
     get_analytics_data,
     get_trending_products,
@@ -19,6 +30,8 @@ from utils.analytics import (
     get_supplier_intelligence
 )
 
+init_db()  # migrate_db.migrate_database() + create_all(), igual que python app.py
+
 def test_database_connection():
     """Probar conexión a la base de datos"""
     print("\n" + "="*70)
@@ -123,6 +136,225 @@ def test_supplier_intelligence():
         traceback.print_exc()
         return False
 
+def test_rental_return():
+    """Probar la devolución individual de un estudiante (POST /student/rentals/<id>/return)"""
+    print("\n" + "="*70)
+    print("↩️  TEST 6: DEVOLUCIÓN DE RENTA")
+    print("="*70)
+    
+    with app.app_context():
+        student = User(username='test_return', email='test_return@example.com', password_hash='!', role='student')
+        item = Item(name='Calculadora de prueba', stock=3, total_stock=5, rentable=True)
+        db.session.add_all([student, item])
+        db.session.commit()
+        rental = Transaction(user_id=student.id, item_id=item.id, kind='rent', qty=2, rent_days=7)
+        db.session.add(rental)
+        db.session.commit()
+        token = ActiveSession.create_session(student.id, '127.0.0.1', '')
+        student_id, item_id, rental_id = student.id, item.id, rental.id
+    
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = student_id
+        sess['session_token'] = token
+    response = client.post(f'/student/rentals/{rental_id}/return')
+    
+    with app.app_context():
+        rental = db.session.get(Transaction, rental_id)
+        item = db.session.get(Item, item_id)
+        print(f"{'✅' if rental.returned else '❌'} HTTP {response.status_code}, devuelta: {rental.returned}")
+        print(f"{'✅' if item.stock == 5 else '❌'} Stock restaurado: {item.stock}")
+        assert response.status_code == 302
+        assert rental.returned and rental.return_date is not None
+        assert item.stock == 5
+    return True
+
+def test_nfc_batch():
+    """Probar que apply_nfc_batch conserva el comportamiento del bucle por operación"""
+    print("\n" + "="*70)
+    print("📡 TEST 7: LOTE NFC")
+    print("="*70)
+    
+    with app.app_context():
+        student = User(username='test_nfc', email='test_nfc@example.com', password_hash='!', role='student')
+        item = Item(name='Multímetro de prueba', stock=1, total_stock=10, rentable=True)
+        db.session.add_all([student, item])
+        db.session.commit()
+        rentals = [Transaction(user_id=student.id, item_id=item.id, kind='rent', qty=qty, rent_days=7) for qty in (2, 3, 4)]
+        db.session.add_all(rentals)
+        db.session.commit()
+        item_id, rental_ids, day = item.id, [r.id for r in rentals], rentals[0].day
+        rollup_before = db.session.get(TransactionDailyRollup, (day, item_id, 'rent'))
+        returned_before = (rollup_before.returned_count, rollup_before.returned_qty)
+        
+        results = apply_nfc_batch([
+            {'item_id': item_id, 'action': 'return'},
+            {'item_id': item_id, 'action': 'return'},
+            {'item_id': item_id, 'action': 'restock', 'qty': 5},
+            {'item_id': item_id, 'action': 'restock', 'qty': 0},
+            {'item_id': item_id, 'action': 'restock', 'qty': 'x'},
+            {'item_id': item_id, 'action': 'borrar'},
+            {'item_id': 999999, 'action': 'return'},
+        ])
+        db.session.commit()
+        db.session.expire_all()
+        
+        print(f"   • Resultados: {[(r['action'], r['success'], r['error']) for r in results]}")
+        assert [r['success'] for r in results] == [True, True, True, False, False, False, False]
+        assert [r['error'] for r in results[3:]] == ['invalid_quantity', 'invalid_quantity', 'invalid_action', 'not_found']
+        assert [(r['old_stock'], r['new_stock']) for r in results[:3]] == [(1, 3), (3, 6), (6, 11)]
+        
+        # Las dos devoluciones cierran las dos rentas más antiguas
+        returned = [db.session.get(Transaction, rental_id).returned for rental_id in rental_ids]
+        print(f"{'✅' if returned == [True, True, False] else '❌'} Rentas cerradas: {returned}")
+        assert returned == [True, True, False]
+        assert db.session.get(Item, item_id).stock == 11
+        
+        rollup = db.session.get(TransactionDailyRollup, (day, item_id, 'rent'))
+        delta = (rollup.returned_count - returned_before[0], rollup.returned_qty - returned_before[1])
+        print(f"{'✅' if delta == (2, 5) else '❌'} Rollup: +{delta[0]} devueltas, +{delta[1]} unidades")
+        assert delta == (2, 5)
+    return True
+
+def test_cart_checkout():
+    """Probar el checkout todo o nada de varias líneas (POST /api/checkout)"""
+    print("\n" + "="*70)
+    print("🛒 TEST 8: CHECKOUT DE CARRITO")
+    print("="*70)
+    
+    with app.app_context():
+        student = User(username='test_checkout', email='test_checkout@example.com', password_hash='!', role='student')
+        pens = Item(name='Bolígrafos de prueba', stock=5, total_stock=5)
+        tablet = Item(name='Tableta de prueba', stock=1, total_stock=1, rentable=True)
+        db.session.add_all([student, pens, tablet])
+        db.session.commit()
+        api_key = ApiKey(key=f'test-checkout-{student.id}', name='kiosko', user_id=student.id)
+        db.session.add(api_key)
+        db.session.commit()
+        student_id, pens_id, tablet_id, key = student.id, pens.id, tablet.id, api_key.key
+    
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {key}'}
+    
+    def stock_and_transactions():
+        with app.app_context():
+            return (
+                db.session.get(Item, pens_id).stock,
+                db.session.get(Item, tablet_id).stock,
+                Transaction.query.filter(Transaction.item_id.in_([pens_id, tablet_id])).count()
+            )
+    
+    # Una línea sin stock suficiente anula todo el carrito
+    response = client.post('/api/checkout', headers=headers, json={'lines': [
+        {'item_id': pens_id, 'action': 'buy', 'qty': 2},
+        {'item_id': tablet_id, 'action': 'rent', 'qty': 3, 'days': 7},
+    ]})
+    state = stock_and_transactions()
+    print(f"{'✅' if response.status_code == 409 else '❌'} HTTP {response.status_code} con una línea corta")
+    print(f"{'✅' if state == (5, 1, 0) else '❌'} Sin cambios (stock, stock, transacciones): {state}")
+    assert response.status_code == 409
+    assert state == (5, 1, 0)
+    
+    # Entradas mal formadas: 400, no 403 ni 500
+    assert client.post('/api/checkout', headers=headers, json={'lines': [pens_id]}).status_code == 400
+    assert client.post('/api/checkout', headers=headers, json={
+        'user_id': 'abc', 'lines': [{'item_id': pens_id, 'action': 'buy'}]
+    }).status_code == 400
+    
+    # Carrito válido; user_id propio enviado como texto
+    response = client.post('/api/checkout', headers=headers, json={'user_id': str(student_id), 'lines': [
+        {'item_id': pens_id, 'action': 'buy', 'qty': 2},
+        {'item_id': pens_id, 'action': 'buy', 'qty': 1},
+        {'item_id': tablet_id, 'action': 'rent', 'qty': 1, 'days': 7},
+    ]})
+    state = stock_and_transactions()
+    print(f"{'✅' if response.status_code == 200 else '❌'} HTTP {response.status_code}, estado: {state}")
+    assert response.status_code == 200
+    assert state == (2, 0, 3)
+    
+    with app.app_context():
+        today = datetime.utcnow().date()
+        buys = db.session.get(TransactionDailyRollup, (today, pens_id, 'buy'))
+        rents = db.session.get(TransactionDailyRollup, (today, tablet_id, 'rent'))
+        rollup = ((buys.count, buys.qty), (rents.count, rents.qty))
+        print(f"{'✅' if rollup == ((2, 3), (1, 1)) else '❌'} Rollup (conteo, cantidad): {rollup}")
+        assert rollup == ((2, 3), (1, 1))
+    return True
+
+def test_api_token_revocation():
+    """Probar que revocar una API key invalida los tokens de acceso ya emitidos"""
+    print("\n" + "="*70)
+    print("🔑 TEST 9: REVOCACIÓN DE TOKENS DE ACCESO")
+    print("="*70)
+    
+    with app.app_context():
+        owner = User(username='test_tokens', email='test_tokens@example.com', password_hash='!', role='student')
+        db.session.add(owner)
+        db.session.commit()
+        keys = [ApiKey(key=f'test-token-{owner.id}-{i}', name=f'kiosko {i}', user_id=owner.id) for i in range(2)]
+        db.session.add_all(keys)
+        db.session.commit()
+        key_values, key_ids = [k.key for k in keys], [k.id for k in keys]
+    
+    client = app.test_client()
+    tokens = []
+    for key in key_values:
+        response = client.post('/api/token', headers={'Authorization': f'Bearer {key}'})
+        assert response.status_code == 200
+        tokens.append(response.get_json()['access_token'])
+    
+    def items_status(token):
+        return client.get('/api/items', headers={'Authorization': f'Bearer {token}'}).status_code
+    
+    assert [items_status(token) for token in tokens] == [200, 200]
+    
+    # Revocada en este worker: api_key_auth.revoke (lo que hace el panel de API keys)
+    with app.app_context():
+        api_key_auth.revoke(db.session.get(ApiKey, key_ids[0]))
+    # Revocada en otro worker: fila desactivada y archivo de marca tocado
+    with app.app_context():
+        db.session.get(ApiKey, key_ids[1]).is_active = False
+        db.session.commit()
+    with open(api_key_auth.stamp_path, 'a'):
+        pass
+    stamp = os.stat(api_key_auth.stamp_path)
+    os.utime(api_key_auth.stamp_path, ns=(stamp.st_atime_ns, stamp.st_mtime_ns + 1_000_000))
+    
+    statuses = [items_status(token) for token in tokens]
+    print(f"{'✅' if statuses == [401, 401] else '❌'} Tokens tras revocar (este worker, otro worker): {statuses}")
+    assert statuses == [401, 401]
+    return True
+
+def test_keyset_null_timestamps():
+    """Probar que la paginación por cursor recorre también las transacciones sin timestamp"""
+    print("\n" + "="*70)
+    print("📄 TEST 10: PAGINACIÓN POR CURSOR CON TIMESTAMP NULL")
+    print("="*70)
+    
+    with app.app_context():
+        item = Item(name='Regla de prueba', stock=10, total_stock=10)
+        db.session.add(item)
+        db.session.commit()
+        txs = [Transaction(item_id=item.id, kind='sale', qty=1) for _ in range(5)]
+        db.session.add_all(txs)
+        db.session.commit()
+        # Filas importadas o antiguas sin timestamp
+        Transaction.query.filter(Transaction.id.in_([t.id for t in txs[1:4]])).update(
+            {Transaction.timestamp: None}, synchronize_session=False
+        )
+        db.session.commit()
+        
+        expected = [t.id for t in Transaction.search(page=1, per_page=10, item_id=item.id).items]
+        seen, cursor = [], ''
+        while cursor is not None:
+            page = Transaction.search(per_page=2, cursor=cursor, item_id=item.id)
+            seen += [t.id for t in page.items]
+            cursor = page.next_cursor
+    
+    print(f"{'✅' if seen == expected else '❌'} Por cursor: {seen}, por página: {expected}")
+    assert seen == expected and len(seen) == 5
+    return True
+
 def test_routes():
     """Probar que las rutas están registradas"""
     print("\n" + "="*70)
@@ -170,6 +402,11 @@ def main():
         "Analytics Predictivo": test_predictive_analytics(),
         "Inteligencia de Proveedores": test_supplier_intelligence(),
         "Rutas": test_routes(),
+        "Devolución de renta": test_rental_return(),
+        "Lote NFC": test_nfc_batch(),
+        "Checkout de carrito": test_cart_checkout(),
+        "Revocación de tokens": test_api_token_revocation(),
+        "Cursor con timestamp NULL": test_keyset_null_timestamps(),
     }
     
     print("\n" + "="*70)
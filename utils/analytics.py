@@ -1,89 +1,115 @@
 """Análisis e IA: demanda estacional, recomendaciones, analytics"""
 from datetime import datetime, timedelta
 from collections import defaultdict
-from sqlalchemy import func
-from models import Transaction, Item, db
+from sqlalchemy import func, case, and_, extract, cast, Integer
+from models import Transaction, TransactionDailyRollup, Item, Supplier, PurchaseOrder, db
+from utils.parallel import run_parallel
+import heapq
 import logging
 import statistics
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+def _week_start(column):
+    """Lunes de la semana ISO de `column`, calculado en la BD"""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return func.date(column, '-6 days', 'weekday 1')
+    return func.date_trunc('week', column)
+
+def _whole_days_between(end, start):
+    """Días completos entre dos columnas DateTime (como timedelta.days para valores positivos)"""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return cast(func.julianday(end) - func.julianday(start), Integer)
+    return cast(func.floor(extract('epoch', end - start) / 86400), Integer)
+
+def _forecast_from_weekly(weekly_values):
+    """Forecast de 12 semanas a partir de los ingresos semanales (orden cronológico)"""
+    if not weekly_values:
+        return {
+            'forecast': {},
+            'average_weekly': 0,
+            'trend': 'Sin datos',
+            'confidence': 0
+        }
+    
+    # Calcular promedio y tendencia
+    avg_weekly = statistics.mean(weekly_values) if weekly_values else 0
+    
+    # Análisis de tendencia
+    if len(weekly_values) > 2:
+        recent_avg = statistics.mean(weekly_values[-4:]) if len(weekly_values) >= 4 else weekly_values[-1]
+        old_avg = statistics.mean(weekly_values[:4]) if len(weekly_values) >= 4 else weekly_values[0]
+        trend_percent = ((recent_avg - old_avg) / old_avg * 100) if old_avg > 0 else 0
+        
+        if trend_percent > 10:
+            trend = "📈 Crecimiento Fuerte"
+        elif trend_percent > 0:
+            trend = "📊 Crecimiento Moderado"
+        elif trend_percent > -10:
+            trend = "📉 Ligera Caída"
+        else:
+            trend = "📉 Caída Significativa"
+    else:
+        trend = "Sin suficientes datos"
+        trend_percent = 0
+    
+    # Generar forecast para próximas 12 semanas
+    forecast = {}
+    today = datetime.utcnow()
+    
+    for i in range(1, 13):
+        future_date = today + timedelta(weeks=i)
+        week_num = future_date.isocalendar()[1]
+        
+        # Predicción conservadora: promedio histórico con ajuste de tendencia
+        base_forecast = avg_weekly
+        trend_adjustment = (trend_percent / 100) * avg_weekly
+        predicted_revenue = base_forecast + (trend_adjustment * (i / 12))
+        
+        forecast[f"Sem {i}"] = {
+            'date': future_date.strftime('%d/%m/%Y'),
+            'predicted_revenue': round(predicted_revenue, 0),
+            'confidence': max(50, min(95, 70 + (len(weekly_values) * 2)))
+        }
+    
+    return {
+        'forecast': forecast,
+        'average_weekly': round(avg_weekly, 0),
+        'total_historical': round(sum(weekly_values), 0),
+        'trend': trend,
+        'trend_percent': round(trend_percent, 1),
+        'confidence': max(50, min(95, 70 + (len(weekly_values) * 2)))
+    }
+
 def forecast_revenue(weeks=12):
     """Predice ingresos para las próximas 12 semanas basado en datos históricos"""
     try:
-        # Obtener transacciones de compra de últimas 12 semanas
-        twelve_weeks_ago = datetime.utcnow() - timedelta(weeks=12)
+        # Obtener transacciones de compra de últimas 12 semanas (días completos)
+        twelve_weeks_ago = datetime.utcnow().date() - timedelta(weeks=12)
         
         sales_by_week = defaultdict(float)
         
-        transactions = Transaction.query.filter(
-            Transaction.kind.in_(['buy', 'rent']),
-            Transaction.timestamp >= twelve_weeks_ago
-        ).all()
-        
-        for tx in transactions:
-            if tx.timestamp and tx.item:
-                week_num = tx.timestamp.isocalendar()[1]
-                revenue = tx.item.price * tx.qty
-                sales_by_week[week_num] += revenue
-        
-        if not sales_by_week:
-            return {
-                'forecast': {},
-                'average_weekly': 0,
-                'trend': 'Sin datos',
-                'confidence': 0
-            }
-        
-        # Calcular promedio y tendencia
-        weekly_values = list(sales_by_week.values())
-        avg_weekly = statistics.mean(weekly_values) if weekly_values else 0
-        
-        # Análisis de tendencia
-        if len(weekly_values) > 2:
-            recent_avg = statistics.mean(weekly_values[-4:]) if len(weekly_values) >= 4 else weekly_values[-1]
-            old_avg = statistics.mean(weekly_values[:4]) if len(weekly_values) >= 4 else weekly_values[0]
-            trend_percent = ((recent_avg - old_avg) / old_avg * 100) if old_avg > 0 else 0
-            
-            if trend_percent > 10:
-                trend = "📈 Crecimiento Fuerte"
-            elif trend_percent > 0:
-                trend = "📊 Crecimiento Moderado"
-            elif trend_percent > -10:
-                trend = "📉 Ligera Caída"
-            else:
-                trend = "📉 Caída Significativa"
-        else:
-            trend = "Sin suficientes datos"
-            trend_percent = 0
-        
-        # Generar forecast para próximas 12 semanas
-        forecast = {}
-        today = datetime.utcnow()
-        
-        for i in range(1, 13):
-            future_date = today + timedelta(weeks=i)
-            week_num = future_date.isocalendar()[1]
-            
-            # Predicción conservadora: promedio histórico con ajuste de tendencia
-            base_forecast = avg_weekly
-            trend_adjustment = (trend_percent / 100) * avg_weekly
-            predicted_revenue = base_forecast + (trend_adjustment * (i / 12))
-            
-            forecast[f"Sem {i}"] = {
-                'date': future_date.strftime('%d/%m/%Y'),
-                'predicted_revenue': round(predicted_revenue, 0),
-                'confidence': max(50, min(95, 70 + (len(weekly_values) * 2)))
-            }
-        
-        return {
-            'forecast': forecast,
-            'average_weekly': round(avg_weekly, 0),
-            'total_historical': round(sum(weekly_values), 0),
-            'trend': trend,
-            'trend_percent': round(trend_percent, 1),
-            'confidence': max(50, min(95, 70 + (len(weekly_values) * 2)))
-        }
+        # Ingresos por semana desde el agregado diario, con el precio del item por join
+        week_start = _week_start(TransactionDailyRollup.day)
+        weekly_revenue = db.session.query(
+            week_start,
+            func.sum(Item.price * TransactionDailyRollup.qty)
+        ).join(
+            Item, TransactionDailyRollup.item_id == Item.id
+        ).filter(
+            TransactionDailyRollup.kind.in_(['buy', 'rent']),
+            TransactionDailyRollup.day >= twelve_weeks_ago
+        ).group_by(week_start).order_by(week_start).all()
+        
+        for week, revenue in weekly_revenue:
+            if isinstance(week, str):
+                week = datetime.strptime(week, '%Y-%m-%d')
+            # Clave (año ISO, semana ISO): semanas de años distintos no se mezclan
+            iso_year, week_num, _ = week.isocalendar()
+            sales_by_week[(iso_year, week_num)] += revenue or 0
+        
+        return _forecast_from_weekly(list(sales_by_week.values()))
     
     except Exception as e:
         logger.error(f"Error en forecast_revenue: {str(e)}")
@@ -95,6 +121,36 @@ def forecast_revenue(weeks=12):
             'error': str(e)
         }
 
+def _trending_from_periods(first_dict, second_dict, limit):
+    """Items en crecimiento entre dos períodos ({item_id: {count, qty, name, category, price}})"""
+    # Calcular growth
+    trending = []
+    
+    for item_id, second_data in second_dict.items():
+        first_data = first_dict.get(item_id, {'count': 0, 'qty': 0})
+        first_count = first_data.get('count', 0)
+        
+        if first_count > 0:
+            growth = ((second_data['count'] - first_count) / first_count) * 100
+        else:
+            growth = 100 if second_data['count'] > 0 else 0
+        
+        if growth > 0:  # Solo items en crecimiento
+            trending.append({
+                'item_id': item_id,
+                'name': second_data['name'],
+                'category': second_data['category'],
+                'price': second_data['price'],
+                'growth_percent': round(growth, 1),
+                'current_transactions': second_data['count'],
+                'previous_transactions': first_count,
+                'momentum': 'Explosión' if growth > 100 else ('Fuerte' if growth > 50 else ('Moderado' if growth > 25 else 'Leve'))
+            })
+    
+    # Ordenar por growth y retornar top
+    trending_sorted = sorted(trending, key=lambda x: x['growth_percent'], reverse=True)
+    return trending_sorted[:limit]
+
 def get_trending_products(days=30, limit=8):
     """Identifica productos en tendencia (crecimiento en demanda)"""
     try:
@@ -106,87 +162,66 @@ def get_trending_products(days=30, limit=8):
         second_half_start = today - timedelta(days=period_days // 2)
         second_half_end = today
         
-        # Transacciones primera mitad
-        first_period = db.session.query(
-            Item.id,
-            Item.name,
-            Item.category,
-            Item.price,
-            func.count(Transaction.id).label('count'),
-            func.sum(Transaction.qty).label('total_qty')
-        ).join(Transaction).filter(
-            Transaction.timestamp >= first_half_start,
-            Transaction.timestamp <= first_half_end,
-            Transaction.kind.in_(['buy', 'rent'])
-        ).group_by(Item.id).all()
-        
-        # Transacciones segunda mitad
-        second_period = db.session.query(
-            Item.id,
-            Item.name,
-            Item.category,
-            Item.price,
-            func.count(Transaction.id).label('count'),
-            func.sum(Transaction.qty).label('total_qty')
-        ).join(Transaction).filter(
-            Transaction.timestamp >= second_half_start,
-            Transaction.timestamp <= second_half_end,
-            Transaction.kind.in_(['buy', 'rent'])
-        ).group_by(Item.id).all()
+        def period_totals(start, end):
+            """Conteo y cantidad por item en los días [start, end) desde el agregado diario"""
+            return db.session.query(
+                Item.id,
+                Item.name,
+                Item.category,
+                Item.price,
+                func.sum(TransactionDailyRollup.count).label('count'),
+                func.sum(TransactionDailyRollup.qty).label('total_qty')
+            ).join(TransactionDailyRollup, TransactionDailyRollup.item_id == Item.id).filter(
+                TransactionDailyRollup.day >= start,
+                TransactionDailyRollup.day < end,
+                TransactionDailyRollup.kind.in_(['buy', 'rent'])
+            ).group_by(Item.id).all()
+        
+        # Transacciones primera y segunda mitad
+        first_period = period_totals(first_half_start, first_half_end)
+        second_period = period_totals(second_half_start, second_half_end)
         
         # Crear dict para comparación
         first_dict = {item[0]: {'count': item[4], 'qty': item[5] or 0, 'name': item[1], 'category': item[2], 'price': item[3]} for item in first_period}
         second_dict = {item[0]: {'count': item[4], 'qty': item[5] or 0, 'name': item[1], 'category': item[2], 'price': item[3]} for item in second_period}
         
-        # Calcular growth
-        trending = []
-        
-        for item_id, second_data in second_dict.items():
-            first_data = first_dict.get(item_id, {'count': 0, 'qty': 0})
-            first_count = first_data.get('count', 0)
-            
-            if first_count > 0:
-                growth = ((second_data['count'] - first_count) / first_count) * 100
-            else:
-                growth = 100 if second_data['count'] > 0 else 0
-            
-            if growth > 0:  # Solo items en crecimiento
-                trending.append({
-                    'item_id': item_id,
-                    'name': second_data['name'],
-                    'category': second_data['category'],
-                    'price': second_data['price'],
-                    'growth_percent': round(growth, 1),
-                    'current_transactions': second_data['count'],
-                    'previous_transactions': first_count,
-                    'momentum': 'Explosión' if growth > 100 else ('Fuerte' if growth > 50 else ('Moderado' if growth > 25 else 'Leve'))
-                })
-        
-        # Ordenar por growth y retornar top
-        trending_sorted = sorted(trending, key=lambda x: x['growth_percent'], reverse=True)
-        return trending_sorted[:limit]
+        return _trending_from_periods(first_dict, second_dict, limit)
     
     except Exception as e:
         logger.error(f"Error en get_trending_products: {str(e)}")
         return []
 
+def _predictive_result(revenue_forecast, trending_products, total_transactions):
+    """Resultado del panel predictivo con el puntaje de confianza global"""
+    confidence_score = min(95, 60 + (min(total_transactions, 1000) / 1000 * 35))
+    
+    return {
+        'revenue_forecast': revenue_forecast,
+        'trending_products': trending_products,
+        'confidence_score': round(confidence_score, 1),
+        'last_updated': datetime.utcnow().strftime('%d/%m/%Y %H:%M'),
+        'data_points': total_transactions
+    }
+
 def get_predictive_analytics():
     """Combina revenue forecast y trending products para panel predictivo"""
     try:
-        revenue_forecast = forecast_revenue(weeks=12)
-        trending_products = get_trending_products(days=30, limit=8)
-        
-        # Calcular métricas de confianza global
-        total_transactions = Transaction.query.count()
-        confidence_score = min(95, 60 + (min(total_transactions, 1000) / 1000 * 35))
-        
-        return {
-            'revenue_forecast': revenue_forecast,
-            'trending_products': trending_products,
-            'confidence_score': round(confidence_score, 1),
-            'last_updated': datetime.utcnow().strftime('%d/%m/%Y %H:%M'),
-            'data_points': total_transactions
-        }
+        # Tres consultas independientes: cada una en el pool, con su propia sesión
+        results, failed = run_parallel({
+            'revenue_forecast': (lambda: forecast_revenue(weeks=12), {}),
+            'trending_products': (lambda: get_trending_products(days=30, limit=8), []),
+            # Calcular métricas de confianza global
+            'total_transactions': (lambda: db.session.query(
+                func.coalesce(func.sum(TransactionDailyRollup.count), 0)
+            ).scalar(), 0),
+        })
+        
+        result = _predictive_result(
+            results['revenue_forecast'], results['trending_products'], results['total_transactions']
+        )
+        if failed:
+            result['partial'] = failed
+        return result
     
     except Exception as e:
         logger.error(f"Error en get_predictive_analytics: {str(e)}")
@@ -198,80 +233,152 @@ def get_predictive_analytics():
         }
 
 
-def calculate_seasonal_demand():
-    """Analiza patrones estacionales y predice demanda para próximos 3 meses"""
-    try:
-        all_transactions = Transaction.query.filter(
-            Transaction.timestamp != None
-        ).all()
-        
-        if not all_transactions:
-            return {'peaks': {}, 'forecast': {}, 'seasonal_pattern': {}}
-        
-        seasonal_pattern = defaultdict(int)
+def _seasonal_from_months(monthly_counts):
+    """Picos y forecast de 3 meses a partir de [(mes 1-12, transacciones)] en orden de mes"""
+    if not monthly_counts:
+        return {'peaks': {}, 'forecast': {}, 'seasonal_pattern': {}}
+    
+    seasonal_pattern = defaultdict(int)
+    
+    for month, count in monthly_counts:
+        month_name = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
+                     'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre'][int(month) - 1]
+        seasonal_pattern[month_name] += count
+    
+    if seasonal_pattern:
+        avg_transactions = sum(seasonal_pattern.values()) / len(seasonal_pattern)
+        peaks = {}
+        
+        back_to_school = ['Julio', 'Agosto', 'Septiembre']
+        christmas = ['Noviembre', 'Diciembre']
+        midterm = ['Marzo', 'Octubre', 'Noviembre']
+        
+        for month, count in seasonal_pattern.items():
+            if month in back_to_school:
+                peaks[month] = {
+                    'type': 'Escolar (Vuelta a clases)',
+                    'intensity': count / avg_transactions if avg_transactions > 0 else 1
+                }
+            elif month in christmas:
+                peaks[month] = {
+                    'type': 'Fin de Año',
+                    'intensity': count / avg_transactions if avg_transactions > 0 else 1
+                }
+            elif month in midterm and count > avg_transactions:
+                peaks[month] = {
+                    'type': 'Semana de Parciales',
+                    'intensity': count / avg_transactions if avg_transactions > 0 else 1
+                }
         
-        for t in all_transactions:
-            if t.timestamp:
-                month = t.timestamp.month
-                month_name = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
-                             'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre'][month - 1]
-                seasonal_pattern[month_name] += 1
+        today = datetime.utcnow()
+        current_month = today.month
+        forecast = {}
         
-        if seasonal_pattern:
-            avg_transactions = sum(seasonal_pattern.values()) / len(seasonal_pattern)
-            peaks = {}
-            
-            back_to_school = ['Julio', 'Agosto', 'Septiembre']
-            christmas = ['Noviembre', 'Diciembre']
-            midterm = ['Marzo', 'Octubre', 'Noviembre']
+        for i in range(1, 4):
+            future_month = (current_month + i - 1) % 12 + 1
+            month_name = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
+                        'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre'][future_month - 1]
             
-            for month, count in seasonal_pattern.items():
-                if month in back_to_school:
-                    peaks[month] = {
-                        'type': 'Escolar (Vuelta a clases)',
-                        'intensity': count / avg_transactions if avg_transactions > 0 else 1
-                    }
-                elif month in christmas:
-                    peaks[month] = {
-                        'type': 'Fin de Año',
-                        'intensity': count / avg_transactions if avg_transactions > 0 else 1
-                    }
-                elif month in midterm and count > avg_transactions:
-                    peaks[month] = {
-                        'type': 'Semana de Parciales',
-                        'intensity': count / avg_transactions if avg_transactions > 0 else 1
-                    }
-            
-            today = datetime.utcnow()
-            current_month = today.month
-            forecast = {}
-            
-            for i in range(1, 4):
-                future_month = (current_month + i - 1) % 12 + 1
-                month_name = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
-                            'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre'][future_month - 1]
-                
-                historical = seasonal_pattern.get(month_name, 0)
-                predicted = int(historical * 1.05) if historical > 0 else int(avg_transactions)
-                peak_indicator = 'Alza' if predicted > avg_transactions * 1.2 else 'Normal'
-                
-                forecast[month_name] = {
-                    'predicted_transactions': predicted,
-                    'trend': peak_indicator,
-                    'vs_average': f"+{((predicted / avg_transactions - 1) * 100):.0f}%" if avg_transactions > 0 else "0%"
-                }
+            historical = seasonal_pattern.get(month_name, 0)
+            predicted = int(historical * 1.05) if historical > 0 else int(avg_transactions)
+            peak_indicator = 'Alza' if predicted > avg_transactions * 1.2 else 'Normal'
             
-            return {
-                'peaks': peaks,
-                'forecast': forecast,
-                'seasonal_pattern': dict(seasonal_pattern),
-                'average_monthly': int(avg_transactions)
+            forecast[month_name] = {
+                'predicted_transactions': predicted,
+                'trend': peak_indicator,
+                'vs_average': f"+{((predicted / avg_transactions - 1) * 100):.0f}%" if avg_transactions > 0 else "0%"
             }
+        
+        return {
+            'peaks': peaks,
+            'forecast': forecast,
+            'seasonal_pattern': dict(seasonal_pattern),
+            'average_monthly': int(avg_transactions)
+        }
+
+def calculate_seasonal_demand():
+    """Analiza patrones estacionales y predice demanda para próximos 3 meses"""
+    try:
+        # Histograma por mes desde el agregado diario: a lo sumo 12 filas
+        month_expr = extract('month', TransactionDailyRollup.day)
+        monthly_counts = db.session.query(
+            month_expr,
+            func.sum(TransactionDailyRollup.count)
+        ).group_by(month_expr).order_by(month_expr).all()
+        
+        return _seasonal_from_months(monthly_counts)
     
     except Exception as e:
         logger.error(f"Error en calculate_seasonal_demand: {str(e)}")
         return {'peaks': {}, 'forecast': {}, 'seasonal_pattern': {}, 'error': str(e)}
 
+def get_reorder_recommendations(limit=3):
+    """Top-k de items a reponer: una consulta agregada + puntaje vectorizado + heap"""
+    thirty_days_ago = datetime.utcnow().date() - timedelta(days=30)
+    
+    # Candidatos con stock bajo (2 si es rentable, 10 si no) y sus conteos total / 30 días
+    rows = db.session.query(
+        Item.id,
+        Item.stock,
+        Item.rentable,
+        func.coalesce(func.sum(TransactionDailyRollup.count), 0),
+        func.coalesce(func.sum(case(
+            (TransactionDailyRollup.day >= thirty_days_ago, TransactionDailyRollup.count), else_=0
+        )), 0)
+    ).outerjoin(
+        TransactionDailyRollup, TransactionDailyRollup.item_id == Item.id
+    ).filter(
+        Item.stock != 0,
+        Item.stock <= case((Item.rentable == True, 2), else_=10)
+    ).group_by(Item.id).order_by(Item.id).all()
+    
+    if not rows:
+        return []
+    
+    item_ids, stock, rentable, total_tx, recent_tx = (np.array(col) for col in zip(*rows))
+    return _reorder_from_counts(item_ids, stock, rentable, total_tx, recent_tx, limit)
+
+def _reorder_from_counts(item_ids, stock, rentable, total_tx, recent_tx, limit):
+    """Puntaje vectorizado + heap sobre arreglos de candidatos (en orden de Item.id)"""
+    rentable = rentable.astype(bool)
+    
+    consumption = recent_tx / 30.0
+    min_stock = np.maximum(np.where(rentable, 2, 10), (consumption * 7).astype(np.int64))
+    scores = (recent_tx * 40) + ((min_stock - stock) * 30) + (total_tx * 0.3)
+    
+    # nlargest conserva el orden estable de sorted(..., reverse=True)[:limit]
+    top = heapq.nlargest(limit, range(len(item_ids)), key=scores.tolist().__getitem__)
+    items = {item['id']: item for item in _item_summaries(Item.id.in_([int(item_ids[i]) for i in top]))}
+    
+    return [{
+        'item': items[int(item_ids[i])],
+        'score': float(scores[i]),
+        'consumption_rate': round(float(consumption[i]), 2),
+        'recommended_stock': int(min_stock[i]),
+        'recent_transactions': int(recent_tx[i]),
+        'transaction_count': int(total_tx[i])
+    } for i in top]
+
+def _item_summaries(*criteria):
+    """Datos básicos de los items como dicts: se guardan en snapshots y caché, sin objetos del ORM"""
+    rows = db.session.query(
+        Item.id, Item.name, Item.category, Item.stock, Item.rentable
+    ).filter(*criteria).order_by(Item.id)
+    return [dict(row._mapping) for row in rows]
+
+def _category_summary():
+    """Items y stock por categoría"""
+    rows = db.session.query(
+        Item.category,
+        func.count(Item.id).label('count'),
+        func.sum(Item.stock).label('total_stock')
+    ).group_by(Item.category).all()
+    return [dict(row._mapping) for row in rows]
+
+def _low_stock_items():
+    """Items con stock bajo para el dashboard"""
+    return _item_summaries(Item.stock <= (2 if Item.rentable else 10))
+
 def get_analytics_data():
     """Obtiene datos completos para analytics/dashboard"""
     from models import db
@@ -290,28 +397,26 @@ def get_analytics_data():
     ).count()
     
     # Por categoría
-    categories = db.session.query(
-        Item.category,
-        func.count(Item.id).label('count'),
-        func.sum(Item.stock).label('total_stock')
-    ).group_by(Item.category).all()
+    categories = _category_summary()
     
-    # Transacciones últimos 30 días
+    # Transacciones últimos 30 días (agregado diario: días × tipos, no filas de transaction)
     daily_transactions = db.session.query(
-        func.date(Transaction.timestamp).label('date'),
-        func.count(Transaction.id).label('count'),
-        Transaction.kind
-    ).filter(Transaction.timestamp >= thirty_days_ago).group_by(
-        func.date(Transaction.timestamp),
-        Transaction.kind
+        TransactionDailyRollup.day.label('date'),
+        func.sum(TransactionDailyRollup.count).label('count'),
+        TransactionDailyRollup.kind
+    ).filter(TransactionDailyRollup.day >= thirty_days_ago).group_by(
+        TransactionDailyRollup.day,
+        TransactionDailyRollup.kind
     ).all()
+    daily_transactions = [(row.date, int(row.count), row.kind) for row in daily_transactions]
     
     # Productos populares
     popular = db.session.query(
         Item.name,
-        func.count(Transaction.id).label('count')
-    ).join(Transaction).group_by(Item.id).order_by(
-        func.count(Transaction.id).desc()
+        func.sum(TransactionDailyRollup.count).label('count')
+    ).join(TransactionDailyRollup, TransactionDailyRollup.item_id == Item.id).group_by(Item.id).order_by(
+        func.sum(TransactionDailyRollup.count).desc(),
+        Item.id
     ).limit(5).all()
     
     popular_items = [{'name': r[0], 'transaction_count': int(r[1] or 0)} for r in popular]
@@ -322,36 +427,10 @@ def get_analytics_data():
     ).filter(Transaction.kind == 'rent').scalar() or 0
     
     # Stock bajo
-    low_stock = Item.query.filter(
-        Item.stock <= (2 if Item.rentable else 10)
-    ).all()
+    low_stock = _low_stock_items()
     
     # Recomendaciones de reposición
-    reorder = []
-    for item in Item.query.all():
-        if item.stock and item.stock <= (2 if item.rentable else 10):
-            total_tx = db.session.query(func.count(Transaction.id)).filter(
-                Transaction.item_id == item.id
-            ).scalar() or 0
-            
-            recent_tx = db.session.query(func.count(Transaction.id)).filter(
-                Transaction.item_id == item.id,
-                Transaction.timestamp >= thirty_days_ago
-            ).scalar() or 0
-            
-            consumption = recent_tx / 30.0 if recent_tx > 0 else 0
-            min_stock = max(2 if item.rentable else 10, int(consumption * 7))
-            
-            score = (recent_tx * 40) + ((min_stock - item.stock) * 30) + (total_tx * 0.3)
-            
-            reorder.append({
-                'item': item,
-                'score': score,
-                'consumption_rate': round(consumption, 2),
-                'recommended_stock': min_stock
-            })
-    
-    top_reorder = sorted(reorder, key=lambda x: x['score'], reverse=True)[:3]
+    top_reorder = get_reorder_recommendations(limit=3)
     
     return {
         'general': {
@@ -369,154 +448,173 @@ def get_analytics_data():
         'seasonal_demand': calculate_seasonal_demand()
     }
 
+def _slow_suppliers_from_rows(rows):
+    """Riesgo por proveedor desde filas con la forma de analyze_slow_suppliers (orden de Supplier.id)"""
+    suppliers_analysis = []
+    
+    for supplier_id, name, contact, city, completed, delayed_orders, pending_orders, total_delay, on_time, items_supplied in rows:
+        if not completed and not pending_orders:
+            continue  # Sin historial
+        
+        # Promedio de días de retraso (solo retrasos positivos) y tasa de puntualidad
+        avg_delay_days = (total_delay or 0) / completed if completed else 0
+        punctuality_rate = (on_time / completed * 100) if completed else 100
+        
+        # Clasificar riesgo
+        if avg_delay_days > 5 or punctuality_rate < 60:
+            risk_level = "🔴 ALTO"
+        elif avg_delay_days > 2 or punctuality_rate < 80:
+            risk_level = "🟡 MEDIO"
+        else:
+            risk_level = "🟢 BAJO"
+        
+        suppliers_analysis.append({
+            'supplier_id': supplier_id,
+            'name': name,
+            'contact': contact,
+            'city': city,
+            'total_orders': completed + delayed_orders + pending_orders,
+            'completed_orders': completed,
+            'delayed_orders': delayed_orders,
+            'pending_orders': pending_orders,
+            'avg_delay_days': round(avg_delay_days, 1),
+            'punctuality_rate': round(punctuality_rate, 1),
+            'risk_level': risk_level,
+            'items_supplied': items_supplied
+        })
+    
+    return sorted(suppliers_analysis, key=lambda x: x['avg_delay_days'], reverse=True)
+
 def analyze_slow_suppliers():
     """Identifica proveedores lentos (entregas atrasadas)"""
     try:
         from models import Supplier, PurchaseOrder
         
-        suppliers_analysis = []
-        
-        suppliers = Supplier.query.all()
-        
-        for supplier in suppliers:
-            # Órdenes completadas
-            completed_orders = PurchaseOrder.query.filter(
-                PurchaseOrder.supplier_id == supplier.id,
-                PurchaseOrder.status == 'delivered'
-            ).all()
-            
-            # Órdenes retrasadas
-            delayed_orders = PurchaseOrder.query.filter(
-                PurchaseOrder.supplier_id == supplier.id,
-                PurchaseOrder.status == 'delayed'
-            ).count()
-            
-            # Órdenes pendientes
-            pending_orders = PurchaseOrder.query.filter(
-                PurchaseOrder.supplier_id == supplier.id,
-                PurchaseOrder.status == 'pending'
-            ).count()
-            
-            if not completed_orders and pending_orders == 0:
-                continue  # Sin historial
-            
-            # Calcular promedio de días de entrega
-            total_days = 0
-            for order in completed_orders:
-                if order.expected_delivery_date and order.actual_delivery_date:
-                    days = (order.actual_delivery_date - order.expected_delivery_date).days
-                    total_days += max(0, days)  # Solo contar retrasos
-            
-            avg_delay_days = total_days / len(completed_orders) if completed_orders else 0
-            
-            # Calcular tasa de puntualidad
-            on_time = sum(1 for o in completed_orders if not o.is_overdue())
-            punctuality_rate = (on_time / len(completed_orders) * 100) if completed_orders else 100
-            
-            # Clasificar riesgo
-            if avg_delay_days > 5 or punctuality_rate < 60:
-                risk_level = "🔴 ALTO"
-            elif avg_delay_days > 2 or punctuality_rate < 80:
-                risk_level = "🟡 MEDIO"
-            else:
-                risk_level = "🟢 BAJO"
-            
-            suppliers_analysis.append({
-                'supplier_id': supplier.id,
-                'name': supplier.name,
-                'contact': supplier.contact,
-                'city': supplier.city,
-                'total_orders': len(completed_orders) + delayed_orders + pending_orders,
-                'completed_orders': len(completed_orders),
-                'delayed_orders': delayed_orders,
-                'pending_orders': pending_orders,
-                'avg_delay_days': round(avg_delay_days, 1),
-                'punctuality_rate': round(punctuality_rate, 1),
-                'risk_level': risk_level,
-                'items_supplied': len(supplier.items)
-            })
-        
-        return sorted(suppliers_analysis, key=lambda x: x['avg_delay_days'], reverse=True)
+        delivered = PurchaseOrder.status == 'delivered'
+        has_dates = and_(PurchaseOrder.expected_delivery_date != None, PurchaseOrder.actual_delivery_date != None)
+        delay_days = _whole_days_between(PurchaseOrder.actual_delivery_date, PurchaseOrder.expected_delivery_date)
+        
+        # Métricas de órdenes agrupadas por proveedor
+        order_stats = db.session.query(
+            PurchaseOrder.supplier_id.label('supplier_id'),
+            func.sum(case((delivered, 1), else_=0)).label('completed'),
+            func.sum(case((PurchaseOrder.status == 'delayed', 1), else_=0)).label('delayed'),
+            func.sum(case((PurchaseOrder.status == 'pending', 1), else_=0)).label('pending'),
+            func.sum(case((and_(delivered, has_dates, delay_days > 0), delay_days), else_=0)).label('delay_days'),
+            func.sum(case(
+                (and_(delivered, has_dates, PurchaseOrder.actual_delivery_date > PurchaseOrder.expected_delivery_date), 0),
+                (delivered, 1),
+                else_=0
+            )).label('on_time')
+        ).group_by(PurchaseOrder.supplier_id).subquery()
+        
+        # Items por proveedor
+        item_counts = db.session.query(
+            Item.supplier_id.label('supplier_id'),
+            func.count(Item.id).label('item_count')
+        ).filter(Item.supplier_id != None).group_by(Item.supplier_id).subquery()
+        
+        rows = db.session.query(
+            Supplier.id,
+            Supplier.name,
+            Supplier.contact,
+            Supplier.city,
+            order_stats.c.completed,
+            order_stats.c.delayed,
+            order_stats.c.pending,
+            order_stats.c.delay_days,
+            order_stats.c.on_time,
+            func.coalesce(item_counts.c.item_count, 0)
+        ).join(
+            order_stats, order_stats.c.supplier_id == Supplier.id
+        ).outerjoin(
+            item_counts, item_counts.c.supplier_id == Supplier.id
+        ).order_by(Supplier.id).all()
+        
+        return _slow_suppliers_from_rows(rows)
     
     except Exception as e:
         logger.error(f"Error en analyze_slow_suppliers: {str(e)}")
         return []
 
+def _slow_rotation_from_rows(rows):
+    """Items lentos/moderados desde filas con la forma de analyze_slow_rotation (orden de Item.id)"""
+    slow_rotation_items = []
+    
+    for item_id, name, category, supplier_id, price, stock, supplier_name, recent_sales, historical_sales in rows:
+        # Calcular velocidad
+        daily_velocity = recent_sales / 30.0
+        historical_velocity = historical_sales / 84.0 if historical_sales > 0 else 0
+        
+        # Determinar si es lento
+        if daily_velocity < 0.5 and stock > 5:  # Menos de 1 cada 2 días
+            rotation_status = "🐢 LENTO"
+            priority = "ALTO"
+        elif daily_velocity < 1.0 and stock > 10:
+            rotation_status = "🚶 MODERADO"
+            priority = "MEDIO"
+        else:
+            rotation_status = "⚡ RÁPIDO"
+            priority = "BAJO"
+        
+        # Si tiene rotación histórica pero ahora es lenta
+        if historical_velocity > 1 and daily_velocity < 0.3:
+            trend = "📉 CAÍDA FUERTE"
+        elif daily_velocity > historical_velocity:
+            trend = "📈 MEJORANDO"
+        else:
+            trend = "➡️ ESTABLE"
+        
+        if rotation_status != "⚡ RÁPIDO":  # Solo reportar items lento/moderados
+            slow_rotation_items.append({
+                'item_id': item_id,
+                'name': name,
+                'category': category,
+                'supplier_id': supplier_id,
+                'supplier_name': supplier_name or 'Sin proveedor',
+                'price': price,
+                'stock': stock,
+                'recent_sales_30d': recent_sales,
+                'daily_velocity': round(daily_velocity, 2),
+                'historical_velocity': round(historical_velocity, 2),
+                'rotation_status': rotation_status,
+                'trend': trend,
+                'priority': priority
+            })
+    
+    return sorted(slow_rotation_items, key=lambda x: x['daily_velocity'])
+
 def analyze_slow_rotation():
     """Identifica productos con rotación lenta"""
     try:
         today = datetime.utcnow().date()
         thirty_days_ago = today - timedelta(days=30)
+        twelve_weeks_ago = today - timedelta(weeks=12)
         
-        slow_rotation_items = []
-        
-        items = Item.query.all()
-        
-        for item in items:
-            # Transacciones últimos 30 días
-            recent_sales = Transaction.query.filter(
-                Transaction.item_id == item.id,
-                Transaction.kind.in_(['buy', 'rent']),
-                Transaction.timestamp >= thirty_days_ago
-            ).count()
-            
-            # Transacciones últimas 12 semanas
-            twelve_weeks_ago = today - timedelta(weeks=12)
-            historical_sales = Transaction.query.filter(
-                Transaction.item_id == item.id,
-                Transaction.kind.in_(['buy', 'rent']),
-                Transaction.timestamp >= twelve_weeks_ago
-            ).count()
-            
-            # Calcular velocidad
-            daily_velocity = recent_sales / 30.0
-            historical_velocity = historical_sales / 84.0 if historical_sales > 0 else 0
-            
-            # Determinar si es lento
-            if daily_velocity < 0.5 and item.stock > 5:  # Menos de 1 cada 2 días
-                rotation_status = "🐢 LENTO"
-                priority = "ALTO"
-            elif daily_velocity < 1.0 and item.stock > 10:
-                rotation_status = "🚶 MODERADO"
-                priority = "MEDIO"
-            else:
-                rotation_status = "⚡ RÁPIDO"
-                priority = "BAJO"
-            
-            # Si tiene rotación histórica pero ahora es lenta
-            if historical_velocity > 1 and daily_velocity < 0.3:
-                trend = "📉 CAÍDA FUERTE"
-            elif daily_velocity > historical_velocity:
-                trend = "📈 MEJORANDO"
-            else:
-                trend = "➡️ ESTABLE"
-            
-            # Obtener nombre de proveedor de forma safe
-            supplier_name = 'Sin proveedor'
-            try:
-                if hasattr(item, 'supplier') and item.supplier:
-                    supplier_name = item.supplier.name
-            except:
-                supplier_name = 'Sin proveedor'
-            
-            if rotation_status != "⚡ RÁPIDO":  # Solo reportar items lento/moderados
-                slow_rotation_items.append({
-                    'item_id': item.id,
-                    'name': item.name,
-                    'category': item.category,
-                    'supplier_id': getattr(item, 'supplier_id', None),
-                    'supplier_name': supplier_name,
-                    'price': item.price,
-                    'stock': item.stock,
-                    'recent_sales_30d': recent_sales,
-                    'daily_velocity': round(daily_velocity, 2),
-                    'historical_velocity': round(historical_velocity, 2),
-                    'rotation_status': rotation_status,
-                    'trend': trend,
-                    'priority': priority
-                })
-        
-        return sorted(slow_rotation_items, key=lambda x: x['daily_velocity'])
+        # Una sola consulta: ventas 30 días y 12 semanas por item + nombre del proveedor
+        rows = db.session.query(
+            Item.id,
+            Item.name,
+            Item.category,
+            Item.supplier_id,
+            Item.price,
+            Item.stock,
+            Supplier.name,
+            func.coalesce(func.sum(case(
+                (TransactionDailyRollup.day >= thirty_days_ago, TransactionDailyRollup.count), else_=0
+            )), 0),
+            func.coalesce(func.sum(TransactionDailyRollup.count), 0)
+        ).outerjoin(
+            Supplier, Item.supplier_id == Supplier.id
+        ).outerjoin(
+            TransactionDailyRollup, and_(
+                TransactionDailyRollup.item_id == Item.id,
+                TransactionDailyRollup.kind.in_(['buy', 'rent']),
+                TransactionDailyRollup.day >= twelve_weeks_ago
+            )
+        ).group_by(Item.id, Supplier.id, Supplier.name).order_by(Item.id).all()
+        
+        return _slow_rotation_from_rows(rows)
     
     except Exception as e:
         logger.error(f"Error en analyze_slow_rotation: {str(e)}")
@@ -605,52 +703,63 @@ def analyze_supplier_comparison():
         logger.error(f"Error en analyze_supplier_comparison: {str(e)}")
         return {}
 
+def _supplier_intelligence_result(slow_suppliers, slow_rotation, supplier_comparison):
+    """Resultado del panel de proveedores con sus recomendaciones"""
+    # Generar recomendaciones
+    recommendations = []
+    
+    # Recomendaciones por proveedores lentos
+    for supplier in slow_suppliers:
+        if supplier['risk_level'] == "🔴 ALTO":
+            recommendations.append({
+                'type': 'Cambiar proveedor',
+                'target': supplier['name'],
+                'reason': f"Retraso promedio: {supplier['avg_delay_days']} días",
+                'action': f"Buscar alternativa. Afecta {supplier['items_supplied']} productos.",
+                'severity': 'CRÍTICO'
+            })
+        elif supplier['risk_level'] == "🟡 MEDIO":
+            recommendations.append({
+                'type': 'Negociar SLA',
+                'target': supplier['name'],
+                'reason': f"Puntualidad: {supplier['punctuality_rate']}%",
+                'action': 'Establecer acuerdos de nivel de servicio más estrictos',
+                'severity': 'ALTO'
+            })
+    
+    # Recomendaciones por rotación lenta
+    for item in slow_rotation[:5]:  # Top 5 productos lentos
+        recommendations.append({
+            'type': 'Revisar proveedores',
+            'target': item['name'],
+            'reason': f"Rotación lenta ({item['daily_velocity']} items/día)",
+            'action': f"Comparar precio/disponibilidad con {item['supplier_name']}",
+            'severity': 'MEDIO'
+        })
+    
+    return {
+        'slow_suppliers': slow_suppliers,
+        'slow_rotation': slow_rotation,
+        'supplier_comparison': supplier_comparison,
+        'recommendations': recommendations,
+        'last_updated': datetime.utcnow().strftime('%d/%m/%Y %H:%M')
+    }
+
 def get_supplier_intelligence():
     """Orquesta análisis completo de proveedores"""
     try:
-        slow_suppliers = analyze_slow_suppliers()
-        slow_rotation = analyze_slow_rotation()
-        supplier_comparison = analyze_supplier_comparison()
-        
-        # Generar recomendaciones
-        recommendations = []
-        
-        # Recomendaciones por proveedores lentos
-        for supplier in slow_suppliers:
-            if supplier['risk_level'] == "🔴 ALTO":
-                recommendations.append({
-                    'type': 'Cambiar proveedor',
-                    'target': supplier['name'],
-                    'reason': f"Retraso promedio: {supplier['avg_delay_days']} días",
-                    'action': f"Buscar alternativa. Afecta {supplier['items_supplied']} productos.",
-                    'severity': 'CRÍTICO'
-                })
-            elif supplier['risk_level'] == "🟡 MEDIO":
-                recommendations.append({
-                    'type': 'Negociar SLA',
-                    'target': supplier['name'],
-                    'reason': f"Puntualidad: {supplier['punctuality_rate']}%",
-                    'action': 'Establecer acuerdos de nivel de servicio más estrictos',
-                    'severity': 'ALTO'
-                })
-        
-        # Recomendaciones por rotación lenta
-        for item in slow_rotation[:5]:  # Top 5 productos lentos
-            recommendations.append({
-                'type': 'Revisar proveedores',
-                'target': item['name'],
-                'reason': f"Rotación lenta ({item['daily_velocity']} items/día)",
-                'action': f"Comparar precio/disponibilidad con {item['supplier_name']}",
-                'severity': 'MEDIO'
-            })
-        
-        return {
-            'slow_suppliers': slow_suppliers,
-            'slow_rotation': slow_rotation,
-            'supplier_comparison': supplier_comparison,
-            'recommendations': recommendations,
-            'last_updated': datetime.utcnow().strftime('%d/%m/%Y %H:%M')
-        }
+        results, failed = run_parallel({
+            'slow_suppliers': (analyze_slow_suppliers, []),
+            'slow_rotation': (analyze_slow_rotation, []),
+            'supplier_comparison': (analyze_supplier_comparison, {}),
+        })
+        
+        result = _supplier_intelligence_result(
+            results['slow_suppliers'], results['slow_rotation'], results['supplier_comparison']
+        )
+        if failed:
+            result['partial'] = failed
+        return result
     
     except Exception as e:
         logger.error(f"Error en get_supplier_intelligence: {str(e)}")
@@ -0,0 +1,343 @@
+"""Detección de anomalías de login en streaming: ventanas deslizantes por IP y usuario, y top de infractores"""
+from collections import OrderedDict, deque
+from datetime import datetime
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ('ip', 'username')
+MAX_TARGETS = 50  # usuarios distintos guardados por IP (e IPs por usuario): "50+" basta como señal
+SKETCH_EPOCHS = 4  # la ventana se cubre con 4 sketches rotativos
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class SlidingWindow:
+    """Intentos y fallidos en una ventana deslizante: solo los buckets no vacíos, en orden"""
+    __slots__ = ('buckets', 'attempts', 'failures')
+
+    def __init__(self):
+        self.buckets = deque()  # [bucket_id, intentos, fallidos]
+        self.attempts = 0
+        self.failures = 0
+
+    def add(self, bucket_id, failed):
+        if self.buckets and self.buckets[-1][0] == bucket_id:
+            bucket = self.buckets[-1]
+        else:
+            bucket = [bucket_id, 0, 0]
+            self.buckets.append(bucket)
+        bucket[1] += 1
+        self.attempts += 1
+        if failed:
+            bucket[2] += 1
+            self.failures += 1
+
+    def expire(self, oldest_bucket):
+        """Descarta los buckets anteriores a `oldest_bucket` (O(1) amortizado). True si descartó alguno"""
+        expired = False
+        while self.buckets and self.buckets[0][0] < oldest_bucket:
+            _, attempts, failures = self.buckets.popleft()
+            self.attempts -= attempts
+            self.failures -= failures
+            expired = True
+        return expired
+
+
+class KeyStats:
+    """Contadores de una IP o un usuario"""
+    __slots__ = ('window', 'targets', 'last_seen')
+
+    def __init__(self):
+        self.window = SlidingWindow()
+        self.targets = {}  # usuario probado desde la IP / IP que probó el usuario -> último bucket
+        self.last_seen = None
+
+    def add_target(self, target, bucket_id):
+        if target in self.targets or len(self.targets) < MAX_TARGETS:
+            self.targets[target] = bucket_id
+
+    def expire(self, oldest_bucket):
+        """Ventana y destinos: un destino sale cuando su último intento sale de la ventana"""
+        if self.window.expire(oldest_bucket) and self.targets:
+            # A lo sumo MAX_TARGETS, y solo cuando la ventana avanza un bucket
+            self.targets = {target: bucket for target, bucket in self.targets.items() if bucket >= oldest_bucket}
+
+
+class SpaceSaving:
+    """
+    Heavy hitters de Metwally et al.: con k contadores, toda clave con más de
+    N/k apariciones está en el resumen y su cuenta se sobreestima como mucho
+    en `errors[clave]`. Reemplazar la mínima es O(k), con k pequeño.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.counts = {}
+        self.errors = {}
+
+    def add(self, key, n=1):
+        if key in self.counts:
+            self.counts[key] += n
+        elif len(self.counts) < self.k:
+            self.counts[key] = n
+            self.errors[key] = 0
+        else:
+            victim = min(self.counts, key=self.counts.get)
+            floor = self.counts.pop(victim)
+            del self.errors[victim]
+            self.counts[key] = floor + n
+            self.errors[key] = floor
+
+
+class AnomalyDetector:
+    """
+    Intentos de login por IP y por usuario en una ventana deslizante
+    (ANOMALY_WINDOW_SECONDS, buckets de ANOMALY_BUCKET_SECONDS), alimentada por
+    las rutas de login sin tocar la BD.
+
+    - Contadores exactos por clave en un OrderedDict acotado
+      (ANOMALY_MAX_KEYS por dimensión) con desalojo LRU: una avalancha de IPs
+      nuevas no hace crecer la memoria.
+    - Sketch Space-Saving de ANOMALY_TOP_K fallidos por dimensión (rotado en
+      SKETCH_EPOCHS épocas) para el top de infractores, aunque sus contadores
+      exactos se hayan desalojado.
+
+    Cada worker publica su top en instance/anomaly/<pid>.json cada
+    ANOMALY_PUBLISH_SECONDS; summary() suma el estado propio y el de los demás
+    workers vivos: O(k) por worker, sin consultar la BD.
+    """
+
+    def __init__(self, app=None):
+        self.window = 86400
+        self.bucket = 900
+        self.max_keys = 10000
+        self.top_k = 64
+        self.threshold = 5
+        self.publish_interval = 5
+        self.state_dir = None
+        self._keys = {dimension: OrderedDict() for dimension in DIMENSIONS}
+        self._sketches = {dimension: deque(maxlen=SKETCH_EPOCHS + 1) for dimension in DIMENSIONS}
+        self._lock = threading.Lock()
+        self._publisher = None
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Lee la configuración, ubica el directorio compartido y arranca el hilo de publicación"""
+        self.window = app.config.get('ANOMALY_WINDOW_SECONDS', self.window)
+        self.bucket = app.config.get('ANOMALY_BUCKET_SECONDS', self.bucket)
+        self.max_keys = app.config.get('ANOMALY_MAX_KEYS', self.max_keys)
+        self.top_k = app.config.get('ANOMALY_TOP_K', self.top_k)
+        self.threshold = app.config.get('ANOMALY_FAILURE_THRESHOLD', self.threshold)
+        self.publish_interval = app.config.get('ANOMALY_PUBLISH_SECONDS', self.publish_interval)
+        self.state_dir = app.config.get('ANOMALY_STATE_DIR') or os.path.join(app.instance_path, 'anomaly')
+        os.makedirs(self.state_dir, exist_ok=True)
+        app.extensions['anomaly_detector'] = self
+
+        if self._publisher is None and self.publish_interval > 0:
+            self._publisher = threading.Thread(target=self._publish_loop, name='anomaly-publish', daemon=True)
+            self._publisher.start()
+            atexit.register(self.shutdown)
+
+    # ============ Entrada ============
+
+    def _epoch(self, now):
+        return int(now // max(1, self.window // SKETCH_EPOCHS))
+
+    def _touch(self, dimension, key, other, success, bucket_id, oldest, stamp):
+        entries = self._keys[dimension]
+        stats = entries.get(key)
+        if stats is None:
+            if len(entries) >= self.max_keys:
+                entries.popitem(last=False)  # la menos reciente
+            stats = entries[key] = KeyStats()
+        else:
+            entries.move_to_end(key)
+            stats.expire(oldest)
+        stats.window.add(bucket_id, not success)
+        if other:
+            stats.add_target(other, bucket_id)
+        stats.last_seen = stamp
+
+    def observe(self, username, ip_address, success, now=None):
+        """Registra un intento de login (O(1); O(k) si el sketch desaloja una clave)"""
+        now = now or time.time()
+        bucket_id = int(now // self.bucket)
+        oldest = self._oldest_bucket(now)
+        epoch = self._epoch(now)
+        with self._lock:
+            self._touch('ip', ip_address, username, success, bucket_id, oldest, now)
+            self._touch('username', username, ip_address, success, bucket_id, oldest, now)
+            if success:
+                return
+            for dimension, key in (('ip', ip_address), ('username', username)):
+                sketches = self._sketches[dimension]
+                if not sketches or sketches[-1][0] != epoch:
+                    sketches.append((epoch, SpaceSaving(self.top_k)))
+                sketches[-1][1].add(key)
+
+    # ============ Lectura ============
+
+    def _oldest_bucket(self, now):
+        return int((now - self.window) // self.bucket) + 1
+
+    def stats(self, dimension, key, now=None):
+        """Contadores exactos de una clave en la ventana, o None si no está (o se desalojó)"""
+        now = now or time.time()
+        with self._lock:
+            stats = self._keys[dimension].get(key)
+            if stats is None:
+                return None
+            entry = self._entry(key, stats, self._oldest_bucket(now))
+        entry['last_seen'] = datetime.utcfromtimestamp(entry['last_seen']).isoformat()
+        return entry
+
+    @staticmethod
+    def _entry(key, stats, oldest):
+        stats.expire(oldest)
+        return {
+            'key': key,
+            'failures': stats.window.failures,
+            'attempts': stats.window.attempts,
+            'targets': len(stats.targets),
+            'last_seen': stats.last_seen,
+            'estimated': False,
+        }
+
+    def _local_top(self, dimension, now):
+        """Top k local: candidatos del sketch, con su cuenta exacta si siguen en el LRU"""
+        first_epoch = self._epoch(now - self.window)
+        candidates = {}
+        for epoch, sketch in self._sketches[dimension]:
+            if epoch < first_epoch:
+                continue
+            for key, count in sketch.counts.items():
+                candidates[key] = candidates.get(key, 0) + count
+
+        oldest = self._oldest_bucket(now)
+        entries = self._keys[dimension]
+        top = []
+        for key, estimate in sorted(candidates.items(), key=lambda item: -item[1])[:self.top_k]:
+            stats = entries.get(key)
+            if stats is not None:
+                entry = self._entry(key, stats, oldest)
+            else:
+                entry = {'key': key, 'failures': estimate, 'attempts': estimate, 'targets': 0,
+                         'last_seen': None, 'estimated': True}
+            if entry['failures']:
+                top.append(entry)
+        return top
+
+    def snapshot(self, now=None):
+        """Top local de cada dimensión (lo que publica este worker)"""
+        now = now or time.time()
+        with self._lock:
+            return {dimension: self._local_top(dimension, now) for dimension in DIMENSIONS}
+
+    def _peer_snapshots(self):
+        """Snapshots publicados por los demás workers vivos"""
+        snapshots = []
+        if not self.state_dir:
+            return snapshots
+        for path in glob.glob(os.path.join(self.state_dir, '*.json')):
+            try:
+                pid = int(os.path.basename(path)[:-5])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            if not _pid_alive(pid):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path, encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # a medio escribir o recién borrado
+        return snapshots
+
+    def summary(self, limit=10, now=None):
+        """
+        Top de IPs y usuarios con más intentos fallidos en la ventana, sumando
+        todos los workers. `suspicious` marca a los que llegan a
+        ANOMALY_FAILURE_THRESHOLD.
+        """
+        now = now or time.time()
+        snapshots = [self.snapshot(now)] + self._peer_snapshots()
+        result = {
+            'window_seconds': self.window,
+            'threshold': self.threshold,
+            'max_targets': MAX_TARGETS,
+            'workers': len(snapshots),
+            'generated_at': datetime.utcfromtimestamp(now).isoformat(),
+        }
+        for dimension in DIMENSIONS:
+            merged = {}
+            for snapshot in snapshots:
+                for entry in snapshot.get(dimension, []):
+                    current = merged.get(entry['key'])
+                    if current is None:
+                        merged[entry['key']] = dict(entry)
+                        continue
+                    current['failures'] += entry['failures']
+                    current['attempts'] += entry['attempts']
+                    current['targets'] = max(current['targets'], entry['targets'])
+                    current['last_seen'] = max(filter(None, (current['last_seen'], entry['last_seen'])), default=None)
+                    current['estimated'] = current['estimated'] or entry['estimated']
+            top = sorted(merged.values(), key=lambda e: (-e['failures'], e['key']))[:limit]
+            for entry in top:
+                entry['suspicious'] = entry['failures'] >= self.threshold
+                if entry['last_seen']:
+                    entry['last_seen'] = datetime.utcfromtimestamp(entry['last_seen']).isoformat()
+            result[f'{dimension}s'] = top
+        return result
+
+    # ============ Publicación entre workers ============
+
+    def publish(self):
+        """Escribe el top de este worker en instance/anomaly/<pid>.json (rename atómico)"""
+        if not self.state_dir:
+            return
+        path = os.path.join(self.state_dir, f'{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Could not publish anomaly snapshot: {e}")
+
+    def shutdown(self):
+        """Detiene el hilo y retira el snapshot de este worker"""
+        self._stop.set()
+        if self.state_dir:
+            try:
+                os.remove(os.path.join(self.state_dir, f'{os.getpid()}.json'))
+            except OSError:
+                pass
+
+    def _publish_loop(self):
+        while not self._stop.wait(self.publish_interval):
+            self.publish()
+
+
+anomaly_detector = AnomalyDetector()
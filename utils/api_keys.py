@@ -0,0 +1,277 @@
+"""Autenticación de API keys con caché en memoria, escritura diferida de last_used_at y tokens de acceso firmados"""
+from datetime import datetime, timedelta
+import atexit
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+
+import jwt
+from sqlalchemy import select
+from sqlalchemy.orm import make_transient_to_detached
+
+from models import db, User, ApiKey
+
+logger = logging.getLogger(__name__)
+
+_USER_COLUMNS = [c.key for c in User.__table__.columns]
+
+
+TOKEN_ALGORITHM = 'HS256'
+TOKEN_TYPE = 'api_access'
+
+
+class TokenError(Exception):
+    """Token de acceso inválido, vencido o de una key revocada"""
+
+
+def hash_key(api_key):
+    """Huella SHA-256 de una API key: la caché nunca guarda la key en claro"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+class CachedApiKey:
+    """Datos de una API key activa suficientes para autenticar un request sin ir a la BD"""
+    __slots__ = ('key_id', 'user_id', 'role', 'expires_at', 'user_columns', 'cached_until')
+
+    def __init__(self, key_obj, user, ttl):
+        self.key_id = key_obj.id
+        self.user_id = user.id
+        self.role = user.role
+        self.expires_at = key_obj.expires_at
+        self.user_columns = {key: getattr(user, key) for key in _USER_COLUMNS}
+        self.cached_until = time.monotonic() + ttl
+
+    def is_expired(self, now=None):
+        """True si la key ya venció (expires_at de ApiKey)"""
+        return bool(self.expires_at and self.expires_at < (now or datetime.utcnow()))
+
+
+class TokenUser:
+    """Dueño de un token de acceso, armado solo con los claims (g.api_user sin consultar la BD)"""
+    __slots__ = ('id', 'username', 'role', 'key_id')
+
+    def __init__(self, claims):
+        self.id = int(claims['sub'])
+        self.username = claims.get('name')
+        self.role = claims.get('role')
+        self.key_id = claims['kid']
+
+
+class ApiKeyAuthenticator:
+    """
+    Caché por huella de API key (API_KEY_CACHE_TTL) + buffer write-behind de last_used_at.
+
+    Un acierto de caché no toca la BD; last_used_at se acumula en memoria y se
+    escribe en un único UPDATE masivo cada API_KEY_FLUSH_SECONDS. Revocar una key
+    toca un archivo de marca en instance/: cada worker compara su mtime en cada
+    request (un stat, sin BD) y vacía su caché al verlo cambiar.
+
+    Una key también se puede canjear por un token de acceso firmado (JWT, vida
+    JWT_ACCESS_TOKEN_EXPIRES) que se verifica solo con CPU. Los ids de keys
+    revocadas forman la lista de denegación en memoria: se recarga en el hilo de
+    escritura diferida y en cuanto cambia el archivo de marca.
+    """
+
+    def __init__(self, app=None):
+        self.ttl = 60
+        self.flush_interval = 30
+        self.max_entries = 10000
+        self.stamp_path = None
+        self.token_secret = None
+        self.token_lifetime = timedelta(minutes=15)
+        self._stamp = None
+        self._revoked_ids = frozenset()
+        self._cache = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._app = None
+        self._flusher = None
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Lee la configuración, ubica el archivo de marca y arranca el hilo de escritura diferida"""
+        self._app = app
+        self.ttl = app.config.get('API_KEY_CACHE_TTL', self.ttl)
+        self.flush_interval = app.config.get('API_KEY_FLUSH_SECONDS', self.flush_interval)
+        self.max_entries = app.config.get('API_KEY_CACHE_MAX_ENTRIES', self.max_entries)
+        self.stamp_path = app.config.get('API_KEY_REVOKE_STAMP') or os.path.join(app.instance_path, 'api_keys.revoked')
+        os.makedirs(os.path.dirname(self.stamp_path), exist_ok=True)
+        # _stamp queda en None: si ya hubo revocaciones, el primer request carga la lista
+        self.token_secret = app.config.get('JWT_SECRET_KEY') or app.config['SECRET_KEY']
+        self.token_lifetime = app.config.get('JWT_ACCESS_TOKEN_EXPIRES', self.token_lifetime)
+        app.extensions['api_key_auth'] = self
+
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name='api-key-usage-flush', daemon=True)
+            self._flusher.start()
+            atexit.register(self.shutdown)
+
+    def _read_stamp(self):
+        try:
+            return os.stat(self.stamp_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _check_revocations(self):
+        # Otro worker revocó una key: se descarta toda la caché de este proceso
+        # y se recarga la lista de denegación de tokens
+        stamp = self._read_stamp()
+        if stamp != self._stamp:
+            with self._lock:
+                self._cache.clear()
+                self._stamp = stamp
+            self.reload_revoked()
+
+    def reload_revoked(self):
+        """Recarga los ids de keys revocadas (una columna entera: la lista cabe en memoria)"""
+        try:
+            revoked = frozenset(db.session.execute(
+                select(ApiKey.id).where(ApiKey.is_active == False)
+            ).scalars())
+        except Exception as e:
+            logger.error(f"Could not reload revoked API keys: {e}")
+            return
+        self._revoked_ids = revoked
+
+    def authenticate(self, api_key):
+        """Devuelve la CachedApiKey vigente de `api_key` o None (inexistente, revocada o vencida)"""
+        digest = hash_key(api_key)
+        now = time.monotonic()
+        if self.stamp_path:
+            self._check_revocations()
+        with self._lock:
+            entry = self._cache.get(digest)
+        if entry is None or entry.cached_until <= now:
+            # Una sola consulta: key activa + usuario
+            row = db.session.query(ApiKey, User).join(
+                User, ApiKey.user_id == User.id
+            ).filter(
+                ApiKey.key == api_key,
+                ApiKey.is_active == True
+            ).first()
+
+            if not row:
+                self.invalidate(digest)
+                return None
+
+            entry = CachedApiKey(row[0], row[1], self.ttl)
+            with self._lock:
+                if len(self._cache) >= self.max_entries:
+                    self._cache = {k: v for k, v in self._cache.items() if v.cached_until > now}
+                self._cache[digest] = entry
+
+        if entry.is_expired():
+            self.invalidate(digest)
+            return None
+
+        with self._lock:
+            self._pending[entry.key_id] = datetime.utcnow()
+        return entry
+
+    def issue_token(self, entry):
+        """Token de acceso firmado para una key ya autenticada: (token, segundos de vida)"""
+        now = datetime.utcnow()
+        expires_at = now + self.token_lifetime
+        if entry.expires_at and entry.expires_at < expires_at:
+            expires_at = entry.expires_at  # nunca sobrevive a la key
+        claims = {
+            'typ': TOKEN_TYPE,
+            'sub': str(entry.user_id),
+            'kid': entry.key_id,
+            'role': entry.role,
+            'name': entry.user_columns.get('username'),
+            'jti': uuid.uuid4().hex,
+            'iat': now,
+            'exp': expires_at,
+        }
+        token = jwt.encode(claims, self.token_secret, algorithm=TOKEN_ALGORITHM)
+        return token, max(0, int((expires_at - now).total_seconds()))
+
+    def verify_token(self, token):
+        """Claims de un token de acceso válido; TokenError si no lo es. Sin consultas a la BD"""
+        try:
+            claims = jwt.decode(token, self.token_secret, algorithms=[TOKEN_ALGORITHM],
+                                options={'require': ['exp', 'sub', 'kid']})
+        except jwt.ExpiredSignatureError:
+            raise TokenError('Token expired')
+        except jwt.InvalidTokenError:
+            raise TokenError('Invalid token')
+        if claims.get('typ') != TOKEN_TYPE:
+            raise TokenError('Invalid token')
+        if self.stamp_path:
+            self._check_revocations()
+        if claims['kid'] in self._revoked_ids:
+            raise TokenError('API key revoked')
+        return claims
+
+    def get_user(self, entry):
+        """Usuario dueño de la key ligado a db.session, sin consultar la BD"""
+        user = User(**entry.user_columns)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def invalidate(self, digest=None):
+        """Saca una huella de la caché; sin argumento vacía la caché de este proceso"""
+        with self._lock:
+            if digest is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(digest, None)
+
+    def revoke(self, key_obj):
+        """Desactiva la key (con commit) y la invalida de inmediato en todos los workers del host"""
+        key_obj.is_active = False
+        db.session.commit()
+        # Después del commit: un worker que recargue al ver la marca ya lee la key inactiva
+        self.invalidate(hash_key(key_obj.key))
+        self._revoked_ids = self._revoked_ids | {key_obj.id}
+        with self._lock:
+            self._pending.pop(key_obj.id, None)
+        if self.stamp_path:
+            try:
+                with open(self.stamp_path, 'a'):
+                    os.utime(self.stamp_path)
+                self._stamp = self._read_stamp()
+            except OSError as e:
+                logger.error(f"Could not touch API key revocation stamp: {e}")
+
+    def flush(self):
+        """Escribe los last_used_at pendientes en un solo UPDATE masivo"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not pending or self._app is None:
+            return 0
+
+        with self._app.app_context():
+            try:
+                db.session.bulk_update_mappings(ApiKey, [
+                    {'id': key_id, 'last_used_at': last_used_at}
+                    for key_id, last_used_at in pending.items()
+                ])
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error flushing API key usage: {e}")
+                return 0
+        return len(pending)
+
+    def shutdown(self):
+        """Detiene el hilo y escribe lo pendiente"""
+        self._stop.set()
+        self.flush()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+            with self._app.app_context():
+                self.reload_revoked()
+                db.session.remove()
+
+
+api_key_auth = ApiKeyAuthenticator()
@@ -0,0 +1,261 @@
+"""Registro de intentos de login en lote: cola en memoria, INSERT multi-fila y spool en disco"""
+from datetime import datetime
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import insert
+
+from models import db, LoginAttempt
+
+logger = logging.getLogger(__name__)
+
+# Filas por INSERT ... VALUES (...), (...): 6 columnas x 150 < 999 parámetros (SQLite antiguo)
+INSERT_ROWS = 150
+SPOOL_PREFIX = 'login_attempts.'
+RECOVER_SECONDS = 60  # cada cuánto se buscan spools de workers caídos
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def _to_line(record):
+    return json.dumps(dict(record, timestamp=record['timestamp'].isoformat())) + '\n'
+
+
+def _from_line(line):
+    record = json.loads(line)
+    record['timestamp'] = datetime.fromisoformat(record['timestamp'])
+    return record
+
+
+class LoginAuditWriter:
+    """
+    Cola en memoria de LoginAttempt escrita con un INSERT multi-fila cada
+    LOGIN_AUDIT_FLUSH_MS milisegundos o al juntar LOGIN_AUDIT_BATCH_SIZE
+    intentos, en vez de un commit por intento.
+
+    Cada intento se agrega también a un spool por proceso en instance/audit
+    (una línea JSON, sin fsync): si el worker muere antes del flush, otro
+    proceso encuentra el spool de un pid que ya no existe y lo inserta. Es
+    best-effort: sobrevive a la caída del proceso, no a la del sistema.
+
+    Los límites de login no leen esta tabla (ver utils/ratelimit.py), así que
+    el retraso del flush no los afecta. Con LOGIN_AUDIT_FLUSH_MS = 0 se escribe
+    en el momento, como antes.
+    """
+
+    def __init__(self, app=None):
+        self.flush_interval = 0.5
+        self.batch_size = 500
+        self.max_pending = 50000
+        self.spool_dir = None
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._spool = None
+        self._spool_pid = None
+        self._app = None
+        self._flusher = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Lee la configuración, ubica el spool y arranca el hilo de escritura"""
+        self._app = app
+        self.flush_interval = app.config.get('LOGIN_AUDIT_FLUSH_MS', 500) / 1000
+        self.batch_size = app.config.get('LOGIN_AUDIT_BATCH_SIZE', self.batch_size)
+        self.max_pending = app.config.get('LOGIN_AUDIT_MAX_PENDING', self.max_pending)
+        self.spool_dir = app.config.get('LOGIN_AUDIT_SPOOL_DIR') or os.path.join(app.instance_path, 'audit')
+        os.makedirs(self.spool_dir, exist_ok=True)
+        app.extensions['login_audit'] = self
+
+        if self._flusher is None and self.flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name='login-audit-flush', daemon=True)
+            self._flusher.start()
+            atexit.register(self.shutdown)
+
+    @property
+    def enabled(self):
+        return self._app is not None and self.flush_interval > 0
+
+    # ============ Spool ============
+
+    def _spool_path(self, pid=None):
+        return os.path.join(self.spool_dir, f'{SPOOL_PREFIX}{pid or os.getpid()}.jsonl')
+
+    def _open_spool(self):
+        # Con el lock tomado. Un spool propio con contenido es de un proceso
+        # anterior con el mismo pid: sus intentos pasan a la cola
+        if self._spool is not None and self._spool_pid == os.getpid():
+            return self._spool
+        path = self._spool_path()
+        if os.path.exists(path):
+            self._pending.extend(self._read_spool(path))
+        self._spool = open(path, 'a', encoding='utf-8')
+        self._spool_pid = os.getpid()
+        return self._spool
+
+    @staticmethod
+    def _read_spool(path):
+        records = []
+        try:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(_from_line(line))
+                    except (ValueError, KeyError):
+                        continue  # línea cortada por la caída
+        except OSError as e:
+            logger.error(f"Could not read login audit spool {path}: {e}")
+        return records
+
+    def _rewrite_spool(self):
+        # Con el lock tomado: el spool queda con lo que sigue en cola
+        try:
+            spool = self._open_spool()
+            spool.seek(0)
+            spool.truncate()
+            spool.writelines(_to_line(record) for record in self._pending)
+            spool.flush()
+        except OSError as e:
+            logger.error(f"Could not rewrite login audit spool: {e}")
+
+    # ============ Registro ============
+
+    def record(self, username, ip_address, success, user_agent=None, user_id=None):
+        """Encola un intento de login (sin tocar la BD)"""
+        if not self.enabled:
+            LoginAttempt.log_attempt(username, ip_address, success, user_agent, user_id)
+            return
+
+        record = {
+            'username': username,
+            'ip_address': ip_address,
+            'success': bool(success),
+            'timestamp': datetime.utcnow(),
+            'user_agent': user_agent,
+            'user_id': user_id,
+        }
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                # BD caída mucho tiempo: se descarta lo más viejo de memoria (sigue en el spool)
+                self._pending.pop(0)
+                logger.error("Login audit queue full, dropping oldest attempt from memory")
+            self._pending.append(record)
+            try:
+                spool = self._open_spool()
+                spool.write(_to_line(record))
+                spool.flush()
+            except OSError as e:
+                logger.error(f"Could not spool login attempt: {e}")
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    # ============ Escritura ============
+
+    @staticmethod
+    def _insert(records):
+        """INSERT multi-fila por bloques de INSERT_ROWS y un solo commit"""
+        for i in range(0, len(records), INSERT_ROWS):
+            db.session.execute(insert(LoginAttempt.__table__).values(records[i:i + INSERT_ROWS]))
+        db.session.commit()
+
+    def flush(self):
+        """Escribe la cola en la BD. Devuelve cuántos intentos escribió"""
+        if self._app is None:
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+
+            with self._app.app_context():
+                try:
+                    self._insert(batch)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Error flushing login attempts: {e}")
+                    with self._lock:
+                        self._pending = batch + self._pending  # siguen en el spool
+                    return 0
+                finally:
+                    db.session.remove()
+
+            with self._lock:
+                self._rewrite_spool()
+        return len(batch)
+
+    def recover(self):
+        """Inserta los spools de procesos que ya no existen. Devuelve cuántos intentos recuperó"""
+        if self._app is None or not self.spool_dir:
+            return 0
+        recovered = 0
+        for path in glob.glob(os.path.join(self.spool_dir, f'{SPOOL_PREFIX}*.jsonl*')):
+            # login_attempts.<pid>.jsonl o, ya reclamado, login_attempts.<pid>.jsonl.<reclamante>
+            parts = os.path.basename(path)[len(SPOOL_PREFIX):].split('.')
+            try:
+                origin = int(parts[0])
+                owner = int(parts[2]) if len(parts) == 3 else origin
+            except (ValueError, IndexError):
+                continue
+            if len(parts) == 3 and owner == os.getpid():
+                claimed = path  # un reintento propio que falló antes
+            elif owner == os.getpid() or _pid_alive(owner):
+                continue
+            else:
+                # El rename reclama el archivo: si otro proceso lo reclamó antes, falla
+                claimed = f'{self._spool_path(origin)}.{os.getpid()}'
+                try:
+                    os.rename(path, claimed)
+                except OSError:
+                    continue
+            records = self._read_spool(claimed)
+            with self._app.app_context():
+                try:
+                    if records:
+                        self._insert(records)
+                    os.remove(claimed)
+                    recovered += len(records)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Error recovering login audit spool {claimed}: {e}")
+                finally:
+                    db.session.remove()
+        if recovered:
+            logger.info(f"Recovered {recovered} login attempt(s) from crashed workers")
+        return recovered
+
+    def shutdown(self):
+        """Detiene el hilo y escribe lo pendiente"""
+        self._stop.set()
+        self._wake.set()
+        self.flush()
+
+    def _flush_loop(self):
+        last_recover = 0
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+            if time.monotonic() - last_recover >= RECOVER_SECONDS:
+                last_recover = time.monotonic()
+                self.recover()
+
+
+login_audit = LoginAuditWriter()
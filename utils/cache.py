@@ -0,0 +1,297 @@
+"""Caché de resultados de analytics compartida entre workers (archivo SQLite en instance/)"""
+from contextlib import contextmanager
+from itertools import chain
+import atexit
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+
+from sqlalchemy import event
+
+from models import db, Transaction, Item, PurchaseOrder
+
+logger = logging.getLogger(__name__)
+
+# Escrituras sobre estas tablas cambian la versión de datos e invalidan la caché
+WATCHED_MODELS = (Transaction, Item, PurchaseOrder)
+WATCHED_TABLES = frozenset(model.__tablename__ for model in WATCHED_MODELS)
+
+_DIRTY_FLAG = 'analytics_cache_dirty'
+
+
+class AnalyticsCache:
+    """
+    Resultados de analytics por nombre, válidos mientras no cambie la versión de
+    datos y no superen ANALYTICS_CACHE_TTL segundos.
+
+    Versión, entradas y contadores viven en un mismo archivo SQLite, así que todos
+    los workers de gunicorn los comparten. Cada commit que toca Transaction, Item
+    o PurchaseOrder incrementa la versión. Sin init_app, se calcula siempre.
+
+    Un acierto es solo una lectura: aciertos y fallos se cuentan en memoria y un
+    hilo los suma al archivo cada ANALYTICS_CACHE_STATS_FLUSH_SECONDS.
+    """
+
+    def __init__(self, app=None):
+        self.path = None
+        self.ttl = 300
+        self.lease_seconds = 60
+        self.poll_interval = 0.1
+        self.stats_flush_interval = 30
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._counts = {'hits': 0, 'misses': 0}
+        self._counts_lock = threading.Lock()
+        self._flusher = None
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Ubica el archivo (ANALYTICS_CACHE_PATH o instance/analytics_cache.db) y crea el esquema"""
+        self.path = app.config.get('ANALYTICS_CACHE_PATH') or os.path.join(app.instance_path, 'analytics_cache.db')
+        self.ttl = app.config.get('ANALYTICS_CACHE_TTL', self.ttl)
+        self.lease_seconds = app.config.get('ANALYTICS_CACHE_LEASE_SECONDS', self.lease_seconds)
+        self.stats_flush_interval = app.config.get('ANALYTICS_CACHE_STATS_FLUSH_SECONDS', self.stats_flush_interval)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entry ('
+                'name TEXT PRIMARY KEY, version INTEGER NOT NULL, created_at REAL NOT NULL, payload BLOB NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_lease ('
+                'name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            conn.executemany(
+                'INSERT OR IGNORE INTO cache_meta (key, value) VALUES (?, 0)',
+                [('data_version',), ('hits',), ('misses',)]
+            )
+        app.extensions['analytics_cache'] = self
+
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name='analytics-cache-stats', daemon=True)
+            self._flusher.start()
+            atexit.register(self.shutdown)
+
+    @contextmanager
+    def _connect(self):
+        # Una conexión por operación (autocommit): segura entre hilos y procesos
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        try:
+            conn.execute('PRAGMA synchronous=NORMAL')
+            yield conn
+        finally:
+            conn.close()
+
+    def get_or_compute(self, name, compute):
+        """Devuelve el resultado cacheado de `name` o lo calcula con compute() y lo guarda"""
+        if self.path is None:
+            return compute()
+
+        try:
+            found, value = self._lookup(name, count_miss=False)
+        except Exception as e:
+            logger.error(f"Analytics cache read error ({name}): {e}")
+            return compute()
+        if found:
+            return value
+
+        # Un solo cálculo por nombre: entre hilos del worker con un lock, entre
+        # workers con un lease en el archivo compartido; el resto espera el resultado
+        with self._lock_for(name):
+            owner = uuid.uuid4().hex
+            try:
+                deadline = time.monotonic() + self.lease_seconds
+                while not self._acquire_lease(name, owner):
+                    time.sleep(self.poll_interval)
+                    found, value = self._lookup(name, count_miss=False)
+                    if found:
+                        return value
+                    if time.monotonic() > deadline:
+                        owner = None  # el otro worker no termina: calcular sin lease
+                        break
+
+                found, value = self._lookup(name)
+                if found:
+                    return value
+                version = self.data_version()
+            except Exception as e:
+                logger.error(f"Analytics cache read error ({name}): {e}")
+                self._release_lease(name, owner)
+                return compute()
+
+            try:
+                # Se guarda con la versión leída ANTES de calcular: si hay escrituras
+                # mientras tanto, la entrada nace vieja y el siguiente acceso recalcula
+                value = compute()
+                if isinstance(value, dict) and (value.get('error') or value.get('partial')):
+                    return value  # las funciones de analytics reportan fallos así: no se cachean
+                try:
+                    self._store(name, version, value)
+                except Exception as e:
+                    logger.error(f"Analytics cache write error ({name}): {e}")
+                return value
+            finally:
+                self._release_lease(name, owner)
+
+    def _acquire_lease(self, name, owner):
+        """True si este worker queda a cargo de calcular `name` (un lease vencido se reemplaza)"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM cache_lease WHERE name = ? AND expires_at < ?', (name, now))
+                acquired = conn.execute(
+                    'INSERT OR IGNORE INTO cache_lease (name, owner, expires_at) VALUES (?, ?, ?)',
+                    (name, owner, now + self.lease_seconds)
+                ).rowcount == 1
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return acquired
+
+    def _release_lease(self, name, owner):
+        if owner is None:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute('DELETE FROM cache_lease WHERE name = ? AND owner = ?', (name, owner))
+        except Exception as e:
+            logger.error(f"Analytics cache lease release failed ({name}): {e}")
+
+    def _lookup(self, name, count_miss=True):
+        """(True, valor) si hay entrada vigente; cuenta en memoria el acierto (y el fallo si count_miss)"""
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT e.payload FROM cache_entry e '
+                'JOIN cache_meta m ON m.key = \'data_version\' '
+                'WHERE e.name = ? AND e.version = m.value AND e.created_at > ?',
+                (name, time.time() - self.ttl)
+            ).fetchone()
+
+            value = None
+            if row:
+                try:
+                    value = pickle.loads(row[0])
+                except Exception as e:
+                    logger.warning(f"Analytics cache entry {name} unreadable: {e}")
+                    row = None
+
+        if row or count_miss:
+            with self._counts_lock:
+                self._counts['hits' if row else 'misses'] += 1
+        return row is not None, value
+
+    def _store(self, name, version, value):
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO cache_entry (name, version, created_at, payload) VALUES (?, ?, ?, ?)',
+                (name, version, time.time(), payload)
+            )
+
+    def _lock_for(self, name):
+        with self._locks_guard:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def data_version(self):
+        """Versión actual de los datos (compartida entre workers)"""
+        with self._connect() as conn:
+            return conn.execute('SELECT value FROM cache_meta WHERE key = ?', ('data_version',)).fetchone()[0]
+
+    def bump(self):
+        """Incrementa la versión de datos: invalida todas las entradas"""
+        if self.path is None:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute('UPDATE cache_meta SET value = value + 1 WHERE key = ?', ('data_version',))
+        except Exception as e:
+            logger.error(f"Analytics cache version bump failed: {e}")
+
+    def flush_stats(self):
+        """Suma al archivo los aciertos y fallos contados en este proceso"""
+        with self._counts_lock:
+            counts = {key: value for key, value in self._counts.items() if value}
+            self._counts = dict.fromkeys(self._counts, 0)
+        if not counts or self.path is None:
+            return
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    'UPDATE cache_meta SET value = value + ? WHERE key = ?',
+                    [(value, key) for key, value in counts.items()]
+                )
+        except Exception as e:
+            logger.error(f"Analytics cache stats flush failed: {e}")
+
+    def shutdown(self):
+        """Detiene el hilo y escribe los contadores pendientes"""
+        self._stop.set()
+        self.flush_stats()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.stats_flush_interval):
+            self.flush_stats()
+
+    def stats(self):
+        """Aciertos, fallos (de todos los workers, hasta su último flush), tasa de acierto, versión y entradas vigentes"""
+        if self.path is None:
+            return {'enabled': False}
+        self.flush_stats()
+        with self._connect() as conn:
+            meta = dict(conn.execute('SELECT key, value FROM cache_meta').fetchall())
+            entries = conn.execute(
+                'SELECT COUNT(*) FROM cache_entry WHERE version = ? AND created_at > ?',
+                (meta.get('data_version', 0), time.time() - self.ttl)
+            ).fetchone()[0]
+        hits, misses = meta.get('hits', 0), meta.get('misses', 0)
+        return {
+            'enabled': True,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses) * 100, 1) if hits + misses else 0.0,
+            'data_version': meta.get('data_version', 0),
+            'fresh_entries': entries,
+            'ttl_seconds': self.ttl
+        }
+
+
+analytics_cache = AnalyticsCache()
+
+
+# ============ Invalidación: versión nueva tras cada commit que escribe datos observados ============
+
+@event.listens_for(db.session, 'after_flush')
+def _mark_dirty_on_flush(session, flush_context):
+    if any(isinstance(obj, WATCHED_MODELS) for obj in chain(session.new, session.dirty, session.deleted)):
+        session.info[_DIRTY_FLAG] = True
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _mark_dirty_on_bulk_dml(orm_execute_state):
+    # UPDATE/INSERT/DELETE masivos (p. ej. apply_nfc_batch) no pasan por el flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None and table.name in WATCHED_TABLES:
+            orm_execute_state.session.info[_DIRTY_FLAG] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _bump_after_commit(session):
+    if session.info.pop(_DIRTY_FLAG, False):
+        analytics_cache.bump()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _clear_after_rollback(session):
+    session.info.pop(_DIRTY_FLAG, None)
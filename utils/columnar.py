@@ -0,0 +1,616 @@
+"""
+Motor analítico columnar: Transaction, Item y PurchaseOrder cargados una vez en
+arreglos NumPy y analizados con operaciones vectorizadas.
+
+Da los mismos resultados que get_analytics_data, get_predictive_analytics y
+get_supplier_intelligence (comparte con ellas el formato final), sin una
+consulta por métrica. Tras la primera carga, refresh() solo lee lo nuevo.
+
+Con init_app, las columnas de Transaction viven en archivos bajo instance/columns
+(ColumnStore) que cada worker abre con mmap en lugar de copiarlas a su memoria.
+"""
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False  # Windows: sin lock entre procesos (servidor de desarrollo, un proceso)
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Integer, String, func, select, type_coerce
+
+from models import db, Transaction, Item, Supplier, PurchaseOrder
+from utils.cache import analytics_cache
+from utils.parallel import start_parallel
+from utils.analytics import (
+    _forecast_from_weekly, _trending_from_periods, _predictive_result, _seasonal_from_months,
+    _reorder_from_counts, _category_summary, _low_stock_items, _slow_suppliers_from_rows,
+    _slow_rotation_from_rows, _supplier_intelligence_result, analyze_supplier_comparison
+)
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = date(1970, 1, 1)
+NO_DAY = np.iinfo(np.int32).min  # transacción sin día: fuera de todo rango
+NO_DUE = np.iinfo(np.int32).max  # renta sin fecha de devolución: nunca vencida
+_NS_PER_DAY = 86_400 * 10**9
+
+# Columnas de Transaction que se guardan: ninguna cambia una vez insertada la fila
+TX_COLUMNS = {
+    'id': np.dtype('<i8'),
+    'item_id': np.dtype('<i4'),
+    'kind': np.dtype('i1'),  # índice en `kinds`; -1 sin tipo
+    'qty': np.dtype('<i4'),
+    'day': np.dtype('<i4'),
+    'month': np.dtype('i1'),
+    'rent_days': np.dtype('<f8'),  # NaN sin dato
+}
+
+
+def _day_number(value):
+    """Días desde 1970-01-01"""
+    return (value - _EPOCH).days
+
+
+def _day_numbers(values, missing):
+    """Fechas (texto ISO o date) como días desde 1970-01-01; `missing` para nulos"""
+    # Pocas fechas distintas (una por día): se convierten solo los valores únicos
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    parsed = pd.to_datetime(pd.Series(uniques, dtype=object), errors='coerce', format='ISO8601')
+    days = parsed.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]').astype(np.int64)
+    lookup = np.append(np.where(parsed.isna().to_numpy(), missing, days), missing)
+    return lookup[codes].astype(np.int32)
+
+
+def _python_values(series):
+    """Columna de pandas como lista de valores de Python (None para nulos)"""
+    return [None if value is pd.NA else value for value in series.astype(object).tolist()]
+
+
+class _Snapshot:
+    """Estado inmutable del motor: se reemplaza entero en cada refresh()"""
+    # open_rentals: día de vencimiento de cada renta sin devolver
+    __slots__ = ('tx', 'open_rentals', 'items', 'orders', 'suppliers', 'kinds', 'last_id', 'generation', '_masks')
+
+    def __init__(self, tx, open_rentals, items, orders, suppliers, kinds, last_id, generation=None):
+        self.tx = tx
+        self.open_rentals = open_rentals
+        self.items = items
+        self.orders = orders
+        self.suppliers = suppliers
+        self.kinds = kinds
+        self.last_id = last_id
+        self.generation = generation
+        self._masks = {}
+
+    def kind_mask(self, *names):
+        """Filas de los tipos dados (calculado una vez por estado)"""
+        if names not in self._masks:
+            mask = np.zeros(len(self.tx['kind']), dtype=bool)
+            for name in names:
+                if name in self.kinds:
+                    mask |= self.tx['kind'] == self.kinds.index(name)
+            self._masks[names] = mask
+        return self._masks[names]
+
+    def valid(self):
+        """Filas con día y tipo: las mismas que cuenta transaction_daily_rollup"""
+        if 'valid' not in self._masks:
+            self._masks['valid'] = (self.tx['day'] != NO_DAY) & (self.tx['kind'] >= 0)
+        return self._masks['valid']
+
+    def counts_by_item(self, mask, weights=None):
+        """Conteo (o suma de `weights`) por posición de item para las filas de `mask`"""
+        positions = self.tx['item_pos'][mask]
+        found = positions >= 0
+        if weights is not None:
+            weights = weights[mask][found]
+        return np.bincount(positions[found], weights=weights, minlength=len(self.items['id']))
+
+
+class ColumnStore:
+    """
+    Columnas de Transaction en archivos binarios de ancho fijo (una por columna),
+    abiertas con mmap: los workers comparten las páginas del SO en vez de tener
+    cada uno su copia.
+
+    Los archivos solo crecen: append() escribe las filas nuevas al final y recién
+    después publica el nuevo largo en meta.json (reemplazo atómico). Un lector
+    mapea solo las filas que declara meta.json, así que nunca ve una escritura a
+    medias. Ante borrados o una BD distinta se escribe una generación nueva en
+    otro directorio; quien ya tenía mapeada la anterior la sigue leyendo.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    @contextmanager
+    def locked(self):
+        """Lock exclusivo entre procesos para sincronizar con la BD"""
+        with open(os.path.join(self.path, '.lock'), 'a') as lock_file:
+            if HAS_FCNTL:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if HAS_FCNTL:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read_meta(self):
+        """meta.json vigente, o None si no existe o fue escrito con otras columnas"""
+        try:
+            with open(os.path.join(self.path, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Column store meta unreadable: {e}")
+            return None
+        if meta.get('columns') != {name: dtype.str for name, dtype in TX_COLUMNS.items()}:
+            return None
+        return meta
+
+    def write_generation(self, columns, kinds, database):
+        """Escribe todas las filas en una generación nueva y la publica"""
+        generation = f"gen-{uuid.uuid4().hex[:12]}"
+        os.makedirs(os.path.join(self.path, generation))
+        for name, dtype in TX_COLUMNS.items():
+            with open(self._column_path(generation, name), 'wb') as f:
+                f.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+                os.fsync(f.fileno())
+
+        meta = {
+            'generation': generation,
+            'database': database,
+            'rows': len(columns['id']),
+            'last_id': int(columns['id'][-1]) if len(columns['id']) else 0,
+            'kinds': kinds,
+            'columns': {name: dtype.str for name, dtype in TX_COLUMNS.items()},
+        }
+        self._publish(meta)
+
+        # Generaciones anteriores: en Windows no se pueden borrar mientras alguien las mapee
+        for entry in os.listdir(self.path):
+            if entry.startswith('gen-') and entry != generation:
+                shutil.rmtree(os.path.join(self.path, entry), ignore_errors=True)
+        return meta
+
+    def append(self, meta, columns, kinds):
+        """Agrega filas nuevas (ids mayores a meta['last_id']) y publica el nuevo largo"""
+        rows = meta['rows']
+        for name, dtype in TX_COLUMNS.items():
+            with open(self._column_path(meta['generation'], name), 'r+b') as f:
+                # Descarta lo que haya dejado un append interrumpido antes de publicar
+                f.truncate(rows * dtype.itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+                os.fsync(f.fileno())
+
+        meta = dict(meta, rows=rows + len(columns['id']), last_id=int(columns['id'][-1]), kinds=kinds)
+        self._publish(meta)
+        return meta
+
+    def open(self, meta):
+        """Columnas mapeadas (solo lectura) con las filas publicadas en `meta`"""
+        rows = meta['rows']
+        return {
+            # mmap no admite largo cero
+            name: np.memmap(self._column_path(meta['generation'], name), dtype=dtype, mode='r', shape=(rows,))
+            if rows else np.empty(0, dtype=dtype)
+            for name, dtype in TX_COLUMNS.items()
+        }
+
+    def _column_path(self, generation, name):
+        return os.path.join(self.path, generation, f"{name}.bin")
+
+    def _publish(self, meta):
+        tmp_path = os.path.join(self.path, f"meta.{uuid.uuid4().hex[:8]}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, 'meta.json'))
+
+
+class ColumnarAnalytics:
+    """
+    Analytics sobre una copia columnar de las tablas, mantenida por refresh().
+
+    Tras la carga inicial, refresh() agrega las transacciones con id mayor al
+    último cargado; si detecta borrados, recarga todo. Lo único que la app
+    modifica de una transacción existente es returned / rent_due_date, así que
+    las rentas abiertas se leen aparte en cada refresh(). Item, Supplier y
+    PurchaseOrder son tablas chicas: también se leen completas.
+
+    Con la caché de analytics activa, refresh() no consulta la BD mientras no
+    cambie su versión de datos (a lo sumo `max_age` segundos). Sin init_app las
+    columnas se guardan en memoria; con init_app, en un ColumnStore.
+    """
+
+    def __init__(self, app=None, max_age=300):
+        self.max_age = max_age
+        self.store = None
+        self._snapshot = None
+        self._bind_url = None
+        self._data_version = None
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Ubica los archivos de columnas (ANALYTICS_COLUMNS_PATH o instance/columns)"""
+        path = app.config.get('ANALYTICS_COLUMNS_PATH') or os.path.join(app.instance_path, 'columns')
+        self.max_age = app.config.get('ANALYTICS_CACHE_TTL', self.max_age)
+        self.store = ColumnStore(path)
+        self.reset()
+        app.extensions['columnar_engine'] = self
+
+    # ============ Carga ============
+
+    def refresh(self):
+        """Pone el motor al día con la BD y devuelve el estado vigente"""
+        with self._lock:
+            url = str(db.engine.url)
+            snapshot = self._snapshot
+            # Se lee antes de sincronizar: un commit durante la carga deja la versión vieja
+            version = analytics_cache.data_version() if analytics_cache.path else None
+            if (snapshot is not None and url == self._bind_url and version is not None
+                    and version == self._data_version and time.monotonic() - self._synced_at < self.max_age):
+                return snapshot
+
+            if snapshot is not None and url != self._bind_url:
+                snapshot = None
+            snapshot = self._load(snapshot, url)
+            self._snapshot, self._bind_url = snapshot, url
+            self._data_version, self._synced_at = version, time.monotonic()
+            return snapshot
+
+    def reset(self):
+        """Descarta la copia en memoria: el próximo refresh() recarga todo"""
+        with self._lock:
+            self._snapshot = None
+
+    @staticmethod
+    def _has_deletes(last_id, loaded):
+        present = db.session.query(func.count(Transaction.id)).filter(Transaction.id <= last_id).scalar()
+        return present != loaded
+
+    def _load(self, previous, url):
+        if self.store is not None:
+            tx, kinds, last_id, generation = self._sync_store(url)
+        else:
+            tx, kinds, last_id, generation = self._sync_memory(previous)
+        items = self._read_items()
+
+        # Posición de cada transacción en el arreglo de items (-1 si el item no existe);
+        # se calcula solo para las filas nuevas si la generación y los items son los mismos
+        loaded = 0
+        if (previous is not None and previous.generation == generation
+                and np.array_equal(previous.items['id'], items['id'])):
+            loaded = len(previous.tx['item_pos'])
+        tx['item_pos'] = np.concatenate([
+            previous.tx['item_pos'][:loaded] if loaded else np.empty(0, dtype=np.int32),
+            self._item_positions(items, tx['item_id'][loaded:])
+        ])
+
+        return _Snapshot(
+            tx, self._read_open_rentals(last_id), items, self._read_orders(), self._read_suppliers(),
+            kinds, last_id, generation
+        )
+
+    def _sync_memory(self, previous):
+        """Columnas en memoria: agrega las filas nuevas a las ya cargadas"""
+        if previous is None or self._has_deletes(previous.last_id, len(previous.tx['id'])):
+            kinds = []
+            tx = self._read_transactions(0, kinds)
+            return tx, kinds, self._last_id_of(tx, 0), uuid.uuid4().hex
+
+        kinds = list(previous.kinds)
+        new_rows = self._read_transactions(previous.last_id, kinds)
+        tx = {name: np.concatenate([previous.tx[name], new_rows[name]]) for name in TX_COLUMNS}
+        return tx, kinds, self._last_id_of(tx, previous.last_id), previous.generation
+
+    def _sync_store(self, url):
+        """Columnas en archivos: agrega las filas nuevas (un worker a la vez) y las mapea"""
+        database = hashlib.sha256(url.encode()).hexdigest()[:16]
+        with self.store.locked():
+            meta = self.store.read_meta()
+            if meta is None or meta['database'] != database or self._has_deletes(meta['last_id'], meta['rows']):
+                kinds = []
+                meta = self.store.write_generation(self._read_transactions(0, kinds), kinds, database)
+                logger.info(f"Column store rewritten: {meta['rows']} transactions ({meta['generation']})")
+            else:
+                kinds = list(meta['kinds'])
+                new_rows = self._read_transactions(meta['last_id'], kinds)
+                if len(new_rows['id']):
+                    meta = self.store.append(meta, new_rows, kinds)
+            tx = self.store.open(meta)
+        return tx, meta['kinds'], meta['last_id'], meta['generation']
+
+    @staticmethod
+    def _last_id_of(tx, default):
+        return int(tx['id'][-1]) if len(tx['id']) else default
+
+    def _read_transactions(self, after_id, kinds):
+        t = Transaction.__table__
+        # Fechas sin conversión por fila: se convierten vectorizadas
+        stmt = select(
+            t.c.id, t.c.item_id, t.c.kind, t.c.qty, type_coerce(t.c.day, String).label('day'), t.c.rent_days
+        ).where(t.c.id > after_id).order_by(t.c.id)
+        frame = pd.read_sql_query(stmt, db.session.connection())
+
+        codes, uniques = pd.factorize(frame['kind'])
+        for kind in uniques:
+            if kind not in kinds:
+                kinds.append(kind)
+        lookup = np.array([kinds.index(kind) for kind in uniques] + [-1], dtype=np.int8)
+
+        day = _day_numbers(frame['day'], NO_DAY)
+        month = np.zeros(len(day), dtype=np.int8)
+        has_day = day != NO_DAY
+        month[has_day] = day[has_day].astype('datetime64[D]').astype('datetime64[M]').astype(np.int64) % 12 + 1
+
+        return {
+            'id': frame['id'].to_numpy(dtype=np.int64),
+            'item_id': frame['item_id'].fillna(0).to_numpy(dtype=np.int32),
+            'kind': lookup[codes],
+            'qty': frame['qty'].fillna(0).to_numpy(dtype=np.int32),
+            'day': day,
+            'month': month,
+            'rent_days': frame['rent_days'].to_numpy(dtype=np.float64, na_value=np.nan),
+        }
+
+    @staticmethod
+    def _read_open_rentals(last_id):
+        """Vencimiento (día) de cada renta sin devolver ya cargada"""
+        t = Transaction.__table__
+        frame = pd.read_sql_query(
+            select(t.c.id, type_coerce(t.c.rent_due_date, String).label('rent_due_date')).where(
+                t.c.kind == 'rent', t.c.returned == False, t.c.id <= last_id
+            ),
+            db.session.connection()
+        )
+        return _day_numbers(frame['rent_due_date'], NO_DUE)
+
+    @staticmethod
+    def _item_positions(items, item_ids):
+        ids = items['id']
+        if not len(ids):
+            return np.full(len(item_ids), -1, dtype=np.int32)
+        positions = np.minimum(np.searchsorted(ids, item_ids), len(ids) - 1)
+        return np.where(ids[positions] == item_ids, positions, -1).astype(np.int32)
+
+    @staticmethod
+    def _read_items():
+        stmt = select(
+            Item.id, Item.name, Item.category, Item.price, Item.stock, Item.rentable, Item.supplier_id
+        ).order_by(Item.id)
+        frame = pd.read_sql_query(stmt, db.session.connection(), dtype_backend='numpy_nullable')
+        return {
+            'id': frame['id'].to_numpy(dtype=np.int64),
+            'price': frame['price'].to_numpy(dtype=np.float64, na_value=0.0),
+            'stock': frame['stock'].to_numpy(dtype=np.float64, na_value=np.nan),
+            'rentable': frame['rentable'].to_numpy(dtype=bool, na_value=False),
+            'supplier_id': frame['supplier_id'].to_numpy(dtype=np.int64, na_value=-1),
+            # Valores de Python para armar los resultados
+            'rows': list(zip(*(_python_values(frame[name]) for name in frame.columns))),
+        }
+
+    @staticmethod
+    def _read_orders():
+        po = PurchaseOrder.__table__
+        frame = pd.read_sql_query(
+            select(po.c.supplier_id, po.c.status, po.c.expected_delivery_date, po.c.actual_delivery_date),
+            db.session.connection()
+        )
+        expected = pd.to_datetime(frame['expected_delivery_date'], errors='coerce')
+        actual = pd.to_datetime(frame['actual_delivery_date'], errors='coerce')
+        return {
+            'supplier_id': frame['supplier_id'].to_numpy(dtype=np.int64),
+            'status': frame['status'].to_numpy(dtype=object),
+            'has_dates': (expected.notna() & actual.notna()).to_numpy(),
+            'late': (actual > expected).to_numpy(),
+            # Días completos de retraso (como timedelta.days)
+            'delay_days': ((actual - expected).to_numpy(dtype='timedelta64[ns]').astype(np.int64) // _NS_PER_DAY),
+        }
+
+    @staticmethod
+    def _read_suppliers():
+        rows = db.session.query(Supplier.id, Supplier.name, Supplier.contact, Supplier.city).order_by(Supplier.id).all()
+        return {row[0]: tuple(row) for row in rows}
+
+    # ============ Métricas ============
+
+    def _forecast_revenue(self, s, today):
+        mask = s.kind_mask('buy', 'rent') & (s.tx['day'] >= _day_number(today - timedelta(weeks=12)))
+        positions = s.tx['item_pos'][mask]
+        found = positions >= 0
+        revenue = s.items['price'][positions[found]] * s.tx['qty'][mask][found]
+
+        # Ingresos por semana ISO (lunes); el 1970-01-01 fue jueves
+        days = s.tx['day'][mask][found]
+        weeks, week_index = np.unique(days - (days + 3) % 7, return_inverse=True)
+        return _forecast_from_weekly(np.bincount(week_index, weights=revenue, minlength=len(weeks)).tolist())
+
+    def _trending_products(self, s, today, days=30, limit=8):
+        sales = s.kind_mask('buy', 'rent')
+        day = s.tx['day']
+
+        def period_totals(start, end):
+            mask = sales & (day >= _day_number(start)) & (day < _day_number(end))
+            counts = s.counts_by_item(mask)
+            qty = s.counts_by_item(mask, weights=s.tx['qty'])
+            return {
+                s.items['rows'][i][0]: {
+                    'count': int(counts[i]), 'qty': int(qty[i]),
+                    'name': s.items['rows'][i][1], 'category': s.items['rows'][i][2], 'price': s.items['rows'][i][3]
+                }
+                for i in np.flatnonzero(counts)
+            }
+
+        first = period_totals(today - timedelta(days=days), today - timedelta(days=days // 2))
+        second = period_totals(today - timedelta(days=days // 2), today)
+        return _trending_from_periods(first, second, limit)
+
+    def _seasonal_demand(self, s):
+        counts = np.bincount(s.tx['month'][s.valid()], minlength=13)
+        return _seasonal_from_months([(month, int(counts[month])) for month in range(1, 13) if counts[month]])
+
+    def _reorder_recommendations(self, s, today, limit=3):
+        items = s.items
+        stock, rentable = items['stock'], items['rentable']
+        candidates = ~np.isnan(stock) & (stock != 0) & (stock <= np.where(rentable, 2, 10))
+        if not candidates.any():
+            return []
+
+        valid = s.valid()
+        total = s.counts_by_item(valid)
+        recent = s.counts_by_item(valid & (s.tx['day'] >= _day_number(today - timedelta(days=30))))
+        return _reorder_from_counts(
+            items['id'][candidates], stock[candidates].astype(np.int64), rentable[candidates],
+            total[candidates], recent[candidates], limit
+        )
+
+    def _slow_suppliers(self, s):
+        orders = s.orders
+        if not len(orders['supplier_id']):
+            return []
+
+        delivered = orders['status'] == 'delivered'
+        delayed_days = np.where(delivered & orders['has_dates'] & (orders['delay_days'] > 0), orders['delay_days'], 0)
+        on_time = delivered & ~(orders['has_dates'] & orders['late'])
+        supplier_ids, index = np.unique(orders['supplier_id'], return_inverse=True)
+
+        def per_supplier(values):
+            return np.bincount(index, weights=values.astype(np.float64), minlength=len(supplier_ids)).astype(np.int64).tolist()
+
+        completed = per_supplier(delivered)
+        delayed = per_supplier(orders['status'] == 'delayed')
+        pending = per_supplier(orders['status'] == 'pending')
+        delay_days = per_supplier(delayed_days)
+        punctual = per_supplier(on_time)
+        items_per_supplier = pd.Series(s.items['supplier_id']).value_counts().to_dict()
+
+        rows = [
+            s.suppliers[supplier_id] + (completed[i], delayed[i], pending[i], delay_days[i], punctual[i],
+                                        int(items_per_supplier.get(supplier_id, 0)))
+            for i, supplier_id in enumerate(supplier_ids.tolist())
+            if supplier_id in s.suppliers
+        ]
+        return _slow_suppliers_from_rows(rows)
+
+    def _slow_rotation(self, s, today):
+        sales = s.kind_mask('buy', 'rent')
+        day = s.tx['day']
+        recent = s.counts_by_item(sales & (day >= _day_number(today - timedelta(days=30)))).tolist()
+        historical = s.counts_by_item(sales & (day >= _day_number(today - timedelta(weeks=12)))).tolist()
+
+        rows = []
+        for i, (item_id, name, category, price, stock, rentable, supplier_id) in enumerate(s.items['rows']):
+            supplier = s.suppliers.get(supplier_id)
+            rows.append((item_id, name, category, supplier_id, price, stock,
+                         supplier[1] if supplier else None, recent[i], historical[i]))
+        return _slow_rotation_from_rows(rows)
+
+    # ============ Resultados (misma forma que utils/analytics.py) ============
+
+    def analytics_data(self):
+        """Equivalente a get_analytics_data()"""
+        s = self.refresh()
+        today = datetime.utcnow().date()
+        tx, items = s.tx, s.items
+
+        rent_days = tx['rent_days'][s.kind_mask('rent')]
+        rent_days = rent_days[~np.isnan(rent_days)]
+        avg_duration = float(rent_days.sum() / len(rent_days)) if len(rent_days) else 0
+
+        # Transacciones por (día, tipo) de los últimos 30 días
+        recent = s.valid() & (tx['day'] >= _day_number(today - timedelta(days=30)))
+        keys, counts = np.unique(tx['day'][recent].astype(np.int64) * 128 + tx['kind'][recent], return_counts=True)
+        daily_transactions = sorted(
+            ((_EPOCH + timedelta(days=int(key // 128)), int(count), s.kinds[int(key % 128)])
+             for key, count in zip(keys, counts)),
+            key=lambda row: (row[0], row[2])
+        )
+
+        # Productos populares: más transacciones, desempate por id
+        totals = s.counts_by_item(s.valid())
+        order = np.lexsort((items['id'], -totals))
+        popular_items = [
+            {'name': items['rows'][i][1], 'transaction_count': int(totals[i])}
+            for i in order[:5] if totals[i] > 0
+        ]
+
+        return {
+            'general': {
+                'total_items': len(items['id']),
+                'total_rentable': int(items['rentable'].sum()),
+                'active_rentals': len(s.open_rentals),
+                'overdue_count': int((s.open_rentals < _day_number(today)).sum()),
+                'avg_rental_duration': round(avg_duration, 1)
+            },
+            'categories': _category_summary(),
+            'daily_transactions': daily_transactions,
+            'popular_items': popular_items,
+            'low_stock_items': _low_stock_items(),
+            'reorder_recommendation': self._reorder_recommendations(s, today),
+            'seasonal_demand': self._seasonal_demand(s)
+        }
+
+    def predictive_analytics(self):
+        """Equivalente a get_predictive_analytics()"""
+        try:
+            s = self.refresh()
+            today = datetime.utcnow().date()
+            return _predictive_result(
+                self._forecast_revenue(s, today), self._trending_products(s, today), int(s.valid().sum())
+            )
+        except Exception as e:
+            logger.error(f"Error en columnar predictive_analytics: {str(e)}")
+            return {
+                'revenue_forecast': {},
+                'trending_products': [],
+                'confidence_score': 0,
+                'error': str(e)
+            }
+
+    def supplier_intelligence(self):
+        """Equivalente a get_supplier_intelligence()"""
+        try:
+            s = self.refresh()
+            today = datetime.utcnow().date()
+            # La comparación consulta la BD en el pool, con su propia sesión, mientras
+            # este hilo calcula las otras dos sobre las columnas
+            comparison = start_parallel({'supplier_comparison': (analyze_supplier_comparison, {})})
+            slow_suppliers = self._slow_suppliers(s)
+            slow_rotation = self._slow_rotation(s, today)
+            results, failed = comparison.wait()
+            result = _supplier_intelligence_result(slow_suppliers, slow_rotation, results['supplier_comparison'])
+            if failed:
+                result['partial'] = failed
+            return result
+        except Exception as e:
+            logger.error(f"Error en columnar supplier_intelligence: {str(e)}")
+            return {
+                'slow_suppliers': [],
+                'slow_rotation': [],
+                'supplier_comparison': {},
+                'recommendations': [],
+                'error': str(e)
+            }
+
+
+columnar_engine = ColumnarAnalytics()
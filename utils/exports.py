@@ -0,0 +1,12 @@
+"""Exportaciones en streaming: compresión incremental de los trozos de una respuesta"""
+import zlib
+
+
+def gzip_chunks(chunks, level=6):
+    """Comprime trozos de texto (UTF-8) a medida que llegan, en formato gzip"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # 16+: cabecera gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,281 @@
+"""Operaciones de stock en lote: escaneos NFC, compras y rentas"""
+from datetime import datetime, timedelta
+from collections import defaultdict, deque
+from sqlalchemy import bindparam, case, insert, select, update
+from models import Item, Transaction, TransactionDailyRollup, db
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tamaño máximo de cada lista IN (...) para no superar el límite de parámetros de SQLite
+CHUNK_SIZE = 500
+
+NFC_ACTIONS = ('return', 'restock')
+
+CART_ACTIONS = ('buy', 'rent')
+MAX_CART_LINES = 50
+# Items por UPDATE del checkout: cada uno usa 5 parámetros (IN y dos CASE)
+CHECKOUT_CHUNK_SIZE = 100
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def take_stock(item_id, qty):
+    """
+    Descuenta qty del stock del item solo si alcanza, en un único UPDATE condicional.
+    
+    True si se descontó (una fila afectada). Comprobación y descuento son la misma
+    sentencia, así que dos compras simultáneas en workers distintos no pueden
+    vender de más. No hace commit: lo decide el endpoint.
+    """
+    item_table = Item.__table__
+    updated = db.session.execute(
+        update(item_table)
+        .where(item_table.c.id == item_id, item_table.c.stock >= qty)
+        .values(stock=item_table.c.stock - qty)
+    ).rowcount
+    return updated == 1
+
+
+def _as_date(value):
+    if not value:
+        return datetime.utcnow().date()
+    if hasattr(value, 'year'):
+        return value
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def checkout_cart(user_id, lines):
+    """
+    Compra / renta de varias líneas de carrito, todo o nada, con un número fijo de consultas.
+    
+    lines: [{'item_id', 'action': 'buy' | 'rent', 'qty', 'days', 'start_date'}]; days y
+    start_date (AAAA-MM-DD, por defecto hoy) solo para rentas.
+    
+    Valida todas las líneas contra una lectura de los items; si todas pasan, descuenta
+    el stock de todos los items con UPDATEs condicionales por conjunto (stock >= total
+    pedido del item) e inserta las transacciones en un solo INSERT masivo.
+    
+    Retorna (ok, resultados): un dict por línea con item_id, action, success y error
+    ('not_found' | 'invalid_action' | 'invalid_quantity' | 'not_rentable' |
+    'invalid_days' | 'invalid_date' | 'insufficient_stock' | 'stock_changed').
+    No hace commit. Si ok es False el endpoint debe hacer rollback: puede haber
+    descuentos de stock ya ejecutados.
+    """
+    parsed = []
+    item_ids = set()
+    for line in lines:
+        key = _as_int(line.get('item_id'))
+        parsed.append((line, key))
+        if key is not None:
+            item_ids.add(key)
+    
+    items = {}
+    for chunk in _chunks(item_ids):
+        for row in db.session.execute(
+            select(Item.id, Item.name, Item.stock, Item.rentable).where(Item.id.in_(chunk))
+        ):
+            items[row.id] = row
+    
+    # 1) Validación de cada línea y total pedido por item
+    results = []
+    required = defaultdict(int)
+    now = datetime.utcnow()
+    rows = []
+    for line, key in parsed:
+        action = line.get('action')
+        qty = _as_int(line.get('qty', 1))
+        result = {'item_id': line.get('item_id'), 'action': action, 'success': False, 'error': None}
+        results.append(result)
+        
+        item = items.get(key)
+        if item is None:
+            result['error'] = 'not_found'
+            continue
+        if action not in CART_ACTIONS:
+            result['error'] = 'invalid_action'
+            continue
+        if qty is None or qty < 1:
+            result['error'] = 'invalid_quantity'
+            continue
+        
+        row = {
+            'item_id': key, 'user_id': user_id, 'kind': action, 'qty': qty,
+            'timestamp': now, 'day': now.date(), 'returned': False,
+            'rent_days': None, 'rent_start_date': None, 'rent_due_date': None
+        }
+        if action == 'rent':
+            days = _as_int(line.get('days', 1))
+            start_date = _as_date(line.get('start_date'))
+            if not item.rentable:
+                result['error'] = 'not_rentable'
+                continue
+            if days is None or days < 1:
+                result['error'] = 'invalid_days'
+                continue
+            if start_date is None:
+                result['error'] = 'invalid_date'
+                continue
+            row.update(rent_days=days, rent_start_date=start_date, rent_due_date=start_date + timedelta(days=days))
+        
+        required[key] += qty
+        rows.append(row)
+        result.update(success=True, item_name=item.name)
+    
+    # Stock insuficiente según la lectura: se marcan todas las líneas del item
+    short = {key for key, qty in required.items() if (items[key].stock or 0) < qty}
+    for result, (_, key) in zip(results, parsed):
+        if result['success'] and key in short:
+            result.update(success=False, error='insufficient_stock')
+    if not results or not all(result['success'] for result in results):
+        return False, results
+    
+    # 2) Descuento condicional por conjunto: si otra petición se llevó el stock
+    # entre la lectura y aquí, algún item no se actualiza y el checkout se anula
+    item_table = Item.__table__
+    updated = 0
+    for chunk in _chunks(required, CHECKOUT_CHUNK_SIZE):
+        qty_by_id = case({key: required[key] for key in chunk}, value=item_table.c.id)
+        updated += db.session.execute(
+            update(item_table)
+            .where(item_table.c.id.in_(chunk), item_table.c.stock >= qty_by_id)
+            .values(stock=item_table.c.stock - qty_by_id)
+        ).rowcount
+    if updated != len(required):
+        for result in results:
+            result.update(success=False, error='stock_changed')
+        return False, results
+    
+    # 3) Transacciones en un INSERT masivo; no pasa por before_flush: el rollup se ajusta aquí
+    db.session.execute(insert(Transaction.__table__), rows)
+    rollup_deltas = defaultdict(lambda: [0, 0, 0, 0])
+    for row in rows:
+        key, values = TransactionDailyRollup.delta_for(row['day'], row['item_id'], row['kind'], row['qty'], False)
+        for i, value in enumerate(values):
+            rollup_deltas[key][i] += value
+    TransactionDailyRollup.apply_deltas(rollup_deltas)
+    
+    return True, results
+
+
+def apply_nfc_batch(operations, qty_field='qty'):
+    """
+    Aplica un lote de escaneos NFC (return / restock) con un número fijo de consultas.
+    
+    Precarga todos los items y sus rentas abiertas, simula las operaciones en orden
+    (cada devolución cierra la renta abierta más antigua del item) y escribe el
+    resultado con UPDATEs masivos. No hace commit: lo decide el endpoint.
+    
+    Retorna una lista con un dict por operación: item_id, action, success,
+    error ('not_found' | 'no_rental' | 'invalid_action' | 'invalid_quantity'),
+    item_name, old_stock, new_stock.
+    """
+    parsed = []
+    item_ids = set()
+    returns_needed = set()
+    for op in operations:
+        item_id = op.get('item_id')
+        action = op.get('action')
+        key = _as_int(item_id)
+        parsed.append((item_id, key, action, op.get(qty_field, 1)))
+        if key is not None:
+            item_ids.add(key)
+            if action == 'return':
+                returns_needed.add(key)
+    
+    # 1) Items referenciados
+    items = {}
+    for chunk in _chunks(item_ids):
+        for row in db.session.execute(
+            select(Item.id, Item.name, Item.stock).where(Item.id.in_(chunk))
+        ):
+            items[row.id] = {'name': row.name, 'stock': row.stock or 0}
+    
+    # 2) Rentas abiertas de los items con devoluciones, más antigua primero
+    open_rentals = defaultdict(deque)
+    for chunk in _chunks(returns_needed & items.keys()):
+        for row in db.session.execute(
+            select(Transaction.id, Transaction.item_id, Transaction.qty, Transaction.day).where(
+                Transaction.item_id.in_(chunk),
+                Transaction.kind == 'rent',
+                Transaction.returned == False
+            ).order_by(Transaction.item_id, Transaction.id)
+        ):
+            open_rentals[row.item_id].append((row.id, row.qty or 0, row.day))
+    
+    # 3) Simulación en memoria, respetando el orden del lote
+    results = []
+    stock_deltas = defaultdict(int)
+    closed_rentals = []
+    rollup_deltas = defaultdict(lambda: [0, 0, 0, 0])
+    for item_id, key, action, qty in parsed:
+        result = {'item_id': item_id, 'action': action, 'success': False, 'error': None}
+        results.append(result)
+        
+        item = items.get(key)
+        if item is None:
+            result['error'] = 'not_found'
+            continue
+        
+        if action == 'return':
+            if not open_rentals[key]:
+                result['error'] = 'no_rental'
+                continue
+            rental_id, delta, day = open_rentals[key].popleft()
+            closed_rentals.append(rental_id)
+            rollup_deltas[(day, key, 'rent')][2] += 1
+            rollup_deltas[(day, key, 'rent')][3] += delta
+        elif action == 'restock':
+            delta = _as_int(qty)
+            if delta is None or delta <= 0:
+                result['error'] = 'invalid_quantity'
+                continue
+        else:
+            result['error'] = 'invalid_action'
+            continue
+        
+        result.update(success=True, item_name=item['name'], old_stock=item['stock'])
+        item['stock'] += delta
+        stock_deltas[key] += delta
+        result['new_stock'] = item['stock']
+    
+    # 4) Escrituras masivas: deltas de stock y cierre de rentas
+    if stock_deltas:
+        item_table = Item.__table__
+        db.session.execute(
+            update(item_table)
+            .where(item_table.c.id == bindparam('b_id'))
+            .values(stock=item_table.c.stock + bindparam('b_delta')),
+            [{'b_id': item_id, 'b_delta': delta} for item_id, delta in stock_deltas.items()]
+        )
+    
+    if closed_rentals:
+        now = datetime.utcnow()
+        closed = 0
+        for chunk in _chunks(closed_rentals):
+            closed += db.session.execute(
+                update(Transaction.__table__)
+                .where(Transaction.__table__.c.id.in_(chunk), Transaction.__table__.c.returned == False)
+                .values(returned=True, return_date=now)
+            ).rowcount
+        if closed != len(closed_rentals):
+            # Otra petición cerró alguna de estas rentas: el stock quedaría duplicado
+            raise RuntimeError('Rentas modificadas concurrentemente, reintente el lote')
+        # El UPDATE masivo no pasa por before_flush: el rollup se ajusta aquí
+        TransactionDailyRollup.apply_deltas(rollup_deltas)
+    
+    return results
@@ -0,0 +1,130 @@
+"""Paginación por cursor (keyset) para listados grandes"""
+import base64
+import json
+import logging
+from sqlalchemy import and_, or_
+
+logger = logging.getLogger(__name__)
+
+
+class KeysetPage:
+    """
+    Página obtenida con keyset: items, has_next y next_cursor.
+
+    total es None salvo que se pida explícitamente (COUNT completo).
+    """
+    __slots__ = ('items', 'per_page', 'has_next', 'next_cursor', 'total')
+
+    def __init__(self, items, per_page, next_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.has_next = next_cursor is not None
+        self.total = total
+
+
+def encode_cursor(values):
+    """Codifica los valores de la última fila como cursor opaco (base64 url-safe)"""
+    raw = json.dumps([v.isoformat() if hasattr(v, 'isoformat') else v for v in values],
+                     separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """Decodifica un cursor para las columnas dadas. Lanza ValueError si no es válido"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, TypeError) as e:
+        raise ValueError(f'Cursor inválido: {cursor!r}') from e
+
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError(f'Cursor inválido: {cursor!r}')
+
+    decoded = []
+    for position, (column, value) in enumerate(zip(columns, values)):
+        python_type = column.type.python_type
+        try:
+            if value is None:
+                # Solo la primera columna puede ser NULL (ver keyset_paginate)
+                if position == 0 and _nullable(column):
+                    decoded.append(None)
+                    continue
+                raise ValueError('valor nulo')
+            if hasattr(python_type, 'fromisoformat'):
+                decoded.append(python_type.fromisoformat(value))
+            else:
+                decoded.append(python_type(value))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f'Cursor inválido: {cursor!r}') from e
+    return decoded
+
+
+def _nullable(column):
+    return getattr(column.expression, 'nullable', False)
+
+
+def _after(columns, values, descending):
+    """
+    Condición "fila posterior al cursor" para (c1, c2, ...) en el orden dado.
+
+    Se escribe como c1 <= v1 AND (c1 < v1 OR ...) para que el primer término
+    sea un rango sobre el índice de c1 en cualquier motor.
+    """
+    column, value = columns[0], values[0]
+    strict = column < value if descending else column > value
+    if len(columns) == 1:
+        return strict
+    inclusive = column <= value if descending else column >= value
+    return and_(inclusive, or_(strict, _after(columns[1:], values[1:], descending)))
+
+
+def keyset_paginate(query, columns, cursor=None, per_page=30, descending=True, with_total=False):
+    """
+    Pagina `query` por las columnas dadas (la última debe ser única, p. ej. id).
+
+    A diferencia de paginate(), no usa OFFSET ni COUNT(*): el costo de cada página
+    es el mismo sin importar su profundidad. cursor=None devuelve la primera página.
+
+    La primera columna puede admitir NULL (p. ej. timestamp): una comparación con
+    NULL nunca es cierta, así que esas filas se recorren aparte, al final y por el
+    resto de columnas, con `columna IS NULL` (también sobre el índice). Las demás
+    columnas no deben tener NULL.
+    """
+    if with_total:
+        total = query.order_by(None).count()
+    else:
+        total = None
+
+    values = decode_cursor(cursor, columns) if cursor else None
+    order = [c.desc() for c in columns] if descending else [c.asc() for c in columns]
+    lead, nullable = columns[0], _nullable(columns[0])
+
+    rows = []
+    if values is None or values[0] is not None:
+        ranged = query.filter(lead.isnot(None)) if nullable else query
+        if values is not None:
+            ranged = ranged.filter(_after(columns, values, descending))
+        rows = ranged.order_by(None).order_by(*order).limit(per_page + 1).all()
+
+    if nullable and len(rows) <= per_page and len(columns) > 1:
+        # Se acabaron las filas con valor: seguir con las de la primera columna en NULL
+        tail = query.filter(lead.is_(None))
+        if values is not None and values[0] is None:
+            tail = tail.filter(_after(columns[1:], values[1:], descending))
+        rows += tail.order_by(None).order_by(*order[1:]).limit(per_page + 1 - len(rows)).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, c.key) for c in columns])
+
+    return KeysetPage(rows, per_page, next_cursor=next_cursor, total=total)
+
+
+def next_cursor_for(items, columns, has_next):
+    """Cursor para continuar por keyset desde una página obtenida con paginate()"""
+    if not items or not has_next:
+        return None
+    return encode_cursor([getattr(items[-1], c.key) for c in columns])
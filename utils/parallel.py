@@ -0,0 +1,128 @@
+"""Ejecución en paralelo de análisis independientes de solo lectura (pool de hilos)"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import logging
+import threading
+import time
+
+from flask import current_app
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_in_pool = threading.local()
+
+
+def _get_executor(max_workers):
+    """Pool compartido por el proceso; se crea con el primer uso"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analytics')
+        return _executor
+
+
+def _run_in_app_context(app, fn):
+    # App context propio: Flask-SQLAlchemy asocia la sesión al contexto, así que
+    # cada tarea usa su propia sesión y conexión, que se devuelven al terminar
+    _in_pool.active = True
+    try:
+        with app.app_context():
+            try:
+                return fn()
+            finally:
+                db.session.remove()
+    finally:
+        _in_pool.active = False
+
+
+def _runs_sequentially():
+    # Una base SQLite en memoria es distinta en cada conexión; y una tarea que ya
+    # corre en el pool no espera a otras del mismo pool (podría quedarse sin hilos)
+    url = db.engine.url
+    in_memory = url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+    return in_memory or getattr(_in_pool, 'active', False)
+
+
+def _task_timeout(task, timeout):
+    # tasks = {nombre: (función, valor por defecto[, timeout propio en segundos])}
+    return task[2] if len(task) > 2 and task[2] is not None else timeout
+
+
+class ParallelRun:
+    """Tareas ya lanzadas por start_parallel(); wait() recoge sus resultados"""
+
+    def __init__(self, tasks, futures=None, results=None, failed=None):
+        self.tasks = tasks
+        self.futures = futures or {}
+        self.results = results or {}
+        self.failed = failed or []
+        self.started = time.monotonic()
+
+    def wait(self, timeout=None):
+        """
+        ({nombre: resultado}, [nombres que fallaron o no terminaron]); ver run_parallel.
+
+        Cada tarea tiene su propio plazo, contado desde start_parallel(): el tercer
+        elemento de su tupla o, si no lo trae, `timeout` (por defecto
+        ANALYTICS_TASK_TIMEOUT). Así el trabajo que hizo quien llama entre
+        start_parallel() y wait() cuenta dentro del plazo, no se suma a él.
+        """
+        if timeout is None:
+            timeout = current_app.config.get('ANALYTICS_TASK_TIMEOUT', 30)
+        for name, future in self.futures.items():
+            task_timeout = _task_timeout(self.tasks[name], timeout)
+            remaining = max(0, self.started + task_timeout - time.monotonic())
+            try:
+                self.results[name] = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                logger.warning(f"Analysis {name} timed out after {task_timeout}s")
+                self.results[name] = self.tasks[name][1]
+                self.failed.append(name)
+            except Exception as e:
+                logger.error(f"Analysis {name} failed: {e}", exc_info=True)
+                self.results[name] = self.tasks[name][1]
+                self.failed.append(name)
+        self.futures = {}
+        return self.results, self.failed
+
+
+def start_parallel(tasks):
+    """
+    Lanza tasks = {nombre: (función, valor por defecto[, timeout])} en el pool y vuelve
+    enseguida, para que quien llama haga otro trabajo mientras tanto (p. ej. cálculo
+    sobre columnas mientras una tarea espera a la BD). Devuelve un ParallelRun.
+    """
+    app = current_app._get_current_object()
+    if not _runs_sequentially():
+        executor = _get_executor(app.config.get('ANALYTICS_PARALLEL_WORKERS', 4))
+        return ParallelRun(tasks, futures={
+            name: executor.submit(_run_in_app_context, app, task[0]) for name, task in tasks.items()
+        })
+
+    results, failed = {}, []
+    for name, task in tasks.items():
+        try:
+            results[name] = task[0]()
+        except Exception as e:
+            logger.error(f"Analysis {name} failed: {e}", exc_info=True)
+            results[name] = task[1]
+            failed.append(name)
+    return ParallelRun(tasks, results=results, failed=failed)
+
+
+def run_parallel(tasks, timeout=None):
+    """
+    Ejecuta tasks = {nombre: (función, valor por defecto[, timeout])} a la vez.
+
+    Devuelve ({nombre: resultado}, [nombres que fallaron o no terminaron]). Una
+    tarea que lanza una excepción o supera su timeout (el de su tupla, o `timeout`,
+    por defecto ANALYTICS_TASK_TIMEOUT) aporta su valor por defecto; el resto se
+    conserva. Una tarea vencida no se cancela: sigue corriendo en su hilo hasta
+    terminar, ocupando ese hilo del pool y su conexión a la BD, pero nadie la espera.
+    Sin pool (SQLite en memoria, o ya dentro del pool) las tareas corren en serie
+    y el timeout no se aplica.
+    """
+    return start_parallel(tasks).wait(timeout)
@@ -0,0 +1,195 @@
+"""Hashing de contraseñas en un pool de procesos acotado (argon2id; PBKDF2 heredado)"""
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import multiprocessing
+import os
+import threading
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+try:
+    from argon2 import PasswordHasher
+    from argon2.exceptions import VerificationError, InvalidHashError
+    ARGON2_AVAILABLE = True
+except ImportError:
+    ARGON2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PARAMS = {
+    'algorithm': 'argon2',
+    'argon2_time_cost': 3,
+    'argon2_memory_cost': 65536,  # KiB
+    'argon2_parallelism': 1,  # el paralelismo lo pone el pool
+    'pbkdf2_iterations': 600000,
+}
+
+
+class PasswordPoolBusy(Exception):
+    """El pool tiene su cola llena (o no respondió a tiempo): rechazar rápido"""
+
+
+# ============ Trabajo de los procesos del pool (funciones de módulo: picklables) ============
+
+_hashers = {}
+
+
+def _argon2(params):
+    key = (params['argon2_time_cost'], params['argon2_memory_cost'], params['argon2_parallelism'])
+    if key not in _hashers:
+        _hashers[key] = PasswordHasher(time_cost=key[0], memory_cost=key[1], parallelism=key[2])
+    return _hashers[key]
+
+
+def _uses_argon2(params):
+    return params['algorithm'] == 'argon2' and ARGON2_AVAILABLE
+
+
+def hash_in_worker(password, params):
+    """Hash con el algoritmo y coste configurados"""
+    if _uses_argon2(params):
+        return _argon2(params).hash(password)
+    return generate_password_hash(password, method=f"pbkdf2:sha256:{params['pbkdf2_iterations']}")
+
+
+def verify_in_worker(password_hash, password, params):
+    """(coincide, hay que rehashear con la configuración actual)"""
+    if password_hash.startswith('$argon2'):
+        if not ARGON2_AVAILABLE:
+            return False, False
+        try:
+            _argon2(params).verify(password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False, False
+        return True, not _uses_argon2(params) or _argon2(params).check_needs_rehash(password_hash)
+
+    if not check_password_hash(password_hash, password):
+        return False, False
+    if _uses_argon2(params):
+        return True, True
+    return True, not password_hash.startswith(f"pbkdf2:sha256:{params['pbkdf2_iterations']}$")
+
+
+def in_pool_process():
+    """
+    True dentro de un proceso hijo (p. ej. del pool). Con 'spawn' el hijo
+    reimporta el __main__ del padre (app.py o worker.py) antes de recibir
+    trabajo; app.py lo consulta para no arrancar ahí hilos de fondo.
+    """
+    return multiprocessing.current_process().name != 'MainProcess'
+
+
+class PasswordPool:
+    """
+    Hash y verificación de contraseñas fuera del worker web, en un pool de procesos.
+
+    Como mucho PASSWORD_POOL_MAX_PENDING operaciones en curso o en cola por
+    worker; la siguiente recibe PasswordPoolBusy al instante en vez de esperar,
+    y lo mismo si el resultado tarda más de PASSWORD_POOL_TIMEOUT segundos o si
+    un proceso del pool murió. Así una avalancha de logins no ocupa todos los
+    hilos y el catálogo sigue respondiendo. Con PASSWORD_POOL_WORKERS = 0, o sin
+    init_app, se calcula en el propio proceso.
+    """
+
+    def __init__(self, app=None):
+        self.params = dict(DEFAULT_PARAMS)
+        self.workers = 0
+        self.max_pending = 0
+        self.timeout = 10
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+        self._slots = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Lee algoritmo, costes y límites del pool; el pool se crea con el primer uso"""
+        self.params = {
+            'algorithm': app.config.get('PASSWORD_HASH_ALGORITHM', DEFAULT_PARAMS['algorithm']),
+            'argon2_time_cost': app.config.get('ARGON2_TIME_COST', DEFAULT_PARAMS['argon2_time_cost']),
+            'argon2_memory_cost': app.config.get('ARGON2_MEMORY_COST', DEFAULT_PARAMS['argon2_memory_cost']),
+            'argon2_parallelism': app.config.get('ARGON2_PARALLELISM', DEFAULT_PARAMS['argon2_parallelism']),
+            'pbkdf2_iterations': app.config.get('PBKDF2_ITERATIONS', DEFAULT_PARAMS['pbkdf2_iterations']),
+        }
+        if self.params['algorithm'] == 'argon2' and not ARGON2_AVAILABLE:
+            logger.warning("argon2-cffi not installed: hashing passwords with PBKDF2")
+        workers = app.config.get('PASSWORD_POOL_WORKERS')
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = app.config.get('PASSWORD_POOL_MAX_PENDING') or 4 * max(1, self.workers)
+        self.timeout = app.config.get('PASSWORD_POOL_TIMEOUT', self.timeout)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self.shutdown()
+        app.extensions['password_pool'] = self
+
+    def _get_executor(self):
+        # Un pool por worker de gunicorn: tras un fork se crea uno nuevo. 'spawn'
+        # porque el worker ya tiene hilos (flushers) y un fork con hilos no es
+        # seguro. Cada hijo reimporta el __main__: ver in_pool_process()
+        with self._executor_lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args):
+        if self.workers <= 0 or self._slots is None:
+            return fn(*args, self.params)
+        if not self._slots.acquire(blocking=False):
+            raise PasswordPoolBusy('Password pool saturated')
+        try:
+            future = self._get_executor().submit(fn, *args, self.params)
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            logger.warning(f"Password operation timed out after {self.timeout}s")
+            raise PasswordPoolBusy('Password pool timeout')
+        except BrokenProcessPool:
+            # Un proceso murió (p. ej. OOM): se recrea el pool en el próximo uso. No se
+            # calcula aquí: en plena avalancha eso volvería a bloquear el worker web
+            logger.error("Password pool broken, recreating on next use")
+            self.shutdown()
+            raise PasswordPoolBusy('Password pool broken')
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """Hash de `password` con el algoritmo y coste configurados"""
+        return self._run(hash_in_worker, password)
+
+    def hash_many(self, passwords, chunksize=16):
+        """
+        Hashes de una lista de contraseñas repartidos entre todos los procesos del
+        pool (importaciones masivas, desde worker.py). No pasa por el límite de
+        pendientes: es trabajo por lotes, no un request que deba rechazarse rápido.
+        """
+        if not passwords:
+            return []
+        if self.workers <= 0:
+            return [hash_in_worker(password, self.params) for password in passwords]
+        try:
+            return list(self._get_executor().map(
+                hash_in_worker, passwords, [self.params] * len(passwords), chunksize=chunksize
+            ))
+        except BrokenProcessPool:
+            logger.error("Password pool broken, hashing batch inline")
+            self.shutdown()
+            return [hash_in_worker(password, self.params) for password in passwords]
+
+    def verify(self, password_hash, password):
+        """(coincide, necesita rehash). PasswordPoolBusy si el pool está saturado o caído"""
+        if not password_hash:
+            return False, False
+        return self._run(verify_in_worker, password_hash, password)
+
+    def shutdown(self):
+        """Cierra el pool de este proceso (se recrea con el próximo uso)"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._executor_pid == os.getpid():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_pool = PasswordPool()
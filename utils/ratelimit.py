@@ -0,0 +1,293 @@
+"""Rate limiting con token bucket compartido entre workers (archivo SQLite en instance/)"""
+import atexit
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_UNITS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+_LIMIT_RE = re.compile(r'^\s*(\d+)\s*(?:/|per)\s*(\d+)?\s*(second|minute|hour|day)s?\s*$', re.IGNORECASE)
+
+
+def parse_limit(text):
+    """'100 per hour' o '5 per 15 minutes' -> (100, 3600.0) / (5, 900.0)"""
+    match = _LIMIT_RE.match(text or '')
+    if not match:
+        raise ValueError(f"Invalid rate limit: {text!r}")
+    count, amount, unit = match.groups()
+    return int(count), float(int(amount or 1) * _UNITS[unit.lower()])
+
+
+class RateLimiter:
+    """
+    Token bucket por clave: `limit` fichas que se reponen de forma continua a lo
+    largo de `period` segundos (ventana deslizante aproximada, sin ráfagas mayores
+    que `limit`).
+
+    Cada clave es una fila (fichas, última actualización) en un archivo SQLite con
+    WAL, así que todos los workers del host comparten el conteo. Una comprobación
+    es una lectura y, si consume, una escritura por clave primaria: O(1), sin
+    importar cuántos intentos hubo. Sin init_app, o si el archivo falla, no limita.
+
+    hit_deferred() decide en memoria y escribe el consumo en lote cada
+    sync_interval segundos (para la API, donde cada request es una comprobación).
+    """
+
+    def __init__(self, app=None):
+        self.path = None
+        self.prune_every = 1000
+        self.sync_interval = 1.0
+        self._local = threading.local()
+        self._hits = 0
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+        self._syncer = None
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Ubica el archivo (RATELIMIT_PATH o instance/ratelimit.db), crea el esquema y arranca la sincronización"""
+        self.sync_interval = app.config.get('RATELIMIT_SYNC_SECONDS', self.sync_interval)
+        self.path = app.config.get('RATELIMIT_PATH') or os.path.join(app.instance_path, 'ratelimit.db')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_bucket ('
+                'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL)'
+            )
+        finally:
+            conn.close()
+        app.extensions['rate_limiter'] = self
+
+        if self._syncer is None and self.sync_interval:
+            self._syncer = threading.Thread(target=self._sync_loop, name='rate-limit-sync', daemon=True)
+            self._syncer.start()
+            atexit.register(self.shutdown)
+
+    def _connection(self):
+        # Una conexión por hilo y proceso (tras el fork de gunicorn no se hereda)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid() or self._local.path != self.path:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn, self._local.pid, self._local.path = conn, os.getpid(), self.path
+        return conn
+
+    @staticmethod
+    def _refill(row, limit, period, now):
+        if row is None:
+            return float(limit)
+        tokens, updated_at = row
+        return min(float(limit), tokens + max(0.0, now - updated_at) * limit / period)
+
+    def hit(self, key, limit, period, cost=1):
+        """
+        Consume `cost` fichas de `key`. Devuelve (permitido, segundos para reintentar);
+        una petición rechazada no consume.
+        """
+        if self.path is None:
+            return True, 0
+        try:
+            conn = self._connection()
+            now = time.time()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT tokens, updated_at FROM rate_bucket WHERE key = ?', (key,)).fetchone()
+                tokens = self._refill(row, limit, period, now)
+                allowed = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                    conn.execute(
+                        'INSERT OR REPLACE INTO rate_bucket (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)',
+                        (key, tokens, now, now + (limit - tokens) * period / limit)
+                    )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except Exception as e:
+            logger.error(f"Rate limiter error ({key}): {e}")
+            return True, 0
+
+        self._hits += 1
+        if self._hits % self.prune_every == 0:
+            self.prune()
+        return allowed, 0 if allowed else (cost - tokens) * period / limit
+
+    def hit_deferred(self, key, limit, period, cost=1):
+        """
+        Como hit(), pero decide con una copia en memoria del bucket: el consumo se
+        suma a la fila compartida en sync(), una transacción por proceso cada
+        sync_interval segundos, y no en cada petición.
+
+        Entre dos sincronizaciones este proceso no ve lo que consumen los demás
+        workers: con varios, una clave puede pasarse del límite en lo que gasten
+        los otros durante ese intervalo. Con sync_interval = 0 equivale a hit().
+        """
+        if self.path is None:
+            return True, 0
+        if not self.sync_interval:
+            return self.hit(key, limit, period, cost)
+
+        with self._buckets_lock:
+            bucket = self._buckets.get(key)
+        if bucket is None:
+            # Primera vez en este intervalo: leer la fila (sin escribir)
+            try:
+                row = self._connection().execute(
+                    'SELECT tokens, updated_at FROM rate_bucket WHERE key = ?', (key,)
+                ).fetchone()
+            except Exception as e:
+                logger.error(f"Rate limiter error ({key}): {e}")
+                return True, 0
+            loaded = _LocalBucket(limit, period, row)
+            with self._buckets_lock:
+                bucket = self._buckets.setdefault(key, loaded)
+
+        now = time.time()
+        with self._buckets_lock:
+            bucket.limit, bucket.period, bucket.used = limit, period, True
+            tokens = self._refill(bucket.row, limit, period, now) - bucket.pending - bucket.syncing
+            allowed = tokens >= cost
+            if allowed:
+                bucket.pending += cost
+        return allowed, 0 if allowed else (cost - tokens) * period / limit
+
+    def sync(self):
+        """
+        Suma a rate_bucket el consumo pendiente de hit_deferred() y relee las filas
+        (incluye lo que consumieron otros workers). Devuelve las claves escritas.
+        """
+        with self._buckets_lock:
+            # Claves sin uso desde la última sincronización: se olvidan y el
+            # próximo hit_deferred() relee su fila
+            self._buckets = {
+                key: bucket for key, bucket in self._buckets.items() if bucket.used or bucket.pending
+            }
+            batch = {}
+            for key, bucket in self._buckets.items():
+                bucket.syncing, bucket.pending, bucket.used = bucket.pending, 0, False
+                batch[key] = (bucket.limit, bucket.period, bucket.syncing)
+
+        if not batch or self.path is None:
+            return 0
+
+        rows, written = {}, 0
+        try:
+            conn = self._connection()
+            now = time.time()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for key, (limit, period, consumed) in batch.items():
+                    row = conn.execute('SELECT tokens, updated_at FROM rate_bucket WHERE key = ?', (key,)).fetchone()
+                    if consumed:
+                        tokens = max(0.0, self._refill(row, limit, period, now) - consumed)
+                        conn.execute(
+                            'INSERT OR REPLACE INTO rate_bucket (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)',
+                            (key, tokens, now, now + (limit - tokens) * period / limit)
+                        )
+                        row = (tokens, now)
+                        written += 1
+                    rows[key] = row
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except Exception as e:
+            # El consumo no escrito se pierde: como en hit(), un fallo no limita
+            logger.error(f"Rate limiter sync failed: {e}")
+
+        with self._buckets_lock:
+            for key, bucket in self._buckets.items():
+                if key in rows:
+                    bucket.row = rows[key]
+                bucket.syncing = 0
+        return written
+
+    def shutdown(self):
+        """Detiene el hilo y escribe el consumo pendiente"""
+        self._stop.set()
+        self.sync()
+
+    def _sync_loop(self):
+        while not self._stop.wait(self.sync_interval):
+            self.sync()
+
+    def refund(self, key, limit, period, cost=1):
+        """Devuelve `cost` fichas consumidas por hit() (p. ej. un intento que no cuenta)"""
+        if self.path is None:
+            return
+        try:
+            conn = self._connection()
+            now = time.time()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT tokens, updated_at FROM rate_bucket WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    tokens = min(float(limit), self._refill(row, limit, period, now) + cost)
+                    conn.execute(
+                        'UPDATE rate_bucket SET tokens = ?, updated_at = ?, full_at = ? WHERE key = ?',
+                        (tokens, now, now + (limit - tokens) * period / limit, key)
+                    )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except Exception as e:
+            logger.error(f"Rate limiter error ({key}): {e}")
+
+    def peek(self, key, limit, period, cost=1):
+        """Como hit() pero sin consumir: (hay fichas, segundos para reintentar)"""
+        if self.path is None:
+            return True, 0
+        try:
+            row = self._connection().execute(
+                'SELECT tokens, updated_at FROM rate_bucket WHERE key = ?', (key,)
+            ).fetchone()
+        except Exception as e:
+            logger.error(f"Rate limiter error ({key}): {e}")
+            return True, 0
+        tokens = self._refill(row, limit, period, time.time())
+        return tokens >= cost, 0 if tokens >= cost else (cost - tokens) * period / limit
+
+    def reset(self, key):
+        """Vacía el historial de `key` (vuelve a tener todas sus fichas)"""
+        if self.path is None:
+            return
+        with self._buckets_lock:
+            self._buckets.pop(key, None)
+        try:
+            self._connection().execute('DELETE FROM rate_bucket WHERE key = ?', (key,))
+        except Exception as e:
+            logger.error(f"Rate limiter error ({key}): {e}")
+
+    def prune(self):
+        """Borra las claves con el bucket ya lleno: equivalen a no tener fila"""
+        try:
+            self._connection().execute('DELETE FROM rate_bucket WHERE full_at < ?', (time.time(),))
+        except Exception as e:
+            logger.error(f"Rate limiter prune failed: {e}")
+
+
+class _LocalBucket:
+    """Copia en memoria de una fila de rate_bucket y el consumo aún no escrito"""
+    __slots__ = ('limit', 'period', 'row', 'pending', 'syncing', 'used')
+
+    def __init__(self, limit, period, row):
+        self.limit = limit
+        self.period = period
+        self.row = row  # (fichas, updated_at) leído de la BD, o None si no había fila
+        self.pending = 0  # consumido desde la última sincronización
+        self.syncing = 0  # consumido y en escritura por sync()
+        self.used = True
+
+
+rate_limiter = RateLimiter()
@@ -1,6 +1,6 @@
 """Funciones de seguridad: hashing, 2FA, IP"""
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask import request
+from utils.passwords import password_pool, PasswordPoolBusy
 import logging
 
 try:
@@ -18,12 +18,26 @@ def get_client_ip():
     return request.environ.get('REMOTE_ADDR')
 
 def hash_password(password):
-    """Hashea contraseña con PBKDF2:SHA256"""
-    return generate_password_hash(password, method='pbkdf2:sha256')
+    """Hashea contraseña (argon2id por defecto, PASSWORD_HASH_ALGORITHM) en el pool de procesos"""
+    return password_pool.hash(password)
 
 def verify_password(password_hash, password):
-    """Verifica contraseña hasheada"""
-    return check_password_hash(password_hash, password)
+    """Verifica contraseña hasheada (argon2 o PBKDF2 heredado) en el pool de procesos"""
+    return password_pool.verify(password_hash, password)[0]
+
+def verify_and_upgrade(user, password):
+    """
+    Verifica la contraseña de `user` y, si coincide pero el hash usa otro
+    algoritmo o coste que el configurado, lo reemplaza (sin commit).
+    Lanza PasswordPoolBusy si el pool está saturado.
+    """
+    ok, needs_rehash = password_pool.verify(user.password_hash, password)
+    if ok and needs_rehash:
+        try:
+            user.password_hash = password_pool.hash(password)
+        except PasswordPoolBusy:
+            pass  # se actualizará en el próximo login
+    return ok
 
 def generate_2fa_secret():
     """Genera secreto TOTP para 2FA"""
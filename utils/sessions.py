@@ -0,0 +1,147 @@
+"""Validación de sesiones con caché en memoria y escritura diferida de last_activity"""
+from datetime import datetime
+import atexit
+import logging
+import threading
+import time
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from models import db, User, ActiveSession
+
+logger = logging.getLogger(__name__)
+
+_USER_COLUMNS = [c.key for c in User.__table__.columns]
+
+
+class CachedSession:
+    """Datos de una sesión activa suficientes para validar un request sin ir a la BD"""
+    __slots__ = ('session_id', 'user_id', 'ip_address', 'expires_at', 'user_columns', 'cached_until')
+    
+    def __init__(self, active_session, user, ttl):
+        self.session_id = active_session.id
+        self.user_id = user.id
+        self.ip_address = active_session.ip_address
+        self.expires_at = active_session.expires_at
+        self.user_columns = {key: getattr(user, key) for key in _USER_COLUMNS}
+        self.cached_until = time.monotonic() + ttl
+    
+    def is_expired(self, now=None):
+        """True si la sesión ya venció (expires_at de ActiveSession)"""
+        return bool(self.expires_at and self.expires_at < (now or datetime.utcnow()))
+
+
+class SessionValidator:
+    """
+    Caché por token de sesión (TTL corto) + buffer write-behind de last_activity.
+    
+    Un acierto de caché no toca la BD; last_activity se acumula en memoria y se
+    escribe en un único UPDATE masivo cada SESSION_ACTIVITY_FLUSH_SECONDS.
+    Logout, cambio de IP y vencimiento se aplican de inmediato en este proceso;
+    en otros workers, como máximo tras SESSION_CACHE_TTL segundos.
+    """
+    
+    def __init__(self, app=None):
+        self.ttl = 5
+        self.flush_interval = 5
+        self.max_entries = 10000
+        self._cache = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._app = None
+        self._flusher = None
+        self._stop = threading.Event()
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """Lee la configuración y arranca el hilo de escritura diferida"""
+        self._app = app
+        self.ttl = app.config.get('SESSION_CACHE_TTL', self.ttl)
+        self.flush_interval = app.config.get('SESSION_ACTIVITY_FLUSH_SECONDS', self.flush_interval)
+        self.max_entries = app.config.get('SESSION_CACHE_MAX_ENTRIES', self.max_entries)
+        app.extensions['session_validator'] = self
+        
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name='session-activity-flush', daemon=True)
+            self._flusher.start()
+            atexit.register(self.shutdown)
+    
+    def load(self, user_id, session_token):
+        """Devuelve la CachedSession del token o None si no hay sesión activa"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(session_token)
+            if entry and entry.cached_until > now and entry.user_id == user_id:
+                return entry
+        
+        # Una sola consulta: sesión activa + usuario
+        row = db.session.query(ActiveSession, User).join(
+            User, ActiveSession.user_id == User.id
+        ).filter(
+            ActiveSession.session_token == session_token,
+            ActiveSession.user_id == user_id,
+            ActiveSession.is_active == True
+        ).first()
+        
+        if not row:
+            self.invalidate(session_token)
+            return None
+        
+        entry = CachedSession(row[0], row[1], self.ttl)
+        with self._lock:
+            if len(self._cache) >= self.max_entries:
+                self._cache = {k: v for k, v in self._cache.items() if v.cached_until > now}
+            self._cache[session_token] = entry
+        return entry
+    
+    def get_user(self, entry):
+        """Usuario de la sesión ligado a db.session, sin consultar la BD"""
+        user = User(**entry.user_columns)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+    
+    def touch(self, entry):
+        """Registra actividad; se escribirá en el próximo flush"""
+        with self._lock:
+            self._pending[entry.session_id] = datetime.utcnow()
+    
+    def invalidate(self, session_token):
+        """Saca un token de la caché (logout, IP cambiada, sesión vencida)"""
+        with self._lock:
+            entry = self._cache.pop(session_token, None)
+            if entry:
+                self._pending.pop(entry.session_id, None)
+    
+    def flush(self):
+        """Escribe los last_activity pendientes en un solo UPDATE masivo"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        
+        if not pending or self._app is None:
+            return 0
+        
+        with self._app.app_context():
+            try:
+                db.session.bulk_update_mappings(ActiveSession, [
+                    {'id': session_id, 'last_activity': last_activity}
+                    for session_id, last_activity in pending.items()
+                ])
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error flushing session activity: {e}")
+                return 0
+        return len(pending)
+    
+    def shutdown(self):
+        """Detiene el hilo y escribe lo pendiente"""
+        self._stop.set()
+        self.flush()
+    
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+
+session_validator = SessionValidator()
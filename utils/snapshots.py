@@ -0,0 +1,125 @@
+"""Snapshots de analytics precalculados en segundo plano (tabla analytics_snapshot)"""
+from datetime import datetime, timedelta
+import logging
+import time
+
+from flask import current_app
+from sqlalchemy import or_
+
+from models import db, AnalyticsSnapshot, AnalyticsRefreshRequest
+from utils.columnar import columnar_engine
+
+logger = logging.getLogger(__name__)
+
+# Análisis que se precalculan; el nombre es la clave del snapshot. Los calcula el
+# motor columnar, que entre una ejecución y otra solo lee las filas nuevas
+SNAPSHOT_FUNCTIONS = {
+    'analytics_data': columnar_engine.analytics_data,
+    'predictive_analytics': columnar_engine.predictive_analytics,
+    'supplier_intelligence': columnar_engine.supplier_intelligence,
+}
+
+
+def _generate(name):
+    """Calcula `name` y guarda el snapshot. Devuelve (datos, snapshot o None si falló)"""
+    started = time.perf_counter()
+    data = SNAPSHOT_FUNCTIONS[name]()
+    if isinstance(data, dict) and data.get('error'):
+        # Las funciones de analytics reportan fallos así: se conserva el snapshot anterior
+        logger.warning(f"Snapshot {name} not generated: {data['error']}")
+        return data, None
+    if isinstance(data, dict) and data.get('partial'):
+        # Se guarda igual: el panel avisa qué partes faltan en vez de mostrar uno viejo
+        logger.warning(f"Snapshot {name} generated with missing parts: {data['partial']}")
+
+    snapshot = AnalyticsSnapshot(
+        name=name,
+        payload=data,
+        duration_ms=int((time.perf_counter() - started) * 1000)
+    )
+    db.session.add(snapshot)
+    AnalyticsSnapshot.prune(name, keep=current_app.config.get('ANALYTICS_SNAPSHOT_KEEP', 5))
+    db.session.commit()
+    logger.info(f"Snapshot {name} generated in {snapshot.duration_ms} ms")
+    return data, snapshot
+
+
+def refresh_snapshots(names=None):
+    """Recalcula los snapshots indicados (todos por defecto). Devuelve {nombre: snapshot}"""
+    generated = {}
+    for name in names or SNAPSHOT_FUNCTIONS:
+        try:
+            _, snapshot = _generate(name)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error generating snapshot {name}: {e}", exc_info=True)
+            continue
+        if snapshot is not None:
+            generated[name] = snapshot
+    return generated
+
+
+def get_snapshot(name):
+    """
+    (datos, generated_at) del último snapshot de `name`.
+
+    Si todavía no hay ninguno (instalación nueva, worker sin arrancar) devuelve
+    (None, None) y encola un recálculo: el panel muestra que se está generando,
+    nunca calcula en la petición.
+    """
+    try:
+        snapshot = AnalyticsSnapshot.latest(name)
+    except Exception as e:
+        # Snapshot ilegible (p. ej. guardado por otra versión del código): se regenera
+        db.session.rollback()
+        logger.warning(f"Snapshot {name} unreadable: {e}")
+        snapshot = None
+
+    if snapshot is not None:
+        return snapshot.payload, snapshot.generated_at
+
+    try:
+        request_refresh()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error requesting analytics refresh for {name}: {e}")
+    return None, None
+
+
+def request_refresh(user_id=None):
+    """Encola un recálculo; si ya hay uno pendiente, se reutiliza. Devuelve el pedido"""
+    pending = AnalyticsRefreshRequest.pending()
+    if pending is not None:
+        return pending
+
+    refresh_request = AnalyticsRefreshRequest(requested_by=user_id)
+    db.session.add(refresh_request)
+    db.session.commit()
+    return refresh_request
+
+
+def process_refresh_requests(stale_minutes=15):
+    """
+    Atiende los pedidos pendientes con un único recálculo. Devuelve cuántos atendió.
+
+    El UPDATE condicional reclama los pedidos: si hay varios workers, solo uno
+    los procesa. Un pedido tomado hace más de `stale_minutes` sin terminar
+    (worker caído) vuelve a estar disponible.
+    """
+    R = AnalyticsRefreshRequest
+    claimed_at = datetime.utcnow()
+    claimed = R.query.filter(
+        R.finished_at == None,
+        or_(R.started_at == None, R.started_at < claimed_at - timedelta(minutes=stale_minutes))
+    ).update({R.started_at: claimed_at}, synchronize_session=False)
+    db.session.commit()
+    if not claimed:
+        return 0
+
+    refresh_snapshots()
+    R.query.filter(R.started_at == claimed_at, R.finished_at == None).update(
+        {R.finished_at: datetime.utcnow()}, synchronize_session=False
+    )
+    db.session.commit()
+    logger.info(f"Processed {claimed} analytics refresh request(s)")
+    return claimed
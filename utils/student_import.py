@@ -0,0 +1,353 @@
+"""Importación masiva de cuentas de estudiante desde CSV o JSON"""
+from datetime import datetime, timedelta
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import secrets
+import uuid
+
+from flask import current_app
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import secure_filename
+
+from models import db, User, StudentImport
+from utils.passwords import password_pool
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = {'csv': 'csv', 'json': 'json', 'jsonl': 'json'}
+# Filas por consulta de unicidad + INSERT: un parámetro por correo en el IN (límite de SQLite)
+IMPORT_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+MIN_PASSWORD_LENGTH = 6
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+# Hash inutilizable: ninguna contraseña lo verifica hasta que se activa la cuenta
+UNUSABLE_PASSWORD = '!'
+ACTIVATIONS_HEADER = ['email', 'username', 'token']
+
+_JSON_SEPARATORS = ' \t\r\n,[]'
+
+
+def import_format(filename):
+    """'csv' o 'json' según la extensión (.csv, .json, .jsonl); None si no se admite"""
+    if not filename or '.' not in filename:
+        return None
+    return IMPORT_FORMATS.get(filename.rsplit('.', 1)[1].lower())
+
+
+def hash_activation_token(token):
+    """Huella SHA-256 del token: la BD nunca guarda el enlace de activación en claro"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _import_dir():
+    directory = current_app.config.get('STUDENT_IMPORT_DIR') or os.path.join(current_app.instance_path, 'imports')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def activations_path(job):
+    """CSV con los tokens de activación emitidos por una importación"""
+    return os.path.join(os.path.dirname(job.path), f'{job.id}-activaciones.csv')
+
+
+def queue_import(file_storage, user_id=None):
+    """
+    Guarda el archivo subido en instance/imports y encola la importación.
+
+    FileStorage.save copia por bloques: el archivo nunca está entero en memoria.
+    ValueError si la extensión no es .csv, .json o .jsonl.
+    """
+    fmt = import_format(file_storage.filename)
+    if fmt is None:
+        raise ValueError('Formato no soportado: usa .csv, .json o .jsonl')
+
+    path = os.path.join(_import_dir(), f'{uuid.uuid4().hex}.{fmt}')
+    file_storage.save(path)
+    job = StudentImport(
+        filename=(secure_filename(file_storage.filename) or f'import.{fmt}')[:255],
+        path=path,
+        requested_by=user_id,
+        bytes_total=os.path.getsize(path)
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+# ============ Lectura en streaming ============
+
+def _iter_csv(raw):
+    """Filas de un CSV con encabezado (email[, password]), una a la vez"""
+    text = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+    for row in csv.DictReader(text):
+        yield {key.strip().lower(): value for key, value in row.items() if key}
+
+
+def _iter_json(raw, read_size=64 * 1024):
+    """
+    Objetos de un arreglo JSON o de JSON Lines, leídos por bloques de `read_size`.
+
+    raw_decode toma un objeto completo del búfer; si está cortado se lee el
+    bloque siguiente. Nunca se carga el archivo entero.
+    """
+    text = io.TextIOWrapper(raw, encoding='utf-8-sig')
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+    while True:
+        while pos < len(buffer) and buffer[pos] in _JSON_SEPARATORS:
+            pos += 1
+        if pos < len(buffer):
+            try:
+                obj, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise ValueError(f'JSON inválido: {e}')
+            else:
+                yield obj
+                continue
+        elif eof:
+            return
+        chunk = text.read(read_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+
+
+def iter_rows(raw, fmt):
+    """Filas (dict) del archivo abierto en binario `raw`"""
+    return _iter_csv(raw) if fmt == 'csv' else _iter_json(raw)
+
+
+# ============ Importación ============
+
+class _ImportState:
+    """Contadores y correos vistos de una importación en curso"""
+
+    def __init__(self, writer, activation_expires_at):
+        self.writer = writer
+        self.activation_expires_at = activation_expires_at
+        self.seen = set()
+        self.errors = []
+        self.processed = 0
+        self.created = 0
+        self.activations = 0
+        self.skipped = 0
+
+    def reject(self, number, email, error):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': number, 'email': email, 'error': error})
+
+
+def _validate_rows(batch, state):
+    """Descarta filas inválidas o repetidas en el archivo. Devuelve [(fila, correo, contraseña)]"""
+    candidates = []
+    for number, row in batch:
+        if not isinstance(row, dict):
+            state.reject(number, None, 'Fila inválida')
+            continue
+        email = str(row.get('email') or '').strip()
+        password = str(row.get('password') or '').strip()
+        if not EMAIL_RE.match(email) or len(email) > 120:
+            state.reject(number, email, 'Correo inválido')
+        elif password and len(password) < MIN_PASSWORD_LENGTH:
+            state.reject(number, email, f'Contraseña debe tener al menos {MIN_PASSWORD_LENGTH} caracteres')
+        elif email in state.seen:
+            state.reject(number, email, 'Correo repetido en el archivo')
+        else:
+            state.seen.add(email)
+            candidates.append((number, email, password))
+    return candidates
+
+
+def _existing_emails(emails):
+    """Correos ya registrados, en una sola consulta IN"""
+    if not emails:
+        return set()
+    return set(db.session.execute(select(User.email).where(User.email.in_(emails))).scalars())
+
+
+def _build_users(candidates, state):
+    """Filas de User listas para el INSERT y los tokens de activación a publicar"""
+    with_password = [c for c in candidates if c[2]]
+    # Los hashes caros, repartidos entre los procesos del pool
+    hashes = dict(zip((c[0] for c in with_password), password_pool.hash_many([c[2] for c in with_password])))
+
+    users, activations = [], []
+    for number, email, password in candidates:
+        username = email.split('@')[0][:70] + '_' + str(uuid.uuid4())[:8]
+        user = {
+            'username': username,
+            'email': email,
+            'password_hash': hashes.get(number, UNUSABLE_PASSWORD),
+            'role': 'student',
+            'two_fa_enabled': False,
+            'activation_token_hash': None,
+            'activation_expires_at': None,
+        }
+        if not password:
+            # Sin contraseña: enlace de activación de un solo uso (solo se guarda su huella)
+            token = secrets.token_urlsafe(32)
+            user['activation_token_hash'] = hash_activation_token(token)
+            user['activation_expires_at'] = state.activation_expires_at
+            activations.append([email, username, token])
+        users.append(user)
+    return users, activations
+
+
+def _import_chunk(batch, state):
+    """Valida, comprueba unicidad, hashea e inserta un bloque de filas (sin commit)"""
+    state.processed += len(batch)
+    candidates = _validate_rows(batch, state)
+    existing = _existing_emails([c[1] for c in candidates])
+    for number, email, _ in candidates:
+        if email in existing:
+            state.reject(number, email, 'Correo ya registrado')
+    candidates = [c for c in candidates if c[1] not in existing]
+    if not candidates:
+        return
+
+    users, activations = _build_users(candidates, state)
+    try:
+        db.session.execute(insert(User.__table__), users)
+    except IntegrityError:
+        # Alguien se registró con uno de estos correos entre la consulta y el INSERT.
+        # Cada bloque hace commit: el rollback solo descarta este bloque
+        db.session.rollback()
+        existing = _existing_emails([user['email'] for user in users])
+        for number, email, _ in candidates:
+            if email in existing:
+                state.reject(number, email, 'Correo ya registrado')
+        users = [user for user in users if user['email'] not in existing]
+        activations = [row for row in activations if row[0] not in existing]
+        if users:
+            db.session.execute(insert(User.__table__), users)
+
+    state.created += len(users)
+    state.activations += len(activations)
+    state.writer.writerows(activations)
+
+
+def _save_progress(job, state, bytes_done):
+    job.bytes_done = bytes_done
+    job.processed = state.processed
+    job.created = state.created
+    job.activations = state.activations
+    job.skipped = state.skipped
+    job.errors = list(state.errors)
+
+
+def run_import(job, chunk_size=None):
+    """
+    Procesa el archivo de `job` por bloques de `chunk_size` filas.
+
+    Cada bloque es una consulta de unicidad, un lote de hashes en el pool de
+    procesos y un INSERT masivo, con su commit junto con el progreso: lo creado
+    queda aunque el proceso muera, y repetir la importación salta esos correos.
+    Los tokens de activación se agregan a activations_path(job).
+    """
+    chunk_size = chunk_size or current_app.config.get('STUDENT_IMPORT_CHUNK_SIZE', IMPORT_CHUNK_SIZE)
+    days = current_app.config.get('ACTIVATION_TOKEN_DAYS', 14)
+    fmt = import_format(job.path)
+    started = datetime.utcnow()
+    out_path = activations_path(job)
+    new_file = not os.path.exists(out_path) or os.path.getsize(out_path) == 0
+
+    with open(job.path, 'rb') as raw, open(out_path, 'a', newline='', encoding='utf-8') as out:
+        writer = csv.writer(out)
+        if new_file:
+            writer.writerow(ACTIVATIONS_HEADER)
+        state = _ImportState(writer, started + timedelta(days=days))
+        try:
+            batch = []
+            for number, row in enumerate(iter_rows(raw, fmt), start=1):
+                batch.append((number, row))
+                if len(batch) >= chunk_size:
+                    _import_chunk(batch, state)
+                    _save_progress(job, state, raw.tell())
+                    db.session.commit()
+                    out.flush()
+                    batch = []
+            if batch:
+                _import_chunk(batch, state)
+            _save_progress(job, state, job.bytes_total)
+            job.status = 'done'
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            # Archivo mal formado a mitad: lo ya importado se conserva
+            db.session.rollback()
+            logger.warning(f"Student import {job.id} stopped: {e}")
+            state.reject(None, None, f'Archivo inválido: {e}')
+            _save_progress(job, state, job.bytes_done)
+            job.status = 'failed'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+    # El archivo subido puede traer contraseñas en claro: no se conserva
+    try:
+        os.remove(job.path)
+    except OSError:
+        pass
+    elapsed = (job.finished_at - started).total_seconds()
+    logger.info(f"Student import {job.id}: {state.created} created ({state.activations} activation links), "
+                f"{state.skipped} skipped in {elapsed:.1f}s")
+    return job
+
+
+def process_imports(stale_minutes=60):
+    """
+    Atiende las importaciones pendientes, una a la vez. Devuelve cuántas atendió.
+
+    El UPDATE condicional reclama cada importación: si hay varios workers, solo
+    uno la procesa. Una importación tomada hace más de `stale_minutes` sin
+    terminar (worker caído) vuelve a empezar; lo ya creado se salta como repetido.
+    """
+    processed = 0
+    while True:
+        S = StudentImport
+        claimed_at = datetime.utcnow()
+        job = S.query.filter(
+            S.finished_at == None,
+            (S.started_at == None) | (S.started_at < claimed_at - timedelta(minutes=stale_minutes))
+        ).order_by(S.requested_at).first()
+        if job is None:
+            return processed
+
+        claimed = S.query.filter(S.id == job.id, S.started_at == job.started_at).update(
+            {S.started_at: claimed_at, S.status: 'running'}, synchronize_session=False
+        )
+        db.session.commit()
+        if not claimed:
+            continue
+
+        db.session.refresh(job)
+        try:
+            run_import(job)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Student import {job.id} failed: {e}")
+            S.query.filter(S.id == job.id).update(
+                {S.status: 'failed', S.finished_at: datetime.utcnow()}, synchronize_session=False
+            )
+            db.session.commit()
+        processed += 1
+
+
+def find_activation(token):
+    """Usuario con ese token de activación vigente, o None"""
+    user = User.query.filter_by(activation_token_hash=hash_activation_token(token)).first()
+    if user is None or (user.activation_expires_at and user.activation_expires_at < datetime.utcnow()):
+        return None
+    return user
+
+
+def activate_account(user, password_hash):
+    """Fija la contraseña de una cuenta importada y consume su token (no hace commit)"""
+    user.password_hash = password_hash
+    user.activation_token_hash = None
+    user.activation_expires_at = None
+    return user
@@ -0,0 +1,26 @@
+"""
+Worker de tareas en segundo plano (Procfile: worker)
+
+Ejecuta las tareas periódicas de app.py fuera de los workers web: snapshots de
+analytics, pedidos de "Actualizar ahora", importaciones masivas de estudiantes,
+rentas vencidas y sesiones expiradas.
+
+Uso: python worker.py
+"""
+import logging
+
+from apscheduler.schedulers.blocking import BlockingScheduler
+
+from app import app, register_jobs
+
+logger = logging.getLogger('worker')
+
+
+if __name__ == '__main__':
+    scheduler = BlockingScheduler()
+    register_jobs(scheduler)
+    logger.info(f"Worker started ({len(scheduler.get_jobs())} jobs)")
+    try:
+        scheduler.start()
+    except (KeyboardInterrupt, SystemExit):
+        logger.info("Worker stopped")